@@ -0,0 +1,85 @@
+"""
+Length-bucketed micro-batching under a token budget, shared by the encoder workloads
+(BERTScore span encoding in SpanScorer, premise-hypothesis pairs in NLIScorer).
+
+Inputs range from a few tokens to whole posts, and a batch is padded to its longest
+input. Items are therefore sorted by token length, so that each batch holds inputs of
+similar length, and batches are filled up to `max_tokens` padded tokens
+(batch size x longest input) rather than to a fixed number of items. Batches yield
+item indices, so callers write results back in the original order.
+Optionally, batches are also kept under an estimated memory cost (see memory_guard.py).
+"""
+
+import numpy as np
+
+
+class TokenBudgetBatcher:
+    def __init__(
+        self,
+        max_tokens: int = 4096,
+        max_batch_size: int = None,
+        max_bytes: int = None,
+        estimate_bytes=None,
+    ):
+        """
+        Args:
+            max_tokens: Maximum padded tokens per batch; an input longer than this gets a batch of its own
+            max_batch_size: Optional maximum number of items per batch
+            max_bytes: Optional maximum estimated memory per batch
+            estimate_bytes: Function of (number of items, padded length) estimating a batch's memory,
+                            required with max_bytes
+        """
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.max_bytes = max_bytes
+        self.estimate_bytes = estimate_bytes
+        self.num_batches = 0
+        self.num_items = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def batches(self, lengths):
+        """
+        Split items into batches of similar length.
+
+        Args:
+            lengths: Token length of each item
+
+        Yields:
+            Array of item indices per batch, shortest items first
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        order = np.argsort(lengths, kind="stable")
+        start = 0
+        while start < len(order):
+            end = start + 1
+            # Items are sorted, so the newest item is the longest of the batch
+            while (
+                end < len(order)
+                and (end - start + 1) * lengths[order[end]] <= self.max_tokens
+                and (self.max_batch_size is None or end - start < self.max_batch_size)
+                and (
+                    self.max_bytes is None
+                    or self.estimate_bytes(end - start + 1, lengths[order[end]])
+                    <= self.max_bytes
+                )
+            ):
+                end += 1
+            batch = order[start:end]
+            self.num_batches += 1
+            self.num_items += len(batch)
+            self.real_tokens += int(lengths[batch].sum())
+            self.padded_tokens += len(batch) * int(lengths[batch[-1]])
+            yield batch
+            start = end
+
+    def stats(self):
+        return {
+            "batches": self.num_batches,
+            "items": self.num_items,
+            "real_tokens": self.real_tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_efficiency": (
+                self.real_tokens / self.padded_tokens if self.padded_tokens else 1.0
+            ),
+        }
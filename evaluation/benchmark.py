@@ -0,0 +1,556 @@
+"""
+Benchmarks for the evaluation pipeline.
+
+Usage:
+    python benchmark.py segmentation
+    python benchmark.py nli-drift
+    python benchmark.py onnx
+    python benchmark.py startup
+    python benchmark.py task-startup
+    python benchmark.py wellbeing
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import subprocess
+import argparse
+import logging
+import warnings
+import itertools
+from pathlib import Path
+from collections import defaultdict
+from config import (
+    DATA_DIR,
+    DEV_ANNOTATED_FILENAME,
+    DEV_SUBMISSIONS_DIR,
+    DEV_PATHS,
+    EVAL_DIR,
+    RESULTS_DIR,
+)
+from sentence_splitter import BACKENDS, SentenceSplitter
+from gold_store import load_gold_data
+
+logger = logging.getLogger("benchmark")
+logging.basicConfig(level=logging.INFO)
+
+
+def load_raw_texts(filepaths):
+    """Timeline summaries, posts and post summaries of raw annotated timeline files."""
+    texts = []
+    for filepath in filepaths:
+        with open(filepath, "r") as f:
+            data = json.load(f)
+        texts.append(data.get("timeline_summary") or "")
+        for post in data["posts"]:
+            texts.append(post.get("post") or "")
+            texts.append(post.get("Post Summary") or "")
+    return [text for text in texts if text.strip()]
+
+
+def _report_throughput(name, elapsed, num_texts, num_units, unit, num_mb):
+    print(
+        f"{name:>20}: {num_texts / elapsed:12.1f} texts/s "
+        f"{num_units / elapsed:12.1f} {unit}/s {num_mb / elapsed:8.2f} MB/s"
+    )
+
+
+def benchmark_segmentation(args):
+    """Segmentation throughput of each sentence splitter backend on the dev and test corpora."""
+    # Scans TEST_DIR, so only imported by this benchmark
+    from config import TEST_PATHS
+
+    texts = load_raw_texts([p for p in DEV_PATHS + TEST_PATHS if os.path.exists(p)])
+    if not texts:
+        logger.error(
+            "No texts found. Check that TRAIN_DIR and TEST_DIR are set in config.py."
+        )
+        return
+    num_mb = sum(len(text.encode("utf-8")) for text in texts) / 2**20
+    logger.info(f"Segmenting {len(texts)} texts ({num_mb:.2f} MB)")
+
+    backend_splits = dict()
+    for backend in BACKENDS:
+        # Uncached: every pass starts from an empty cache; keep the fastest pass
+        uncached_times = []
+        for _ in range(args.repeats):
+            splitter = SentenceSplitter(backend=backend)
+            start = time.perf_counter()
+            splits = [splitter.split(text) for text in texts]
+            uncached_times.append(time.perf_counter() - start)
+        num_sents = sum(len(s) for s in splits)
+        _report_throughput(
+            f"{backend} uncached",
+            min(uncached_times),
+            len(texts),
+            num_sents,
+            "sents",
+            num_mb,
+        )
+
+        # Cached: same texts again, as for every further submission in a run
+        start = time.perf_counter()
+        for text in texts:
+            splitter.split(text)
+        _report_throughput(
+            f"{backend} cached",
+            time.perf_counter() - start,
+            len(texts),
+            num_sents,
+            "sents",
+            num_mb,
+        )
+        backend_splits[backend] = splits
+
+    reference = list(BACKENDS)[0]
+    for backend, splits in backend_splits.items():
+        if backend != reference:
+            agreement = sum(
+                a == b for a, b in zip(splits, backend_splits[reference])
+            ) / len(texts)
+            print(
+                f"{backend} splits agree with {reference} on {agreement:.1%} of texts"
+            )
+
+
+def load_dev_data(team):
+    """Processed dev gold data and the paths of matching dev submission files."""
+    submission_data_paths = sorted(
+        glob.glob(os.path.join(DEV_SUBMISSIONS_DIR, f"{team}*.json"))
+    )
+    gold_data, _ = load_gold_data(os.path.join(DATA_DIR, DEV_ANNOTATED_FILENAME))
+    return gold_data, submission_data_paths
+
+
+def benchmark_nli_drift(args):
+    """
+    Accuracy drift and speed of dynamic int8 NLI against fp32 on the dev set (Tasks B, C).
+    Scores every dev submission with both models, without the NLI cache.
+    """
+    # Model dependencies are only needed by this benchmark
+    import pandas as pd
+    from run import load_scorers, score_submission
+    from model_registry import default_registry
+
+    gold_data, submission_data_paths = load_dev_data(args.team)
+    if not submission_data_paths:
+        logger.error(f"No submission files found in {DEV_SUBMISSIONS_DIR}")
+        return
+    submissions = dict()
+    for submission_data_path in submission_data_paths:
+        with open(submission_data_path, "r") as f:
+            submissions[Path(submission_data_path).stem] = json.load(f)
+
+    results = defaultdict(list)
+    elapsed = dict()
+    for mode, quantize in [("fp32", False), ("int8", True)]:
+        scorers = load_scorers(
+            do_A1=False,
+            do_A2=False,
+            nli_batch_size=args.batch_size,
+            nli_quantize=quantize,
+        )
+        start = time.perf_counter()
+        for submission, submission_data in submissions.items():
+            timeline_to_results = score_submission(
+                submission_data, gold_data, do_A1=False, do_A2=False, scorers=scorers
+            )
+            for timeline_id, timeline_results in timeline_to_results.items():
+                for curr_result in timeline_results:
+                    for metric_name, metric_vals in curr_result.items():
+                        results["mode"].append(mode)
+                        results["submission"].append(submission)
+                        results["timeline_id"].append(timeline_id)
+                        results["metric"].append(metric_name)
+                        results["value"].append(float(metric_vals["value"]))
+        elapsed[mode] = time.perf_counter() - start
+        default_registry.release()
+
+    results_df = pd.DataFrame(results)
+    results_df = results_df[
+        results_df.metric.str.contains("mean_consistency|max_contradiction")
+    ]
+    # Metrics are computed per post (Task B) or timeline (Task C); average within each timeline first
+    timeline_df = (
+        results_df.groupby(["mode", "submission", "metric", "timeline_id"])
+        .value.mean()
+        .unstack("mode")
+    )
+    timeline_df["abs_diff"] = (timeline_df["int8"] - timeline_df["fp32"]).abs()
+    submission_df = timeline_df.groupby(["submission", "metric"])[
+        ["fp32", "int8"]
+    ].mean()
+    submission_df["diff"] = submission_df["int8"] - submission_df["fp32"]
+
+    report = timeline_df.groupby("metric").agg(
+        fp32=("fp32", "mean"),
+        int8=("int8", "mean"),
+        mean_abs_diff=("abs_diff", "mean"),
+        max_abs_diff=("abs_diff", "max"),
+    )
+    report["max_submission_diff"] = submission_df["diff"].abs().groupby("metric").max()
+    # Whether quantization would change the leaderboard order of submissions
+    report["rank_correlation"] = submission_df.groupby("metric").apply(
+        lambda df: df["fp32"].corr(df["int8"], method="spearman")
+    )
+    print(report.to_string())
+    print(
+        f"fp32: {elapsed['fp32']:.1f}s, int8: {elapsed['int8']:.1f}s "
+        f"(speedup {elapsed['fp32'] / elapsed['int8']:.2f}x)"
+    )
+
+    report_path = os.path.join(RESULTS_DIR, "nli_drift.csv")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    submission_df.to_csv(report_path)
+    logger.info(f"Per-submission scores saved to {report_path}")
+
+
+def benchmark_onnx(args):
+    """
+    Throughput of PyTorch eager vs ONNX Runtime for the NLI model and the BERTScore encoder,
+    on the unique NLI and span pairs of the dev submissions, and the largest score difference.
+    """
+    # Model dependencies are only needed by this benchmark
+    import numpy as np
+    from run import plan_scoring_work
+    from span_scorer import SpanScorer
+    from nli_scorer import NLIScorer
+    from model_registry import default_registry
+    from onnx_backend import INFERENCE_BACKENDS, ONNX_TOLERANCE
+
+    gold_data, submission_data_paths = load_dev_data(args.team)
+    if not submission_data_paths:
+        logger.error(f"No submission files found in {DEV_SUBMISSIONS_DIR}")
+        return
+    plan = plan_scoring_work(
+        [(path, task) for path in submission_data_paths for task in ["A1", "B", "C"]],
+        gold_data,
+        SentenceSplitter(),
+    )
+    nli_pairs = list(plan["nli_pairs"])[: args.max_pairs]
+    span_groups, num_span_pairs = [], 0
+    for gold_spans, predicted_spans in plan["span_groups"].items():
+        if num_span_pairs >= args.max_pairs:
+            break
+        span_groups.append((list(gold_spans), list(predicted_spans)))
+        num_span_pairs += len(gold_spans) * len(predicted_spans)
+    if not nli_pairs or not span_groups:
+        logger.error("No NLI or span pairs to compare in the dev submissions")
+        return
+
+    nli_probs, span_scores = dict(), dict()
+    for backend in INFERENCE_BACKENDS:
+        # Exports and loads the models on first use, so warm up outside the timed pass
+        nli = NLIScorer(batch_size=args.batch_size, backend=backend)
+        nli._predict_pairs(nli_pairs[:16])
+        start = time.perf_counter()
+        nli_probs[backend] = nli._predict_pairs(nli_pairs)
+        elapsed = time.perf_counter() - start
+        print(f"{'NLI ' + backend:>20}: {len(nli_pairs) / elapsed:10.1f} pairs/s")
+
+        ss = SpanScorer(backend=backend)
+        ss.prefetch_similarities(span_groups[:1])
+        ss.prefetched.clear()
+        start = time.perf_counter()
+        ss.prefetch_similarities(span_groups)
+        elapsed = time.perf_counter() - start
+        span_scores[backend] = ss.prefetched
+        print(f"{'BERTScore ' + backend:>20}: {num_span_pairs / elapsed:10.1f} pairs/s")
+        default_registry.release()
+
+    nli_diff = np.abs(nli_probs["onnx"] - nli_probs["torch"]).max()
+    span_diff = max(
+        abs(span_scores["onnx"][pair] - score)
+        for pair, score in span_scores["torch"].items()
+    )
+    for name, diff in [("NLI probability", nli_diff), ("BERTScore F", span_diff)]:
+        status = "within" if diff <= ONNX_TOLERANCE else "EXCEEDS"
+        print(
+            f"Max {name} difference: {diff:.2e} ({status} tolerance {ONNX_TOLERANCE:.0e})"
+        )
+
+
+def benchmark_wellbeing(args):
+    """
+    Time of per-timeline vs vectorized Task A.2 scoring of all dev submissions,
+    and whether both give identical results.
+    """
+    from run import parse_post_prediction, score_wellbeing
+    from wellbeing_scorer import WellbeingScorer
+
+    gold_data, submission_data_paths = load_dev_data(args.team)
+    if not submission_data_paths:
+        logger.error(f"No submission files found in {DEV_SUBMISSIONS_DIR}")
+        return
+    submission_datas = []
+    for submission_data_path in submission_data_paths:
+        with open(submission_data_path, "r") as f:
+            submission_datas.append(json.load(f))
+    # Decoded once, so that both timings only cover scoring
+    gold_data = {timeline_id: gold_data[timeline_id] for timeline_id in gold_data}
+    timeline_ids = list(gold_data)
+    ws = WellbeingScorer()
+
+    # sklearn warns about each label without true and predicted scores
+    warnings.simplefilter("ignore")
+    per_timeline_times, batch_times = [], []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        per_timeline = [dict() for _ in submission_datas]
+        for submission_results, submission_data in zip(per_timeline, submission_datas):
+            for timeline_id in timeline_ids:
+                gold_datum = gold_data[timeline_id]
+                post_ids = gold_datum["timeline_level"]["post_ids"]
+                y_trues = [
+                    gold_datum["post_level"][post_id]["wellbeing_score"]
+                    for post_id in post_ids
+                ]
+                y_preds = [
+                    parse_post_prediction(
+                        submission_data[timeline_id]["post_level"][post_id], None
+                    )[2]
+                    for post_id in post_ids
+                ]
+                submission_results[timeline_id] = [
+                    ws.compute_mse(y_trues=y_trues, y_preds=y_preds, do_binwise=True),
+                    ws.compute_f1(y_trues=y_trues, y_preds=y_preds),
+                ]
+        per_timeline_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batch = score_wellbeing(ws, submission_datas, gold_data, timeline_ids)
+        batch_times.append(time.perf_counter() - start)
+
+    num_scored = len(submission_datas) * len(timeline_ids)
+    print(
+        f"{len(submission_datas)} submissions x {len(timeline_ids)} timelines: "
+        f"per timeline {min(per_timeline_times) * 1000:.1f} ms, "
+        f"vectorized {min(batch_times) * 1000:.1f} ms "
+        f"(speedup {min(per_timeline_times) / min(batch_times):.1f}x, "
+        f"{num_scored / min(batch_times):.0f} timelines/s)"
+    )
+    num_different = 0
+    for submission_a, submission_b in zip(per_timeline, batch):
+        for timeline_id in timeline_ids:
+            num_different += submission_a[timeline_id] != submission_b[timeline_id]
+    print(f"Timelines with different results: {num_different} of {num_scored}")
+
+
+# Entry points and how startup is measured: --help exits right after the imports,
+# validating the bundled empty submission also reads the timeline-post mapping
+STARTUP_COMMANDS = {
+    "run.py": ["run.py", "--help"],
+    "submission_validator.py": [
+        "submission_validator.py",
+        "-f",
+        "empty_test_submission.json",
+    ],
+    "submission_validator.py --mapping-only": [
+        "submission_validator.py",
+        "-f",
+        "empty_test_submission.json",
+        "--mapping-only",
+    ],
+    "setup.py": ["setup.py"],
+    "process_gold_data.py": ["process_gold_data.py", "--help"],
+    "process_dummy_data.py": ["process_dummy_data.py", "--help"],
+}
+
+
+def parse_importtime(output):
+    """Top-level modules and their cumulative import time in microseconds, from `python -X importtime`."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented below the module that imports them
+        if not name[1:].startswith(" "):
+            imports.append((name.strip(), int(cumulative)))
+    return imports
+
+
+def benchmark_startup(args):
+    """Startup time of each entry point, and the top-level imports it spends it on."""
+    for name, command in STARTUP_COMMANDS.items():
+        runs = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            process = subprocess.run(
+                [sys.executable, "-X", "importtime", *command],
+                cwd=EVAL_DIR,
+                capture_output=True,
+                text=True,
+            )
+            runs.append((time.perf_counter() - start, process))
+        elapsed, process = min(runs, key=lambda run: run[0])
+        imports = parse_importtime(process.stderr)
+        slowest = sorted(imports, key=lambda i: i[1], reverse=True)[: args.top]
+        status = f" (exit {process.returncode})" if process.returncode else ""
+        print(
+            f"{name:>40}: {elapsed * 1000:8.1f} ms total, "
+            f"{sum(t for _, t in imports) / 1000:8.1f} ms imports{status}"
+        )
+        print(
+            f"{'':>42}slowest: "
+            + ", ".join(f"{module} {t / 1000:.1f} ms" for module, t in slowest)
+        )
+
+
+# Imports what `run.py --tasks ...` imports before it loads models: run.py itself, then
+# the scorer module of each task (see task_plugins.py)
+TASK_STARTUP_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import run
+from task_plugins import load_plugin
+from memory_guard import peak_rss_bytes
+for task in sys.argv[1:]:
+    load_plugin(task)
+print(json.dumps({"seconds": time.perf_counter() - start, "peak_rss_bytes": peak_rss_bytes()}))
+"""
+
+
+def benchmark_task_startup(args):
+    """Import time and peak RSS of run.py for each combination of tasks."""
+    from run import VALID_TASKS
+
+    combinations = [
+        tasks
+        for num_tasks in range(1, len(VALID_TASKS) + 1)
+        for tasks in itertools.combinations(VALID_TASKS, num_tasks)
+    ]
+    measurements = dict()
+    for tasks in combinations:
+        runs = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            process = subprocess.run(
+                [sys.executable, "-c", TASK_STARTUP_SCRIPT, *tasks],
+                cwd=EVAL_DIR,
+                capture_output=True,
+                text=True,
+            )
+            if process.returncode:
+                raise RuntimeError(
+                    f"Importing tasks {' '.join(tasks)} failed:\n{process.stderr}"
+                )
+            runs.append(
+                (
+                    time.perf_counter() - start,
+                    json.loads(process.stdout.splitlines()[-1]),
+                )
+            )
+        measurements[tasks] = min(runs, key=lambda run: run[0])
+
+    # All tasks import every scorer module, as run.py did before task plugins
+    all_elapsed, all_imports = measurements[tuple(VALID_TASKS)]
+    for tasks, (elapsed, imports) in measurements.items():
+        # Peak RSS is None where it cannot be measured (see memory_guard.py)
+        if imports["peak_rss_bytes"] is None:
+            rss, rss_saved = "", ""
+        else:
+            rss = f"{imports['peak_rss_bytes'] / 2**20:7.1f} MB peak RSS "
+            rss_saved = f", {(all_imports['peak_rss_bytes'] - imports['peak_rss_bytes']) / 2**20:6.1f} MB"
+        print(
+            f"{' '.join(tasks):>10}: {elapsed * 1000:8.1f} ms total, "
+            f"{imports['seconds'] * 1000:8.1f} ms imports, {rss}"
+            f"(saves {(all_elapsed - elapsed) * 1000:7.1f} ms{rss_saved} vs all tasks)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    segmentation_parser = subparsers.add_parser(
+        "segmentation", help="Sentence segmentation throughput per splitter backend"
+    )
+    segmentation_parser.add_argument(
+        "--repeats", type=int, default=3, help="Number of timed passes per setting"
+    )
+    segmentation_parser.set_defaults(func=benchmark_segmentation)
+
+    nli_drift_parser = subparsers.add_parser(
+        "nli-drift",
+        help="Score drift and speedup of int8-quantized vs fp32 NLI on dev submissions",
+    )
+    nli_drift_parser.add_argument(
+        "--team",
+        type=str,
+        default="*",
+        help="An optional pattern to compare only on selected submission files.",
+    )
+    nli_drift_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Optional maximum number of NLI pairs per batch",
+    )
+    nli_drift_parser.set_defaults(func=benchmark_nli_drift)
+
+    onnx_parser = subparsers.add_parser(
+        "onnx",
+        help="Throughput (pairs/s) and score difference of PyTorch vs ONNX Runtime inference",
+    )
+    onnx_parser.add_argument(
+        "--team",
+        type=str,
+        default="*",
+        help="An optional pattern to take pairs only from selected submission files.",
+    )
+    onnx_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Optional maximum number of NLI pairs per batch",
+    )
+    onnx_parser.add_argument(
+        "--max-pairs",
+        type=int,
+        default=2000,
+        help="Number of unique NLI pairs, and approximate number of span pairs, to time",
+    )
+    onnx_parser.set_defaults(func=benchmark_onnx)
+
+    startup_parser = subparsers.add_parser(
+        "startup",
+        help="Startup time and slowest imports of each entry point (runs setup.py, "
+        "which does nothing once data/ is set up)",
+    )
+    startup_parser.add_argument(
+        "--repeats", type=int, default=3, help="Number of runs per entry point"
+    )
+    startup_parser.add_argument(
+        "--top", type=int, default=3, help="Number of slowest imports to show"
+    )
+    startup_parser.set_defaults(func=benchmark_startup)
+
+    wellbeing_parser = subparsers.add_parser(
+        "wellbeing",
+        help="Per-timeline vs vectorized Task A.2 scoring of the dev submissions",
+    )
+    wellbeing_parser.add_argument(
+        "--team",
+        type=str,
+        default="*",
+        help="An optional pattern to score only selected submission files.",
+    )
+    wellbeing_parser.add_argument(
+        "--repeats", type=int, default=3, help="Number of timed passes"
+    )
+    wellbeing_parser.set_defaults(func=benchmark_wellbeing)
+
+    task_startup_parser = subparsers.add_parser(
+        "task-startup",
+        help="Import time and peak RSS of run.py for each combination of tasks",
+    )
+    task_startup_parser.add_argument(
+        "--repeats", type=int, default=3, help="Number of runs per task combination"
+    )
+    task_startup_parser.set_defaults(func=benchmark_task_startup)
+
+    args = parser.parse_args()
+    args.func(args)
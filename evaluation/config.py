@@ -1,5 +1,6 @@
 import os
 import glob
+from functools import lru_cache
 from pathlib import Path
 
 # Directory containing annotated data
@@ -28,17 +29,98 @@ DEV_SUBMISSIONS_DIR = os.path.join(EVAL_DIR, "submissions_dev")
 TEST_SUBMISSIONS_DIR = os.path.join(EVAL_DIR, "submissions")
 RESULTS_DIR = os.path.join(EVAL_DIR, "results")
 
+# Persistent cache of NLI outputs shared across runs (see nli_cache.py)
+NLI_CACHE_PATH = os.path.join(RESULTS_DIR, "nli_cache.sqlite")
+
+# Content-addressed store of per-submission, per-task results (see results_cache.py)
+RESULTS_CACHE_DIR = os.path.join(RESULTS_DIR, "cache")
+
+# SQLite database of the results of all runs, for leaderboard queries (see results_db.py)
+RESULTS_DB_PATH = os.path.join(RESULTS_DIR, "results.sqlite")
+
+# Per-run journals of scored timelines, used to resume interrupted runs (see run_journal.py)
+RUNS_DIR = os.path.join(RESULTS_DIR, "runs")
+
+# Optional on-disk cache of sentence splits (see sentence_splitter.py)
+SENTENCE_CACHE_PATH = os.path.join(RESULTS_DIR, "sentence_cache.json")
+
+# Exported ONNX graphs of the scorer models (see onnx_backend.py)
+ONNX_CACHE_DIR = os.path.join(RESULTS_DIR, "onnx")
+
+# Inference backends selectable per scorer, kept here so that run.py can offer them
+# without importing onnx_backend (and torch)
+INFERENCE_BACKENDS = ["torch", "onnx"]
+
 # Path to timeline-post mapping
 TIMELINE_POST_MAPPING_PATH = os.path.join(DATA_DIR, "timeline_id_to_post_id.json")
 
+# Optional list of test timeline IDs written by setup.py, so that
+# submission_validator.py --mapping-only need not scan TEST_DIR (it is scanned if the list is missing)
+TEST_TIMELINE_IDS_PATH = os.path.join(DATA_DIR, "test_timeline_ids.json")
+
 # Paths to individual JSON files
 DEV_PATHS = [os.path.join(TRAIN_DIR, f"{tlid}.json") for tlid in DEV_TIMELINE_IDS]
-TRAIN_PATHS = [
-    p for p in glob.glob(TRAIN_DIR + "/*") if Path(p).stem not in DEV_TIMELINE_IDS
-]
-TEST_PATHS = [p for p in glob.glob(TEST_DIR + "/*")]
-TEST_TIMELINE_IDS = [Path(p).stem for p in TEST_PATHS]
+
+
+# TRAIN_PATHS, TEST_PATHS and TEST_TIMELINE_IDS scan TRAIN_DIR and TEST_DIR, so they are
+# only computed when first accessed (see __getattr__), e.g. not by submission_validator.py --dev
+@lru_cache(maxsize=None)
+def _train_paths():
+    return [
+        p for p in glob.glob(TRAIN_DIR + "/*") if Path(p).stem not in DEV_TIMELINE_IDS
+    ]
+
+
+@lru_cache(maxsize=None)
+def _test_paths():
+    return [p for p in glob.glob(TEST_DIR + "/*")]
+
+
+@lru_cache(maxsize=None)
+def _test_timeline_ids():
+    return [Path(p).stem for p in _test_paths()]
+
+
+_LAZY_ATTRIBUTES = {
+    "TRAIN_PATHS": _train_paths,
+    "TEST_PATHS": _test_paths,
+    "TEST_TIMELINE_IDS": _test_timeline_ids,
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Names of processed annotation files to be stored in data/
 DEV_ANNOTATED_FILENAME = "dev.json"
 TEST_ANNOTATED_FILENAME = "test.json"
+
+# Names imported by `from config import *` (setup.py), including the lazy attributes
+__all__ = [
+    "TRAIN_DIR",
+    "TEST_DIR",
+    "DEV_TIMELINE_IDS",
+    "EVAL_DIR",
+    "DATA_DIR",
+    "DEV_SUBMISSIONS_DIR",
+    "TEST_SUBMISSIONS_DIR",
+    "RESULTS_DIR",
+    "NLI_CACHE_PATH",
+    "RESULTS_CACHE_DIR",
+    "RESULTS_DB_PATH",
+    "RUNS_DIR",
+    "SENTENCE_CACHE_PATH",
+    "ONNX_CACHE_DIR",
+    "INFERENCE_BACKENDS",
+    "TIMELINE_POST_MAPPING_PATH",
+    "TEST_TIMELINE_IDS_PATH",
+    "DEV_PATHS",
+    "TRAIN_PATHS",
+    "TEST_PATHS",
+    "TEST_TIMELINE_IDS",
+    "DEV_ANNOTATED_FILENAME",
+    "TEST_ANNOTATED_FILENAME",
+]
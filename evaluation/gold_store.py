@@ -0,0 +1,383 @@
+"""
+Binary, memory-mapped store of processed gold data.
+
+The processed gold file (e.g. data/dev.json) is a nested dict of strings that has to be
+parsed in full for every run. The gold store holds the same data in one binary file
+next to it (e.g. data/dev.gold):
+    - strings: every distinct string (IDs, summaries, sentences, spans, span labels) once,
+      as concatenated UTF-8 with offsets
+    - timelines, posts, spans and sentences: integer arrays referencing the strings,
+      with offset arrays giving each timeline's posts, spans and sentences
+    - wellbeing scores: one float64 array over all posts (NaN where not annotated)
+The file is memory-mapped and GoldStore is a read-only mapping from timeline ID to
+the same dict as in the JSON file (see process_gold_data.process_annotated_data),
+decoded only when that timeline is accessed.
+
+File layout: magic, header length (uint64), JSON header giving each array's dtype,
+length and offset, then the arrays, each aligned to 8 bytes.
+"""
+
+import os
+import json
+import mmap
+import logging
+from collections import defaultdict
+from collections.abc import Mapping
+import numpy as np
+from results_cache import hash_file
+
+logger = logging.getLogger("gold_store")
+
+STORE_EXTENSION = ".gold"
+MAGIC = b"CLPGOLD\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+# String ID of None values
+NONE_ID = -1
+
+
+class _StringTable:
+    # Interns strings while writing a store
+    def __init__(self):
+        self.ids = dict()
+
+    def add(self, text):
+        if text is None:
+            return NONE_ID
+        if text not in self.ids:
+            self.ids[text] = len(self.ids)
+        return self.ids[text]
+
+    def arrays(self):
+        data = [text.encode("utf-8") for text in self.ids]
+        offsets = np.zeros(len(data) + 1, dtype=np.int64)
+        np.cumsum([len(d) for d in data], out=offsets[1:])
+        return {
+            "string_offsets": offsets,
+            "string_data": np.frombuffer(b"".join(data), dtype=np.uint8),
+        }
+
+
+def _aligned(num_bytes):
+    return -(-num_bytes // ALIGNMENT) * ALIGNMENT
+
+
+def _ranges(lengths):
+    # Offsets such that item i spans [offsets[i], offsets[i + 1])
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _wellbeing_value(score):
+    # Annotated scores are integers; return them as they appear in the JSON file
+    if score != score:
+        return None
+    return int(score) if score.is_integer() else float(score)
+
+
+class GoldStore(Mapping):
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Gold store file (see `path_for`)
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a gold store: {path}")
+            header_length = int.from_bytes(f.read(8), "little")
+            self.header = json.loads(f.read(header_length))
+        data_start = len(MAGIC) + 8 + header_length
+        if self.header["version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported gold store version {self.header['version']}: {path}"
+            )
+        self.source_sha256 = self.header.get("source_sha256")
+        self.source_size = self.header.get("source_size")
+        self.source_mtime_ns = self.header.get("source_mtime_ns")
+
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.arrays = {
+            name: np.frombuffer(
+                self._buffer, dtype=dtype, count=length, offset=data_start + offset
+            )
+            for name, (dtype, length, offset) in self.header["arrays"].items()
+        }
+        string_data = self.header["arrays"]["string_data"]
+        self._string_data_start = data_start + string_data[2]
+        # Timeline IDs are decoded up front; everything else on access
+        self.timeline_index = {
+            timeline_id: i
+            for i, timeline_id in enumerate(
+                self._strings(self.arrays["timeline_ids"].tolist())
+            )
+        }
+
+    def __reduce__(self):
+        # Worker processes reopen the file instead of receiving the data
+        return (GoldStore, (self.path,))
+
+    @staticmethod
+    def path_for(gold_data_path: str):
+        """Store location for a processed gold file, e.g. data/dev.json -> data/dev.gold"""
+        return os.path.splitext(gold_data_path)[0] + STORE_EXTENSION
+
+    @staticmethod
+    def write(path: str, gold_data: dict, source_path: str = None):
+        """
+        Save processed gold data.
+
+        Args:
+            path: Gold store file
+            gold_data: Dictionary mapping timeline ID to processed gold data,
+                       as returned by process_gold_data.process_annotated_data
+            source_path: Optional processed gold file the data was read from, whose hash,
+                         size and modification time are recorded
+        """
+        strings = _StringTable()
+        timeline_ids, timeline_summaries = [], []
+        timeline_summary_sents, num_posts, num_texts, num_spans = [], [], [], []
+        post_ids, post_summaries, wellbeing_scores = [], [], []
+        post_summary_sents, text_sents = [], []
+        span_texts, span_elements, span_subcategories = [], [], []
+        # String IDs of the timeline summary, post summary and post text sentences
+        sentences = defaultdict(list)
+
+        def add_sentences(kind, sents):
+            sentences[kind].extend(strings.add(s) for s in sents)
+            return len(sents)
+
+        for timeline_id, gold_datum in gold_data.items():
+            timeline_level = gold_datum["timeline_level"]
+            timeline_ids.append(strings.add(timeline_id))
+            timeline_summaries.append(strings.add(timeline_level["summary"]))
+            timeline_summary_sents.append(
+                add_sentences("timeline_summary", timeline_level["summary_sents"])
+            )
+            for span_type in ["adaptive_spans", "maladaptive_spans"]:
+                for span in timeline_level[span_type]:
+                    span_texts.append(strings.add(span["text"]))
+                    span_elements.append(strings.add(span["element"]))
+                    span_subcategories.append(strings.add(span["subcategory"]))
+                num_spans.append(len(timeline_level[span_type]))
+
+            post_level = gold_datum["post_level"]
+            num_posts.append(len(timeline_level["post_ids"]))
+            for post_id in timeline_level["post_ids"]:
+                post = post_level[post_id]
+                post_ids.append(strings.add(post_id))
+                post_summaries.append(strings.add(post["summary"]))
+                wellbeing_scores.append(
+                    np.nan
+                    if post["wellbeing_score"] is None
+                    else post["wellbeing_score"]
+                )
+                post_summary_sents.append(
+                    add_sentences("post_summary", post["summary_sents"])
+                )
+            # Sentences of each post text
+            num_texts.append(len(timeline_level["sents"]))
+            for sents in timeline_level["sents"]:
+                text_sents.append(add_sentences("text", sents))
+
+        arrays = {
+            **strings.arrays(),
+            "timeline_ids": np.array(timeline_ids, dtype=np.int32),
+            "timeline_summaries": np.array(timeline_summaries, dtype=np.int32),
+            "timeline_summary_sentence_offsets": _ranges(timeline_summary_sents),
+            "timeline_posts": _ranges(num_posts),
+            "timeline_texts": _ranges(num_texts),
+            # Adaptive spans of timeline i, then its maladaptive spans
+            "timeline_spans": _ranges(num_spans),
+            "post_ids": np.array(post_ids, dtype=np.int32),
+            "post_summaries": np.array(post_summaries, dtype=np.int32),
+            "post_wellbeing_scores": np.array(wellbeing_scores, dtype=np.float64),
+            "post_summary_sentence_offsets": _ranges(post_summary_sents),
+            "text_sentence_offsets": _ranges(text_sents),
+            "span_texts": np.array(span_texts, dtype=np.int32),
+            "span_elements": np.array(span_elements, dtype=np.int32),
+            "span_subcategories": np.array(span_subcategories, dtype=np.int32),
+            **{
+                f"{kind}_sentences": np.array(sentences[kind], dtype=np.int32)
+                for kind in ["timeline_summary", "post_summary", "text"]
+            },
+        }
+
+        layout, position = dict(), 0
+        for name, array in arrays.items():
+            layout[name] = [array.dtype.str, len(array), position]
+            position += _aligned(array.nbytes)
+        header_bytes = json.dumps(
+            {
+                "version": FORMAT_VERSION,
+                **source_fingerprint(source_path),
+                "arrays": layout,
+            }
+        ).encode("utf-8")
+        # Pad the header so that the arrays start aligned
+        header_bytes = header_bytes.ljust(
+            _aligned(len(MAGIC) + 8 + len(header_bytes)) - len(MAGIC) - 8
+        )
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header_bytes).to_bytes(8, "little"))
+            f.write(header_bytes)
+            for array in arrays.values():
+                data = np.ascontiguousarray(array).tobytes()
+                f.write(data.ljust(_aligned(len(data)), b"\0"))
+        os.replace(tmp_path, path)
+
+    def _strings(self, string_ids):
+        # Decode a list of string IDs straight from the mapped file
+        offsets = self.arrays["string_offsets"]
+        start = self._string_data_start
+        strings = []
+        for string_id in string_ids:
+            if string_id == NONE_ID:
+                strings.append(None)
+            else:
+                begin, end = offsets[string_id : string_id + 2].tolist()
+                strings.append(
+                    self._buffer[start + begin : start + end].decode("utf-8")
+                )
+        return strings
+
+    def _range(self, name, i):
+        offsets = self.arrays[name]
+        return offsets[i : i + 2].tolist()
+
+    def _sentences(self, kind, i):
+        begin, end = self._range(f"{kind}_sentence_offsets", i)
+        return self._strings(self.arrays[f"{kind}_sentences"][begin:end].tolist())
+
+    def __getitem__(self, timeline_id):
+        i = self.timeline_index[timeline_id]
+        a = self.arrays
+
+        # Adaptive spans of the timeline, then its maladaptive spans
+        span_begin, span_middle, span_end = a["timeline_spans"][
+            2 * i : 2 * i + 3
+        ].tolist()
+        span_texts = self._strings(a["span_texts"][span_begin:span_end].tolist())
+        span_elements = self._strings(a["span_elements"][span_begin:span_end].tolist())
+        span_subcategories = self._strings(
+            a["span_subcategories"][span_begin:span_end].tolist()
+        )
+        spans = [
+            {"text": text, "element": element, "subcategory": subcategory}
+            for text, element, subcategory in zip(
+                span_texts, span_elements, span_subcategories
+            )
+        ]
+
+        post_begin, post_end = self._range("timeline_posts", i)
+        text_range = self._range("timeline_texts", i)
+        post_ids = self._strings(a["post_ids"][post_begin:post_end].tolist())
+        post_summaries = self._strings(
+            a["post_summaries"][post_begin:post_end].tolist()
+        )
+        wellbeing_scores = a["post_wellbeing_scores"][post_begin:post_end].tolist()
+        post_level = {
+            post_id: {
+                "summary": summary,
+                "summary_sents": self._sentences("post_summary", k),
+                "wellbeing_score": _wellbeing_value(wellbeing_score),
+            }
+            for k, post_id, summary, wellbeing_score in zip(
+                range(post_begin, post_end), post_ids, post_summaries, wellbeing_scores
+            )
+        }
+
+        return {
+            "timeline_level": {
+                "summary": self._strings([a["timeline_summaries"][i]])[0],
+                "summary_sents": self._sentences("timeline_summary", i),
+                "adaptive_spans": spans[: span_middle - span_begin],
+                "maladaptive_spans": spans[span_middle - span_begin :],
+                "sents": [self._sentences("text", k) for k in range(*text_range)],
+                "post_ids": post_ids,
+            },
+            "post_level": post_level,
+        }
+
+    def __iter__(self):
+        return iter(self.timeline_index)
+
+    def __len__(self):
+        return len(self.timeline_index)
+
+    def __contains__(self, timeline_id):
+        return timeline_id in self.timeline_index
+
+    def post_ids(self, timeline_id):
+        """Post IDs of a timeline, without decoding the rest of it."""
+        post_begin, post_end = self._range(
+            "timeline_posts", self.timeline_index[timeline_id]
+        )
+        return self._strings(self.arrays["post_ids"][post_begin:post_end].tolist())
+
+    def wellbeing_scores(self, timeline_id):
+        """Gold wellbeing score of each post of a timeline (NaN if not annotated), backed by the mapped file."""
+        i = self.timeline_index[timeline_id]
+        posts = self.arrays["timeline_posts"]
+        return self.arrays["post_wellbeing_scores"][posts[i] : posts[i + 1]]
+
+
+def source_fingerprint(source_path: str = None):
+    """Hash, size and modification time of the processed gold file a store is built from."""
+    if source_path is None:
+        return {"source_sha256": None}
+    stat = os.stat(source_path)
+    return {
+        "source_sha256": hash_file(source_path),
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def is_up_to_date(store: GoldStore, gold_data_path: str):
+    """
+    Whether a store holds the data of a processed gold file. The file is only hashed if
+    its size or modification time differ from those recorded in the store.
+    """
+    stat = os.stat(gold_data_path)
+    if (store.source_size, store.source_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+        return True
+    return store.source_sha256 == hash_file(gold_data_path)
+
+
+def gold_data_hash(gold_data, gold_data_path: str):
+    """
+    SHA-256 of the processed gold file, as returned by `load_gold_data`. Recorded in the
+    gold store, so the file is not hashed again when it was loaded from an up-to-date store.
+    """
+    if isinstance(gold_data, GoldStore) and gold_data_path != gold_data.path:
+        return gold_data.source_sha256
+    return hash_file(gold_data_path)
+
+
+def load_gold_data(gold_data_path: str):
+    """
+    Load processed gold data, from its gold store if one is up to date with the JSON file.
+
+    Returns:
+        (gold data, path of the file it was read from)
+    """
+    store_path = GoldStore.path_for(gold_data_path)
+    if os.path.exists(store_path):
+        store = GoldStore(store_path)
+        if not os.path.exists(gold_data_path):
+            return store, store_path
+        if is_up_to_date(store, gold_data_path):
+            logger.info(f"Loading gold data from {store_path}")
+            return store, gold_data_path
+        logger.warning(
+            f"Gold store {store_path} is out of date with {gold_data_path}; loading the JSON file. "
+            "Rebuild it with `python process_gold_data.py --gold-store`."
+        )
+    with open(gold_data_path, "r", encoding="utf-8") as f:
+        return json.load(f), gold_data_path
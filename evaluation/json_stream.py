@@ -0,0 +1,85 @@
+"""
+Incremental parsing of large JSON objects, one top-level (key, value) pair at a time.
+
+Used by submission_validator.py --stream, and by process_gold_data.py to copy unchanged
+timelines from the previous gold file without loading it.
+"""
+
+import json
+
+
+class NotAJSONObject(ValueError):
+    """Raised when streaming a JSON document whose root is not an object."""
+
+
+def iter_json_object_items(file, chunk_size=2**16):
+    """
+    Incrementally parse a JSON document whose root is an object,
+    yielding its (key, value) pairs one at a time.
+
+    Only the value being parsed is held in memory. Raises json.JSONDecodeError
+    on malformed input and NotAJSONObject if the root is not an object.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def read_more():
+        # Read at least as much as is buffered, so re-parsing a long value stays linear
+        nonlocal buffer, pos, eof
+        chunk = file.read(max(chunk_size, len(buffer) - pos))
+        buffer, pos = buffer[pos:] + chunk, 0
+        eof = not chunk
+
+    def next_char():
+        # Skip whitespace and return the next character ("" at end of file)
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\n\r":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos : pos + 1]
+            read_more()
+
+    def decode_value():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number cut off at the end of the buffer (e.g. "1." of "1.5")
+                # still parses, so only accept values followed by a delimiter
+                if eof or (end < len(buffer) and buffer[end] not in "0123456789.eE+-"):
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            read_more()
+
+    def expect(chars):
+        nonlocal pos
+        char = next_char()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", buffer, pos)
+        pos += 1
+        return char
+
+    if next_char() != "{":
+        raise NotAJSONObject("JSON root is not an object")
+    pos += 1
+    if next_char() == "}":
+        pos += 1
+    else:
+        while True:
+            if next_char() != '"':
+                raise json.JSONDecodeError(
+                    "Expecting property name enclosed in double quotes", buffer, pos
+                )
+            key = decode_value()
+            expect(":")
+            next_char()
+            yield key, decode_value()
+            if expect(",}") == "}":
+                break
+
+    if next_char():
+        raise json.JSONDecodeError("Extra data", buffer, pos)
@@ -0,0 +1,299 @@
+"""
+Bootstrap confidence intervals of leaderboard metrics, and paired permutation tests
+between submissions.
+
+With only a handful of timelines, differences between submissions may be noise. Each
+resample draws the timelines with replacement; a metric's resampled value is the mean
+of all its result rows in the drawn timelines, like the leaderboard mean over all rows
+(e.g. over the posts of Task B). All (team, submission, task, metric) groups share the
+same resamples, which are drawn at once as a matrix of timeline multiplicities, so the
+resampled means of all groups are two matrix products: multiplicities x per-timeline
+sums over multiplicities x per-timeline counts.
+
+Paired permutation (randomization) tests compare every pair of submissions on each main
+metric over the timelines both were scored on. Under the null hypothesis, the two
+submissions' per-timeline scores are exchangeable, i.e. the sign of each per-timeline
+difference is random. All pairs share the same random sign flips, so the permuted mean
+differences of all pairs are one matrix product: differences x sign flips.
+
+Usage:
+    python leaderboard_stats.py results/results_dev_{timestamp}.csv
+    python leaderboard_stats.py results/results_dev_{timestamp}
+"""
+
+import os
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("leaderboard_stats")
+
+GROUP_COLUMNS = ["team_name", "submission_id", "task", "metric"]
+
+# Main metric of each task (A.1, A.2, B, C)
+MAIN_METRICS = [
+    "bertscore_recall",
+    "mse",
+    "post_mean_consistency_gold",
+    "timeline_mean_consistency_gold",
+]
+
+# Resampled or permuted values computed at once (e.g. resamples x groups), bounding memory use
+MAX_CHUNK_ELEMENTS = 2**24
+
+
+def read_results_csv(results_path: str):
+    """Read a results CSV written by run.py (with an index column before the results dataset)."""
+    results_df = pd.read_csv(
+        results_path, dtype={"team_name": str, "submission_id": str}
+    )
+    return results_df.drop(columns="Unnamed: 0", errors="ignore")
+
+
+def timeline_sums(results_df: pd.DataFrame):
+    """
+    Sum and number of the values of each group in each timeline.
+
+    Args:
+        results_df: Per-timeline results, with a row per metric value (see results_dataset.load_results)
+
+    Returns:
+        (group index, timeline IDs, sums and counts as (groups, timelines) arrays)
+    """
+    aggregated = (
+        results_df.groupby(GROUP_COLUMNS + ["timeline_id"], observed=True)
+        .value.agg(["sum", "count"])
+        .unstack("timeline_id", fill_value=0)
+    )
+    return (
+        aggregated.index,
+        aggregated["sum"].columns,
+        aggregated["sum"].to_numpy(dtype=float),
+        aggregated["count"].to_numpy(dtype=float),
+    )
+
+
+def resample_multiplicities(num_timelines: int, num_resamples: int, rng):
+    """
+    Draw bootstrap resamples of timelines.
+
+    Returns:
+        (num_resamples, num_timelines) array: how often each timeline is drawn in each resample
+    """
+    draws = rng.integers(0, num_timelines, size=(num_resamples, num_timelines))
+    draws += np.arange(num_resamples)[:, None] * num_timelines
+    return np.bincount(draws.ravel(), minlength=num_resamples * num_timelines).reshape(
+        num_resamples, num_timelines
+    )
+
+
+def bootstrap_confidence_intervals(
+    results_df: pd.DataFrame,
+    num_resamples: int = 10000,
+    confidence: float = 0.95,
+    seed: int = 0,
+):
+    """
+    Percentile bootstrap confidence intervals over timelines of every leaderboard metric.
+
+    Args:
+        results_df: Per-timeline results, with a row per metric value (see results_dataset.load_results)
+        num_resamples: Number of bootstrap resamples of the timelines
+        confidence: Confidence level of the intervals
+        seed: Seed of the resampling
+
+    Returns:
+        DataFrame indexed by (team_name, submission_id, task, metric) with the mean over
+        all rows, the interval bounds ci_low and ci_high, and the number of timelines
+    """
+    groups, timeline_ids, sums, counts = timeline_sums(results_df)
+    multiplicities = resample_multiplicities(
+        len(timeline_ids), num_resamples, np.random.default_rng(seed)
+    ).astype(float)
+    alpha = 1 - confidence
+
+    bounds = np.empty((2, len(groups)))
+    chunk_size = max(1, MAX_CHUNK_ELEMENTS // num_resamples)
+    for start in range(0, len(groups), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        resampled_counts = multiplicities @ counts[chunk].T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # NaN if a resample draws none of the timelines a metric has values for
+            resampled_means = (multiplicities @ sums[chunk].T) / resampled_counts
+        bounds[:, chunk] = np.nanquantile(
+            resampled_means, [alpha / 2, 1 - alpha / 2], axis=0
+        )
+
+    return pd.DataFrame(
+        {
+            "mean": results_df.groupby(GROUP_COLUMNS, observed=True)
+            .value.mean()
+            .loc[groups],
+            "ci_low": bounds[0],
+            "ci_high": bounds[1],
+            "num_timelines": (counts > 0).sum(axis=1),
+        },
+        index=groups,
+    )
+
+
+def paired_permutation_tests(
+    results_df: pd.DataFrame,
+    metrics=MAIN_METRICS,
+    num_permutations: int = 10000,
+    seed: int = 0,
+):
+    """
+    Two-sided paired permutation tests between all pairs of submissions on each metric.
+    A submission's score on a timeline is the mean of its rows in the timeline (e.g. over
+    posts), and the test statistic is the mean difference over the shared timelines.
+
+    Args:
+        results_df: Per-timeline results, with a row per metric value (see results_dataset.load_results)
+        metrics: Metrics to compare submissions on
+        num_permutations: Number of random sign flips of the per-timeline differences
+        seed: Seed of the sign flips
+
+    Returns:
+        DataFrame with one row per metric and pair of submissions ("{team}_{submission ID}"):
+        mean scores over the shared timelines, their difference, its p-value and the number
+        of shared timelines
+    """
+    results_df = results_df[results_df.metric.isin(metrics)]
+    timeline_means = (
+        results_df.groupby(
+            ["metric", "team_name", "submission_id", "timeline_id"], observed=True
+        )
+        .value.mean()
+        .unstack("timeline_id")
+    )
+    signs = np.random.default_rng(seed).choice(
+        [-1.0, 1.0], size=(num_permutations, timeline_means.shape[1])
+    )
+
+    tables = []
+    for metric in metrics:
+        if metric not in timeline_means.index.get_level_values("metric"):
+            continue
+        metric_means = timeline_means.loc[metric]
+        submissions = [
+            f"{team}_{submission}" for team, submission in metric_means.index
+        ]
+        values = metric_means.to_numpy(dtype=float)
+        a, b = np.triu_indices(len(values), k=1)
+        shared = ~np.isnan(values[a]) & ~np.isnan(values[b])
+        num_shared = shared.sum(axis=1)
+        values_a = np.where(shared, values[a], 0.0)
+        values_b = np.where(shared, values[b], 0.0)
+        differences = values_a - values_b
+
+        num_extreme = np.zeros(len(a))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            observed = differences.sum(axis=1) / num_shared
+            chunk_size = max(1, MAX_CHUNK_ELEMENTS // num_permutations)
+            for start in range(0, len(a), chunk_size):
+                chunk = slice(start, start + chunk_size)
+                permuted = (differences[chunk] @ signs.T) / num_shared[chunk, None]
+                # With a tolerance for the rounding of the matrix product
+                num_extreme[chunk] = (
+                    np.abs(permuted) >= np.abs(observed[chunk, None]) - 1e-12
+                ).sum(axis=1)
+            tables.append(
+                pd.DataFrame(
+                    {
+                        "metric": metric,
+                        "submission_a": [submissions[i] for i in a],
+                        "submission_b": [submissions[i] for i in b],
+                        "mean_a": values_a.sum(axis=1) / num_shared,
+                        "mean_b": values_b.sum(axis=1) / num_shared,
+                        "mean_diff": observed,
+                        "p_value": np.where(
+                            num_shared > 0,
+                            (num_extreme + 1) / (num_permutations + 1),
+                            np.nan,
+                        ),
+                        "num_timelines": num_shared,
+                    }
+                )
+            )
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+
+def main(args):
+    if os.path.isdir(args.results_path):
+        # Imported here, as CSV results do not need pyarrow
+        from results_dataset import load_results
+
+        results_df = load_results(
+            args.results_path, columns=GROUP_COLUMNS + ["timeline_id", "value"]
+        )
+    else:
+        results_df = read_results_csv(args.results_path)
+    stats_df = bootstrap_confidence_intervals(
+        results_df,
+        num_resamples=args.resamples,
+        confidence=args.confidence,
+        seed=args.seed,
+    )
+    print(stats_df.to_string())
+    if args.output:
+        stats_df.to_csv(args.output)
+        logger.info(f"Confidence intervals saved to {args.output}")
+
+    if args.permutations:
+        significance_df = paired_permutation_tests(
+            results_df, num_permutations=args.permutations, seed=args.seed
+        )
+        print(significance_df.to_string())
+        if args.significance_output:
+            significance_df.to_csv(args.significance_output, index=False)
+            logger.info(f"Permutation tests saved to {args.significance_output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "results_path",
+        type=str,
+        help="Results CSV or results dataset directory written by run.py",
+    )
+    parser.add_argument(
+        "--resamples",
+        type=int,
+        default=10000,
+        help="Number of bootstrap resamples of the timelines.",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the intervals.",
+    )
+    parser.add_argument(
+        "--permutations",
+        type=int,
+        default=10000,
+        help="Number of permutations of the paired tests between submissions; 0 to skip them.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the bootstrap resampling and permutations.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Optional CSV file to save the confidence intervals to.",
+    )
+    parser.add_argument(
+        "--significance-output",
+        type=str,
+        default=None,
+        help="Optional CSV file to save the permutation tests to.",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,98 @@
+"""
+Memory accounting for the encoder workloads.
+
+deberta-xlarge-mnli activations grow with the number of tokens per batch (and
+quadratically with the span length in attention), and the span similarity grid grows
+with the product of gold and predicted token counts. A submission pasting whole
+posts as evidence can therefore exhaust memory. The estimates below bound batches
+and grid chunks under a memory ceiling (see SpanScorer.apply_memory_limit),
+and the RSS helpers measure the actual per-timeline peak.
+
+Peak RSS per timeline relies on Linux's /proc/self/clear_refs to reset the
+high-water mark; elsewhere, the process-wide peak (getrusage) is reported. Where
+neither is available (e.g. on Windows), the RSS helpers return None.
+"""
+
+import sys
+
+try:
+    import resource
+except ImportError:
+    # Unix only
+    resource = None
+
+BYTES_PER_FLOAT = 4
+# float32 similarities, their masked copy and the bool pair mask of compute_similarity_matrix
+SIMILARITY_BYTES_PER_ELEMENT = 2 * BYTES_PER_FLOAT + 1
+
+
+def estimate_encoder_bytes(num_items, max_length, config):
+    """
+    Estimated peak activation memory of one no-grad encoder forward pass.
+
+    Args:
+        num_items: Number of sequences in the batch
+        max_length: Padded sequence length
+        config: transformers model config (hidden_size, intermediate_size, num_attention_heads)
+    """
+    num_tokens = num_items * max_length
+    # One layer is live at a time: hidden states (input, residual, output, q/k/v),
+    # the feed-forward intermediate, and attention scores; DeBERTa's disentangled
+    # attention adds content-to-position and position-to-content scores
+    per_token = 6 * config.hidden_size + config.intermediate_size
+    attention = 3 * num_items * config.num_attention_heads * max_length**2
+    return BYTES_PER_FLOAT * (num_tokens * per_token + attention)
+
+
+def is_out_of_memory(error):
+    """Whether an exception raised by torch signals an allocation failure (CPU or CUDA)."""
+    if isinstance(error, MemoryError):
+        return True
+    message = str(error)
+    return isinstance(error, RuntimeError) and (
+        "out of memory" in message or "can't allocate memory" in message
+    )
+
+
+def _proc_status_bytes(field):
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def current_rss_bytes():
+    """Current RSS, or None if it cannot be measured on this platform."""
+    rss = _proc_status_bytes("VmRSS")
+    return rss if rss is not None else _max_rss_bytes()
+
+
+def peak_rss_bytes():
+    """
+    Peak RSS since the last `reset_peak_rss` (or since the process started),
+    or None if it cannot be measured on this platform.
+    """
+    peak = _proc_status_bytes("VmHWM")
+    return peak if peak is not None else _max_rss_bytes()
+
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS, where supported. Returns whether it was reset."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
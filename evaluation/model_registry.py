@@ -0,0 +1,142 @@
+"""
+Process-wide registry for the models used by the scorers.
+
+Loading deberta-xlarge-mnli (BERTScore) and DeBERTa-v3-large (NLI) takes several
+GB and tens of seconds on CPU, so scorers request models from the registry
+instead of loading them directly. Instances are shared per
+(kind, model name, device, dtype) for the lifetime of the process, or until
+they are released.
+"""
+
+import gc
+import logging
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from bert_score import BERTScorer
+from onnx_backend import load_onnx_sequence_classifier, load_onnx_encoder
+
+logger = logging.getLogger("model_registry")
+
+
+def get_default_device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _load_tokenizer(model_name, device, dtype, **kwargs):
+    return AutoTokenizer.from_pretrained(model_name, **kwargs)
+
+
+def _load_sequence_classifier(model_name, device, dtype, **kwargs):
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, **kwargs)
+    if dtype == "qint8":
+        # Dynamic int8 quantization of the Linear layers; only runs on CPU
+        if device != "cpu":
+            raise ValueError(
+                f"Dynamic int8 quantization requires device 'cpu', got '{device}'"
+            )
+        model.eval()
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    if dtype is not None:
+        model = model.to(getattr(torch, dtype))
+    model = model.to(device)
+    model.eval()
+    return model
+
+
+def _load_bertscorer(model_name, device, dtype, **kwargs):
+    scorer = BERTScorer(model_type=model_name, device=device, **kwargs)
+    if dtype is not None:
+        scorer._model = scorer._model.to(getattr(torch, dtype))
+    return scorer
+
+
+class ModelRegistry:
+    """
+    Hands out shared model instances keyed by (kind, model_name, device, dtype).
+
+    Supported kinds:
+        - "tokenizer": transformers AutoTokenizer
+        - "sequence_classifier": transformers AutoModelForSequenceClassification
+        - "bertscorer": bert_score BERTScorer (wraps its own encoder and tokenizer)
+        - "onnx_sequence_classifier", "onnx_encoder": ONNX Runtime sessions standing in for
+          the sequence classifier and the BERTScore encoder (see onnx_backend.py)
+
+    Extra keyword arguments are forwarded to the loader and are part of the key,
+    e.g. BERTScorer(rescale_with_baseline=...) yields a distinct instance.
+    dtype is a torch dtype name (e.g. "float16"), or "qint8" for a sequence classifier
+    with dynamically int8-quantized Linear layers (CPU only).
+    """
+
+    loaders = {
+        "tokenizer": _load_tokenizer,
+        "sequence_classifier": _load_sequence_classifier,
+        "bertscorer": _load_bertscorer,
+        "onnx_sequence_classifier": load_onnx_sequence_classifier,
+        "onnx_encoder": load_onnx_encoder,
+    }
+
+    def __init__(self):
+        self._models = dict()
+
+    @staticmethod
+    def make_key(kind, model_name, device=None, dtype=None, **kwargs):
+        return (
+            kind,
+            model_name,
+            device or get_default_device(),
+            dtype,
+            tuple(sorted(kwargs.items())),
+        )
+
+    def get(self, kind, model_name, device=None, dtype=None, **kwargs):
+        """Return the shared instance for the key, loading it on first request."""
+        if kind not in self.loaders:
+            raise ValueError(
+                f"Unknown model kind: {kind}. Valid kinds are: {list(self.loaders)}"
+            )
+        key = self.make_key(kind, model_name, device=device, dtype=dtype, **kwargs)
+        if key not in self._models:
+            logger.info(f"Loading {kind} {model_name} on {key[2]}")
+            self._models[key] = self.loaders[kind](model_name, key[2], dtype, **kwargs)
+        return self._models[key]
+
+    def warm_up(self, specs):
+        """
+        Load models ahead of time.
+
+        Args:
+            specs: Iterable of dicts with the arguments of `get`, e.g.
+                   {"kind": "tokenizer", "model_name": "microsoft/deberta-xlarge-mnli"}
+        """
+        for spec in specs:
+            self.get(**spec)
+
+    def is_loaded(self, kind, model_name, device=None, dtype=None, **kwargs):
+        key = self.make_key(kind, model_name, device=device, dtype=dtype, **kwargs)
+        return key in self._models
+
+    def release(self, model_name=None):
+        """
+        Drop references to loaded models so their memory can be reclaimed.
+
+        Args:
+            model_name: If given, only release instances of this model; otherwise release all.
+        """
+        keys = [
+            key for key in self._models if model_name is None or key[1] == model_name
+        ]
+        for key in keys:
+            del self._models[key]
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return len(keys)
+
+    def __len__(self):
+        return len(self._models)
+
+
+# Registry shared by all scorers in the process unless one is passed explicitly
+default_registry = ModelRegistry()
@@ -0,0 +1,178 @@
+"""
+Persistent on-disk cache of NLI softmax outputs.
+
+Gold summaries do not change between runs and many submissions share predicted
+sentences word for word, so (premise, hypothesis) pairs scored once are stored in
+a local SQLite file and reused across runs. Entries are keyed by a hash of the
+model fingerprint (model name and tokenizer settings), premise and hypothesis,
+and are evicted least-recently-used once the cache exceeds `max_entries`. The number
+of entries is counted once when the cache is opened and then kept up to date, so
+entries added by other processes (e.g. workers) since are counted on the next open.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from pathlib import Path
+
+# Keep well below SQLite's limit on the number of host parameters in a statement
+_QUERY_CHUNK_SIZE = 500
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class NLICache:
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        """
+        Args:
+            path: SQLite file to store cached NLI outputs in (created if missing)
+            max_entries: Maximum number of cached pairs before LRU eviction
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS nli_cache (
+                key TEXT PRIMARY KEY,
+                premise_hash TEXT NOT NULL,
+                entailment REAL NOT NULL,
+                neutral REAL NOT NULL,
+                contradiction REAL NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+            """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS nli_cache_last_used ON nli_cache (last_used)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS nli_cache_premise ON nli_cache (premise_hash)"
+        )
+        self.connection.commit()
+        self.num_entries = len(self)
+
+    @staticmethod
+    def make_key(fingerprint: dict, premise: str, hypothesis: str):
+        """Hash of the model fingerprint, premise and hypothesis."""
+        return hash_text(json.dumps([fingerprint, premise, hypothesis], sort_keys=True))
+
+    def get_many(self, keys):
+        """
+        Look up cached outputs.
+
+        Returns:
+            Dictionary mapping each found key to (entailment, neutral, contradiction)
+        """
+        found = dict()
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), _QUERY_CHUNK_SIZE):
+            chunk = unique_keys[start : start + _QUERY_CHUNK_SIZE]
+            rows = self.connection.execute(
+                "SELECT key, entailment, neutral, contradiction FROM nli_cache "
+                f"WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for key, *probs in rows:
+                found[key] = tuple(probs)
+
+        now = time.time_ns()
+        self.connection.executemany(
+            "UPDATE nli_cache SET last_used = ? WHERE key = ?",
+            [(now, key) for key in found],
+        )
+        self.connection.commit()
+
+        num_hits = sum(key in found for key in keys)
+        self.hits += num_hits
+        self.misses += len(keys) - num_hits
+        return found
+
+    def put_many(self, entries):
+        """
+        Store outputs.
+
+        Args:
+            entries: Iterable of (key, premise, (entailment, neutral, contradiction))
+        """
+        rows = {
+            key: (key, hash_text(premise), *map(float, probs))
+            for key, premise, probs in entries
+        }
+        # Replaced entries do not add to the number of entries
+        keys = list(rows)
+        num_existing = 0
+        for start in range(0, len(keys), _QUERY_CHUNK_SIZE):
+            chunk = keys[start : start + _QUERY_CHUNK_SIZE]
+            (num_chunk_existing,) = self.connection.execute(
+                "SELECT COUNT(*) FROM nli_cache "
+                f"WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchone()
+            num_existing += num_chunk_existing
+
+        now = time.time_ns()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO nli_cache VALUES (?, ?, ?, ?, ?, ?)",
+            [(*row, now) for row in rows.values()],
+        )
+        self.connection.commit()
+        self.num_entries += len(rows) - num_existing
+        self.evict()
+
+    def invalidate_premises(self, premises):
+        """
+        Remove all entries with one of the given premises, e.g. gold summary sentences
+        that no longer exist after the gold data changed.
+
+        Returns:
+            Number of removed entries
+        """
+        premise_hashes = list({hash_text(premise) for premise in premises})
+        num_removed = 0
+        for start in range(0, len(premise_hashes), _QUERY_CHUNK_SIZE):
+            chunk = premise_hashes[start : start + _QUERY_CHUNK_SIZE]
+            num_removed += self.connection.execute(
+                "DELETE FROM nli_cache "
+                f"WHERE premise_hash IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).rowcount
+        self.connection.commit()
+        self.num_entries = max(self.num_entries - num_removed, 0)
+        return num_removed
+
+    def evict(self):
+        """Remove least recently used entries beyond `max_entries`."""
+        excess = self.num_entries - self.max_entries
+        if excess <= 0:
+            return 0
+        num_removed = self.connection.execute(
+            "DELETE FROM nli_cache WHERE key IN "
+            "(SELECT key FROM nli_cache ORDER BY last_used LIMIT ?)",
+            (excess,),
+        ).rowcount
+        self.connection.commit()
+        self.num_entries -= num_removed
+        return num_removed
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM nli_cache").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+            "size_mb": os.path.getsize(self.path) / 2**20,
+        }
+
+    def close(self):
+        self.connection.close()
@@ -1,21 +1,80 @@
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import numpy as np
-from typing import List
+from typing import List, Tuple
+from model_registry import default_registry, get_default_device
+from onnx_backend import INFERENCE_BACKENDS
+from batching import TokenBudgetBatcher
+
+DEFAULT_MODEL_NAME = "MoritzLaurer/DeBERTa-v3-large-mnli-fever-anli-ling-wanli"
 
 
 # Task B, C
 class NLIScorer:
+    label_names = ["entailment", "neutral", "contradiction"]
+
     def __init__(
         self,
-        model_name: str = "MoritzLaurer/DeBERTa-v3-large-mnli-fever-anli-ling-wanli",
+        model_name: str = DEFAULT_MODEL_NAME,
+        registry=None,
+        batch_size: int = None,
+        cache=None,
+        quantize: bool = False,
+        backend: str = "torch",
+        max_tokens: int = 4096,
     ):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        """
+        Args:
+            model_name: NLI model
+            registry: ModelRegistry to load models from (defaults to the process-wide one)
+            batch_size: Optional maximum number of pairs per forward pass
+            cache: Optional NLICache
+            quantize: If True, run the model on CPU with dynamic int8 quantization
+                      of its Linear layers (faster, but slightly different scores)
+            backend: "torch", or "onnx" to run the model with ONNX Runtime on CPU
+                     (see onnx_backend.py)
+            max_tokens: Maximum padded tokens per forward pass (see batching.py)
+        """
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(
+                f"Unknown backend: {backend}. Valid backends are: {INFERENCE_BACKENDS}"
+            )
+        if quantize and backend != "torch":
+            raise ValueError("Dynamic int8 quantization requires the torch backend")
+        self.quantize = quantize
+        self.backend = backend
+        self.device = "cpu" if (quantize or backend == "onnx") else get_default_device()
         self.model_name = model_name
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(
-            self.model_name
-        ).to(self.device)
+        self.batch_size = batch_size
+        self.batcher = TokenBudgetBatcher(
+            max_tokens=max_tokens, max_batch_size=batch_size
+        )
+        # Optional NLICache; if None, every pair is sent to the model
+        self.cache = cache
+        # (premise, hypothesis) -> softmax scores computed ahead by prefetch
+        self.prefetched = dict()
+        self.registry = registry if registry is not None else default_registry
+        for attr, spec in self.model_specs().items():
+            setattr(self, attr, self.registry.get(**spec))
+
+    def model_specs(self):
+        """Registry requests for the models used by this scorer (see ModelRegistry.warm_up)."""
+        return {
+            "tokenizer": {
+                "kind": "tokenizer",
+                "model_name": self.model_name,
+                "device": self.device,
+            },
+            "model": {
+                "kind": (
+                    "onnx_sequence_classifier"
+                    if self.backend == "onnx"
+                    else "sequence_classifier"
+                ),
+                "model_name": self.model_name,
+                "device": self.device,
+                "dtype": "qint8" if self.quantize else None,
+            },
+        }
 
     def _compute_nli_scores(self, premise: str, hypothesis: str):
         input = self.tokenizer(
@@ -24,10 +83,134 @@ class NLIScorer:
         with torch.no_grad():
             output = self.model(input["input_ids"].to(self.device))
         prediction = torch.softmax(output["logits"][0], -1).tolist()
-        label_names = ["entailment", "neutral", "contradiction"]
-        prediction = {name: float(pred) for pred, name in zip(prediction, label_names)}
+        prediction = {
+            name: float(pred) for pred, name in zip(prediction, self.label_names)
+        }
         return prediction
 
+    def cache_fingerprint(self):
+        """Settings that affect NLI outputs, used to key cached results."""
+        fingerprint = {
+            "model_name": self.model_name,
+            "truncation": True,
+            "max_length": self.tokenizer.model_max_length,
+        }
+        if self.quantize:
+            fingerprint["quantization"] = "dynamic_qint8"
+        if self.backend != "torch":
+            fingerprint["backend"] = self.backend
+        return fingerprint
+
+    def prefetch(self, pairs: List[Tuple[str, str]]):
+        """
+        Score each unique (premise, hypothesis) pair once and keep the outputs,
+        so that later predict_pairs calls over these pairs are lookups.
+
+        Returns:
+            Number of unique pairs
+        """
+        unique_pairs = list(dict.fromkeys(pairs))
+        probs = self.predict_pairs(unique_pairs)
+        self.prefetched.update(zip(unique_pairs, map(tuple, probs)))
+        return len(unique_pairs)
+
+    def predict_pairs(self, pairs: List[Tuple[str, str]]):
+        """
+        Batched equivalent of `_compute_nli_scores` over many (premise, hypothesis) pairs.
+        If a cache is set, only pairs missing from it are sent to the model.
+
+        Returns:
+            Array of shape (len(pairs), 3) with softmax scores in `label_names` order
+        """
+        if self.prefetched and all(pair in self.prefetched for pair in pairs):
+            return np.array([self.prefetched[pair] for pair in pairs]).reshape(
+                len(pairs), len(self.label_names)
+            )
+        if self.cache is None:
+            return self._predict_pairs(pairs)
+
+        fingerprint = self.cache_fingerprint()
+        keys = [self.cache.make_key(fingerprint, p, h) for p, h in pairs]
+        cached = self.cache.get_many(keys)
+
+        # Index of the first occurrence of each uncached pair
+        missing = dict()
+        for i, key in enumerate(keys):
+            if key not in cached and key not in missing:
+                missing[key] = i
+        missing_idx = list(missing.values())
+
+        def cache_batch(batch_idx, batch_probs):
+            # Cached as each micro-batch finishes, so that an interrupted run keeps them
+            self.cache.put_many(
+                [
+                    (keys[missing_idx[j]], pairs[missing_idx[j]][0], probs)
+                    for j, probs in zip(batch_idx, batch_probs)
+                ]
+            )
+
+        missing_probs = self._predict_pairs(
+            [pairs[i] for i in missing_idx], on_batch=cache_batch
+        )
+        cached.update(
+            {keys[i]: tuple(probs) for i, probs in zip(missing_idx, missing_probs)}
+        )
+        return np.array([cached[key] for key in keys]).reshape(
+            len(pairs), len(self.label_names)
+        )
+
+    def _predict_pairs(self, pairs: List[Tuple[str, str]], on_batch=None):
+        """
+        Run the model over (premise, hypothesis) pairs.
+
+        Pairs are sorted by token length and run in micro-batches under the batcher's
+        token budget, each padded only to its own longest pair.
+
+        Args:
+            on_batch: Optional callback called with (pair indices, softmax scores)
+                      as each micro-batch finishes
+        """
+        probs = np.zeros((len(pairs), len(self.label_names)))
+        if not pairs:
+            return probs
+
+        input_ids = self.tokenizer(
+            [premise for premise, _ in pairs],
+            [hypothesis for _, hypothesis in pairs],
+            truncation=True,
+        )["input_ids"]
+        for batch_idx in self.batcher.batches([len(ids) for ids in input_ids]):
+            batch = self.tokenizer.pad(
+                {"input_ids": [input_ids[i] for i in batch_idx]}, return_tensors="pt"
+            ).to(self.device)
+            with torch.no_grad():
+                output = self.model(
+                    input_ids=batch["input_ids"],
+                    attention_mask=batch["attention_mask"],
+                )
+            probs[batch_idx] = torch.softmax(output["logits"], -1).cpu().numpy()
+            if on_batch is not None:
+                on_batch(batch_idx, probs[batch_idx])
+        return probs
+
+    def compute_nli_matrices(self, premises: List[str], hypotheses: List[str]):
+        """
+        Run NLI over the full premise x hypothesis grid.
+
+        Returns:
+            (entailment, contradiction) arrays of shape (len(premises), len(hypotheses))
+        """
+        pairs = [
+            (premise, hypothesis) for premise in premises for hypothesis in hypotheses
+        ]
+        probs = self.predict_pairs(pairs)
+        shape = (len(premises), len(hypotheses))
+        entail_idx = self.label_names.index("entailment")
+        contradict_idx = self.label_names.index("contradiction")
+        return probs[:, entail_idx].reshape(shape), probs[:, contradict_idx].reshape(
+            shape
+        )
+
     def compute_nli_scores(
         self,
         source_sents: List[str],
@@ -48,14 +231,9 @@ class NLIScorer:
             Dictionary with computed NLI metrics
         """
         if predicted_sents:
-            entail_scores, contradict_scores = [], []
-            for source_sent in source_sents:
-                for predicted_sent in predicted_sents:
-                    scores = self._compute_nli_scores(source_sent, predicted_sent)
-                    entail_scores.append(scores["entailment"])
-                    contradict_scores.append(scores["contradiction"])
-            entail_scores, contradict_scores = np.array(entail_scores), np.array(
-                contradict_scores
+            # Rows are source sentences, columns are predicted sentences
+            entail_scores, contradict_scores = self.compute_nli_matrices(
+                premises=source_sents, hypotheses=predicted_sents
             )
             mean_consistency = 1 - contradict_scores.mean()
             max_entailment = entail_scores.max()
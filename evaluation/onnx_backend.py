@@ -0,0 +1,175 @@
+"""
+ONNX Runtime inference backend for the NLI classifier and the BERTScore encoder.
+
+Each model is exported to ONNX once and the graph is cached on disk under ONNX_CACHE_DIR,
+e.g. results/onnx/microsoft--deberta-xlarge-mnli-encoder-L40/model.onnx. Sessions run
+on ONNX Runtime's CPU execution provider with all graph optimizations enabled.
+
+The session wrappers are called like the PyTorch modules they replace, so scorers
+request them from the ModelRegistry ("onnx_sequence_classifier", "onnx_encoder")
+and use them unchanged. Scores agree with PyTorch eager (fp32, CPU) within
+ONNX_TOLERANCE (absolute, per NLI probability and per BERTScore F, and therefore per
+metric value); `python benchmark.py onnx` measures the actual difference.
+
+Requires onnxruntime (pip install onnxruntime), which is only imported when used.
+"""
+
+import os
+import shutil
+import logging
+import numpy as np
+import torch
+from config import ONNX_CACHE_DIR, INFERENCE_BACKENDS
+
+logger = logging.getLogger("onnx_backend")
+
+ONNX_TOLERANCE = 1e-4
+ONNX_OPSET = 17
+
+
+class _LogitsOutput(torch.nn.Module):
+    # Export wrapper: tensors in, logits out
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+class _HiddenStateOutput(torch.nn.Module):
+    # Export wrapper: tensors in, last hidden state out
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids, attention_mask=attention_mask)[0]
+
+
+def export_dir(model_name: str, kind: str, num_layers: int = None):
+    """Cache directory of an exported model."""
+    name = f"{model_name.replace('/', '--')}-{kind}"
+    if num_layers is not None:
+        name += f"-L{num_layers}"
+    return os.path.join(ONNX_CACHE_DIR, name)
+
+
+def export_model(
+    module: torch.nn.Module, path: str, output_name: str, output_axes: dict
+):
+    """
+    Export a module taking (input_ids, attention_mask) to ONNX, with dynamic batch and sequence axes.
+    Written to a temporary directory first, so an interrupted export never leaves a partial graph.
+    """
+    final_dir = os.path.dirname(path)
+    tmp_dir = f"{final_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    module.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            module,
+            (dummy, dummy),
+            os.path.join(tmp_dir, os.path.basename(path)),
+            input_names=["input_ids", "attention_mask"],
+            output_names=[output_name],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                output_name: output_axes,
+            },
+            opset_version=ONNX_OPSET,
+            # The TorchScript exporter keeps DeBERTa's dynamic sequence length; the dynamo
+            # exporter (default in recent torch) specializes it and produces wrong scores
+            dynamo=False,
+        )
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+
+
+def create_session(path: str):
+    """ONNX Runtime CPU session with all graph optimizations, using as many threads as torch."""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise ImportError(
+            "The ONNX backend requires onnxruntime: pip install onnxruntime"
+        )
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Follow torch.set_num_threads, e.g. --threads-per-worker in run.py
+    options.intra_op_num_threads = torch.get_num_threads()
+    return ort.InferenceSession(
+        path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+class _ORTModule:
+    def __init__(self, path: str):
+        self.path = path
+        self.session = create_session(path)
+
+    def eval(self):
+        return self
+
+    def _run(self, input_ids, attention_mask):
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        (output,) = self.session.run(
+            None,
+            {
+                "input_ids": input_ids.cpu().numpy().astype(np.int64),
+                "attention_mask": attention_mask.cpu().numpy().astype(np.int64),
+            },
+        )
+        return torch.from_numpy(output)
+
+
+class ORTSequenceClassifier(_ORTModule):
+    """Stands in for AutoModelForSequenceClassification: returns {"logits": tensor}."""
+
+    def __call__(self, input_ids, attention_mask=None):
+        return {"logits": self._run(input_ids, attention_mask)}
+
+
+class ORTEncoder(_ORTModule):
+    """Stands in for the BERTScore encoder in bert_score.utils.bert_encode: returns (last hidden state,)."""
+
+    def __call__(self, input_ids, attention_mask=None, output_hidden_states=False):
+        if output_hidden_states:
+            raise ValueError("The ONNX encoder only returns the last hidden state")
+        return (self._run(input_ids, attention_mask),)
+
+
+def load_onnx_sequence_classifier(model_name, device, dtype, **kwargs):
+    """Registry loader: exports the classifier on first use."""
+    if device != "cpu" or dtype is not None:
+        raise ValueError("The ONNX backend only runs fp32 models on device 'cpu'")
+    path = os.path.join(export_dir(model_name, "classifier"), "model.onnx")
+    if not os.path.exists(path):
+        from transformers import AutoModelForSequenceClassification
+
+        logger.info(f"Exporting {model_name} to {path}")
+        model = AutoModelForSequenceClassification.from_pretrained(model_name, **kwargs)
+        export_model(_LogitsOutput(model), path, "logits", {0: "batch"})
+    return ORTSequenceClassifier(path)
+
+
+def load_onnx_encoder(model_name, device, dtype, num_layers, **kwargs):
+    """Registry loader: exports the BERTScore encoder, truncated to `num_layers`, on first use."""
+    if device != "cpu" or dtype is not None:
+        raise ValueError("The ONNX backend only runs fp32 models on device 'cpu'")
+    path = os.path.join(export_dir(model_name, "encoder", num_layers), "model.onnx")
+    if not os.path.exists(path):
+        from bert_score.utils import get_model
+
+        logger.info(f"Exporting {model_name} (layer {num_layers}) to {path}")
+        model = get_model(model_name, num_layers)
+        export_model(
+            _HiddenStateOutput(model),
+            path,
+            "last_hidden_state",
+            {0: "batch", 1: "sequence"},
+        )
+    return ORTEncoder(path)
@@ -6,13 +6,16 @@ import argparse
 import os
 import json
 import random
-from nltk import sent_tokenize
-from config import DEV_SUBMISSIONS_DIR, TEST_SUBMISSIONS_DIR, DEV_PATHS, TEST_PATHS
+from sentence_splitter import SentenceSplitter
+from config import DEV_SUBMISSIONS_DIR, TEST_SUBMISSIONS_DIR, DEV_PATHS
 import logging
 
 logger = logging.getLogger("process_dummy_data")
 logging.basicConfig(level=logging.INFO)
 
+# Each post is split twice (see main), so splits are cached
+splitter = SentenceSplitter()
+
 
 def get_random_spans(text, num_spans=2, span_length=30):
     """Get random spans from text (may overlap)."""
@@ -28,7 +31,7 @@ def get_random_spans(text, num_spans=2, span_length=30):
 
 def get_random_sentences(text, num_sentences=2):
     """Get random sentences from text and join them."""
-    sentences = sent_tokenize(text)
+    sentences = splitter.tokenize(text)
     if num_sentences >= len(sentences):
         return text
     return " ".join(random.sample(sentences, num_sentences))
@@ -36,6 +39,9 @@ def get_random_sentences(text, num_sentences=2):
 
 def main(args):
     if args.test:
+        # Scans TEST_DIR, so only imported for the test split
+        from config import TEST_PATHS
+
         dummy_path = os.path.join(TEST_SUBMISSIONS_DIR, "dummy_test.json")
         filepaths = TEST_PATHS
     else:
@@ -85,7 +91,7 @@ def main(args):
                 "adaptive_evidence": adaptive_evidence,
                 "maladaptive_evidence": maladaptive_evidence,
                 "summary": get_random_sentences(
-                    text, num_sentences=max(3, len(sent_tokenize(text)))
+                    text, num_sentences=max(3, len(splitter.tokenize(text)))
                 ),
                 "wellbeing_score": random.randint(1, 10),
             }
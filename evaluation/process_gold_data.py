@@ -5,20 +5,27 @@ Will produce file with empty/None fields if source files are un-annotated.
 
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
 from config import (
     DATA_DIR,
     DEV_PATHS,
-    TEST_PATHS,
     DEV_ANNOTATED_FILENAME,
     TEST_ANNOTATED_FILENAME,
+    NLI_CACHE_PATH,
 )
-from nltk import sent_tokenize
+from sentence_splitter import split_sentences
+from gold_store import GoldStore
+from results_cache import hash_file
+from json_stream import iter_json_object_items
 import argparse
 import logging
 
 logger = logging.getLogger("process_gold_data")
 logging.basicConfig(level=logging.INFO)
 
+# Raw file fingerprints of a processed gold file, e.g. data/dev_manifest.json
+MANIFEST_SUFFIX = "_manifest.json"
+
 
 def process_annotated_data(data):
     """
@@ -52,9 +59,7 @@ def process_annotated_data(data):
                 - wellbeing_score (float): Wellbeing score for the post
     """
     timeline_summary = data["timeline_summary"].strip()
-    timeline_summary_sents = [
-        s.strip() for s in sent_tokenize(timeline_summary) if s.strip()
-    ]
+    timeline_summary_sents = split_sentences(timeline_summary)
     timeline_sents = []
     adaptive_spans = []
     maladaptive_spans = []
@@ -70,12 +75,10 @@ def process_annotated_data(data):
         post_ids.append(post_id)
         if summary:
             summary = summary.strip()
-            summary_sents = [s.strip() for s in sent_tokenize(summary) if s.strip()]
+            summary_sents = split_sentences(summary)
         else:
             summary_sents = []
-        timeline_sents.append(
-            [s.strip() for s in sent_tokenize(text) if s.strip()]
-        )  # retain one list per post
+        timeline_sents.append(split_sentences(text))  # retain one list per post
 
         evidence = post.get("evidence")
         if evidence:
@@ -117,9 +120,328 @@ def process_annotated_data(data):
     }
 
 
+def build_span_embedding_store(gold_data, gold_data_path):
+    """
+    Encode all gold evidence spans once with the BERTScore model used by SpanScorer
+    and save them next to the processed gold file (see span_embedding_store.py).
+    Embeddings of spans already in an existing store are reused, so after an
+    incremental rebuild only new spans are encoded.
+    """
+    # Only needed for this optional step, so avoid loading torch otherwise
+    from bert_score.utils import model2layers
+    from span_scorer import SpanScorer, DEFAULT_MODEL_NAME as SPAN_MODEL_NAME
+    from span_embedding_store import SpanEmbeddingStore
+
+    spans = set()
+    for gold_datum in gold_data.values():
+        for span_type in ["adaptive_spans", "maladaptive_spans"]:
+            for span in gold_datum["timeline_level"][span_type]:
+                if span["text"].strip():
+                    spans.add(span["text"].strip())
+    spans = sorted(spans)
+
+    store_prefix = SpanEmbeddingStore.prefix_for(gold_data_path)
+    num_layers = model2layers[SPAN_MODEL_NAME]
+    span_stats, num_tokens = dict(), dict()
+    if SpanEmbeddingStore.exists(store_prefix):
+        store = SpanEmbeddingStore(store_prefix)
+        if (store.model_name, store.num_layers) == (SPAN_MODEL_NAME, num_layers):
+            for span in spans:
+                if span in store:
+                    # Copies, as the store's files are overwritten below
+                    span_stats[span] = tuple(t.clone() for t in store.get(span))
+                    num_tokens[span] = store.num_tokens(span)
+        del store
+
+    new_spans = [span for span in spans if span not in span_stats]
+    if new_spans:
+        span_scorer = SpanScorer()
+        span_stats.update(span_scorer.encode_spans(new_spans))
+        num_tokens.update(zip(new_spans, span_scorer.count_tokens(new_spans)))
+
+    SpanEmbeddingStore.write(
+        store_prefix,
+        span_stats={span: span_stats[span] for span in spans},
+        num_tokens=num_tokens,
+        model_name=SPAN_MODEL_NAME,
+        num_layers=num_layers,
+    )
+    logger.info(
+        f"Saved embeddings for {len(spans)} gold spans ({len(new_spans)} newly encoded) "
+        f"to: {store_prefix}"
+    )
+
+
+def build_gold_store(gold_data, gold_data_path):
+    """Save processed gold data as a memory-mapped gold store next to the JSON file (see gold_store.py)."""
+    store_path = GoldStore.path_for(gold_data_path)
+    GoldStore.write(store_path, gold_data, source_path=gold_data_path)
+    logger.info(f"Saved gold store for {len(gold_data)} timelines to: {store_path}")
+
+
+def process_file(filepath):
+    """Load and process a raw annotated timeline file, returning (timeline ID, processed data)."""
+    with open(filepath, "r") as f:
+        data = json.load(f)
+    return data["timeline_id"], process_annotated_data(data)
+
+
+def iter_processed_files(filepaths, workers=1):
+    """
+    Process raw annotated timeline files, yielding (timeline ID, processed data) in file order.
+
+    Args:
+        workers: Number of processes; files are processed in parallel if greater than 1
+    """
+    if workers <= 1:
+        yield from map(process_file, filepaths)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(
+            process_file,
+            filepaths,
+            chunksize=max(1, len(filepaths) // (4 * workers)),
+        )
+
+
+def write_gold_data(timelines, gold_data_path):
+    """
+    Stream processed timelines into the gold file, one at a time. The output is the
+    same as json.dump of the dictionary mapping each timeline ID to its data.
+
+    Args:
+        timelines: Iterable of (timeline ID, processed data)
+
+    Returns:
+        Number of distinct timeline IDs written
+    """
+    timeline_ids = set()
+    with open(gold_data_path, "w") as f:
+        f.write("{")
+        for i, (timeline_id, gold_datum) in enumerate(timelines):
+            if i:
+                f.write(", ")
+            f.write(f"{json.dumps(timeline_id)}: {json.dumps(gold_datum)}")
+            timeline_ids.add(timeline_id)
+        f.write("}")
+    return len(timeline_ids)
+
+
+def iter_gold_data(gold_data_path):
+    """Read a processed gold file one timeline at a time, yielding (timeline ID, processed data)."""
+    with open(gold_data_path, "r") as f:
+        yield from iter_json_object_items(f)
+
+
+class OldGoldData:
+    """
+    Timelines of the previous gold file, read in one streaming pass. Timelines are
+    looked up in about the order they were written in, so only the few that are
+    skipped over (e.g. of removed files) are kept until they are looked up.
+    """
+
+    def __init__(self, gold_data_path):
+        self._file = (
+            open(gold_data_path, "r") if os.path.exists(gold_data_path) else None
+        )
+        self._items = iter_json_object_items(self._file) if self._file else iter(())
+        self._skipped = dict()
+
+    def pop(self, timeline_id):
+        """Old data of a timeline, or None if it did not exist."""
+        if timeline_id in self._skipped:
+            return self._skipped.pop(timeline_id)
+        for other_timeline_id, gold_datum in self._items:
+            if other_timeline_id == timeline_id:
+                return gold_datum
+            self._skipped[other_timeline_id] = gold_datum
+        return None
+
+    def remaining(self):
+        """(timeline ID, old data) of the timelines that were not looked up."""
+        yield from self._skipped.items()
+        yield from self._items
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def manifest_path_for(gold_data_path):
+    """Manifest location for a processed gold file, e.g. data/dev.json -> data/dev_manifest.json"""
+    return os.path.splitext(gold_data_path)[0] + MANIFEST_SUFFIX
+
+
+def load_manifest(manifest_path, gold_data_path):
+    """
+    Raw file entries of the manifest written with the processed gold file, or None if there
+    is no manifest or the gold file was changed since (then all raw files are reprocessed).
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest["gold_sha256"] != hash_file(gold_data_path):
+        logger.warning(f"{gold_data_path} does not match {manifest_path}")
+        return None
+    return manifest["files"]
+
+
+def check_raw_files(filepaths, manifest_files):
+    """
+    Find raw files that are new or changed since the manifest was written. A file
+    is unchanged if its size and mtime match, or else if its content hash matches.
+
+    Returns:
+        (manifest entry of each file, files to reprocess)
+    """
+    files, stale_filepaths = dict(), []
+    for filepath in filepaths:
+        stat = os.stat(filepath)
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        previous = manifest_files.get(filepath)
+        if previous is not None and all(previous[k] == v for k, v in entry.items()):
+            files[filepath] = previous
+            continue
+        entry["sha256"] = hash_file(filepath)
+        if previous is not None and previous["sha256"] == entry["sha256"]:
+            files[filepath] = {**previous, **entry}
+        else:
+            files[filepath] = entry
+            stale_filepaths.append(filepath)
+    return files, stale_filepaths
+
+
+def gold_summary_sents(gold_datum):
+    """Gold summary sentences of a timeline, the premises of its NLI pairs (Tasks B, C)."""
+    sents = set(gold_datum["timeline_level"]["summary_sents"])
+    for post in gold_datum["post_level"].values():
+        sents.update(post["summary_sents"])
+    return sents
+
+
+def invalidate_nli_cache(old_sents, gold_data_path):
+    """
+    Remove cached NLI outputs of gold summary sentences that changed or removed
+    timelines had, unless the gold file still has them.
+
+    Args:
+        old_sents: Gold summary sentences of the old versions of the timelines
+    """
+    removed_sents = set(old_sents)
+    # Sentences may also be shared with other timelines
+    for _, gold_datum in iter_gold_data(gold_data_path):
+        removed_sents.difference_update(gold_summary_sents(gold_datum))
+    if removed_sents:
+        # Only needed for this step, so avoid importing it otherwise
+        from nli_cache import NLICache
+
+        nli_cache = NLICache(NLI_CACHE_PATH)
+        num_removed = nli_cache.invalidate_premises(removed_sents)
+        nli_cache.close()
+        logger.info(
+            f"Removed {num_removed} NLI cache entries of {len(removed_sents)} "
+            "gold summary sentences that no longer exist"
+        )
+
+
+def span_embedding_store_exists(gold_data_path):
+    # Only needed for this check, so avoid loading torch otherwise
+    from span_embedding_store import SpanEmbeddingStore
+
+    return SpanEmbeddingStore.exists(SpanEmbeddingStore.prefix_for(gold_data_path))
+
+
+def update_gold_data(filepaths, manifest_files, gold_data_path, workers=1):
+    """
+    Process new and changed raw files, merge them with the unchanged timelines in file
+    order, and save the gold file (if anything changed) and its manifest.
+
+    Timelines are streamed into the new file: those of unchanged raw files are copied
+    from the old gold file, and only those of new and changed files are compared with
+    their old versions, so neither file is held in memory.
+
+    Args:
+        manifest_files: Raw file entries of the manifest of the old gold file, or None
+                        to reprocess all files
+
+    Returns:
+        (IDs of added, changed and removed timelines, IDs of removed timelines,
+         gold summary sentences of the old versions of changed and removed timelines)
+    """
+    manifest_files = manifest_files or dict()
+    files, stale_filepaths = check_raw_files(filepaths, manifest_files)
+    stale = set(stale_filepaths)
+    gold_data_exists = os.path.exists(gold_data_path)
+    kept_timeline_ids = {
+        files[filepath]["timeline_id"]
+        for filepath in filepaths
+        if filepath not in stale
+    }
+    old_timeline_ids = {entry["timeline_id"] for entry in manifest_files.values()}
+    changed_timeline_ids, removed_timeline_ids, old_sents = set(), set(), set()
+
+    if (
+        gold_data_exists
+        and not stale_filepaths
+        and kept_timeline_ids == old_timeline_ids
+    ):
+        logger.info(f"{gold_data_path} is up to date (0 files processed)")
+    else:
+        old_gold_data = OldGoldData(gold_data_path)
+
+        def iter_timelines():
+            processed = iter_processed_files(stale_filepaths, workers=workers)
+            for filepath in filepaths:
+                if filepath not in stale:
+                    timeline_id = files[filepath]["timeline_id"]
+                    yield timeline_id, old_gold_data.pop(timeline_id)
+                    continue
+                timeline_id, gold_datum = next(processed)
+                files[filepath]["timeline_id"] = timeline_id
+                old_gold_datum = old_gold_data.pop(timeline_id)
+                if gold_datum != old_gold_datum:
+                    changed_timeline_ids.add(timeline_id)
+                    if old_gold_datum is not None:
+                        old_sents.update(gold_summary_sents(old_gold_datum))
+                yield timeline_id, gold_datum
+
+        # Written under a temporary name, so that a failed run leaves the old gold file as is
+        tmp_path = f"{gold_data_path}.{os.getpid()}.tmp"
+        try:
+            num_timelines = write_gold_data(iter_timelines(), tmp_path)
+            assert num_timelines == len(filepaths)
+            for timeline_id, old_gold_datum in old_gold_data.remaining():
+                removed_timeline_ids.add(timeline_id)
+                old_sents.update(gold_summary_sents(old_gold_datum))
+            changed_timeline_ids |= removed_timeline_ids
+            old_gold_data.close()
+            if changed_timeline_ids or not gold_data_exists:
+                os.replace(tmp_path, gold_data_path)
+                logger.info(
+                    f"Saved processed annotations for {len(filepaths)} timelines to: {gold_data_path} "
+                    f"({len(stale_filepaths)} files processed, {len(changed_timeline_ids)} timelines changed)"
+                )
+            else:
+                logger.info(
+                    f"{gold_data_path} is up to date ({len(stale_filepaths)} files processed)"
+                )
+        finally:
+            old_gold_data.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    with open(manifest_path_for(gold_data_path), "w") as f:
+        json.dump({"gold_sha256": hash_file(gold_data_path), "files": files}, f)
+    return changed_timeline_ids, removed_timeline_ids, old_sents
+
+
 def main(args):
 
     if args.test:
+        # Scans TEST_DIR, so only imported for the test split
+        from config import TEST_PATHS
+
         gold_filename = TEST_ANNOTATED_FILENAME
         filepaths = TEST_PATHS
     else:
@@ -127,25 +449,49 @@ def main(args):
         filepaths = DEV_PATHS
 
     gold_data_path = os.path.join(DATA_DIR, gold_filename)
+    manifest_path = manifest_path_for(gold_data_path)
 
-    if os.path.exists(gold_data_path):
+    # Raw files the existing gold file was processed from
+    gold_data_exists, manifest_files = os.path.exists(gold_data_path), None
+    if gold_data_exists:
         logger.info(f"File exists at {gold_data_path}.")
-        exit()
-
-    gold_data = dict()
-    for filepath in filepaths:
-        with open(filepath, "r") as f:
-            data = json.load(f)
-        gold_data[data["timeline_id"]] = process_annotated_data(data)
+        if not filepaths or not all(os.path.exists(p) for p in filepaths):
+            logger.warning(
+                "Raw timeline files not found (see config.py), keeping the processed file as is."
+            )
+            filepaths = None
+        elif not args.rebuild:
+            manifest_files = load_manifest(manifest_path, gold_data_path)
 
-    assert len(gold_data) == len(filepaths)
+    changed_timeline_ids = set()
+    if filepaths is not None:
+        changed_timeline_ids, removed_timeline_ids, old_sents = update_gold_data(
+            filepaths, manifest_files, gold_data_path, args.workers
+        )
 
-    with open(gold_data_path, "w") as f:
-        json.dump(gold_data, f)
+    if changed_timeline_ids and gold_data_exists:
+        logger.info(
+            f"Changed timelines: {sorted(changed_timeline_ids - removed_timeline_ids)}, "
+            f"removed timelines: {sorted(removed_timeline_ids)}"
+        )
+        if old_sents and os.path.exists(NLI_CACHE_PATH):
+            invalidate_nli_cache(old_sents, gold_data_path)
 
-    logger.info(
-        f"Saved processed annotations for {len(filepaths)} timelines to: {gold_data_path}"
+    # Stores derived from the gold data are built on request, and then kept up to date
+    build_store = args.gold_store or (
+        changed_timeline_ids and os.path.exists(GoldStore.path_for(gold_data_path))
     )
+    build_span_store = args.span_embeddings or (
+        changed_timeline_ids and span_embedding_store_exists(gold_data_path)
+    )
+    if build_store or build_span_store:
+        # The stores are built from all timelines at once
+        with open(gold_data_path, "r") as f:
+            gold_data = json.load(f)
+        if build_store:
+            build_gold_store(gold_data, gold_data_path)
+        if build_span_store:
+            build_span_embedding_store(gold_data, gold_data_path)
 
 
 if __name__ == "__main__":
@@ -155,5 +501,28 @@ if __name__ == "__main__":
         action="store_true",
         help="If True, process test split. If False, process dev split (if specified in config.py)",
     )
+    parser.add_argument(
+        "--span-embeddings",
+        action="store_true",
+        help="If True, also precompute BERTScore embeddings of gold evidence spans for Task A.1",
+    )
+    parser.add_argument(
+        "--gold-store",
+        action="store_true",
+        help="If True, also save the processed annotations as a binary, memory-mapped gold store "
+        "read by run.py instead of the JSON file (converts an existing file)",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="If True, reprocess all raw files, e.g. after changing how they are processed. "
+        "By default, only files that are new or changed since the last run are processed",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to process raw timeline files with",
+    )
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,122 @@
+"""
+Content-addressed store of evaluation results.
+
+Results are stored per (submission, task) unit, keyed by a hash of the submission
+file content, the gold file content, the task and the scorer settings used for it.
+Each entry holds the per-timeline metric results of that unit, so a rerun only
+scores units whose inputs changed and rebuilds the aggregated results from the store.
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+# Bump when the metric definitions change, to invalidate all stored results
+RESULTS_FORMAT_VERSION = 1
+
+
+def hash_file(path, chunk_size=2**20):
+    """SHA-256 of a file's content."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def serialize_results(timeline_results):
+    """Convert a timeline's list of metric result dicts to plain JSON types."""
+    return [
+        {
+            metric_name: {
+                "task": metric_vals["task"],
+                "value": float(metric_vals["value"]),
+            }
+            for metric_name, metric_vals in curr_result.items()
+        }
+        for curr_result in timeline_results
+    ]
+
+
+class ResultsCache:
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Directory holding one JSON file per stored unit
+        """
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        Path(root).mkdir(parents=True, exist_ok=True)
+        # Avoid re-hashing the same file (e.g. the gold file) within a run
+        self._file_hashes = dict()
+
+    def add_file_hash(self, path, sha256):
+        """Use a known hash of a file, e.g. the gold file's hash recorded in its gold store."""
+        self._file_hashes[path] = sha256
+
+    def file_hash(self, path):
+        if path not in self._file_hashes:
+            self._file_hashes[path] = hash_file(path)
+        return self._file_hashes[path]
+
+    def make_key(self, submission_data_path, gold_data_path, task, scorer_config):
+        """
+        Args:
+            submission_data_path: Submission file
+            gold_data_path: Processed gold file
+            task: Task name (A1, A2, B, C)
+            scorer_config: JSON-serializable settings that affect the task's metrics
+
+        Returns:
+            Hex digest identifying the unit's inputs
+        """
+        return hashlib.sha256(
+            json.dumps(
+                {
+                    "version": RESULTS_FORMAT_VERSION,
+                    "submission": self.file_hash(submission_data_path),
+                    "gold": self.file_hash(gold_data_path),
+                    "task": task,
+                    "scorer_config": scorer_config,
+                },
+                sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return stored timeline results for a unit, or None if missing."""
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            self.misses += 1
+            return None
+        with open(entry_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        self.hits += 1
+        return entry["results"]
+
+    def put(self, key, timeline_to_results, metadata=None):
+        """
+        Store timeline results for a unit.
+
+        Args:
+            key: Unit key from `make_key`
+            timeline_to_results: Dictionary mapping timeline ID to list of metric result dicts
+            metadata: Optional descriptive fields (e.g. submission file name), not used for lookup
+        """
+        results = {
+            timeline_id: serialize_results(timeline_results)
+            for timeline_id, timeline_results in timeline_to_results.items()
+        }
+        entry_path = self._entry_path(key)
+        Path(entry_path).parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so an interrupted run never leaves a partial entry
+        tmp_path = f"{entry_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"metadata": metadata or {}, "results": results}, f)
+        os.replace(tmp_path, entry_path)
+        return results
@@ -0,0 +1,135 @@
+"""
+Columnar store of per-timeline results: a Parquet dataset partitioned by submission.
+
+run.py writes the results of each submission as one columnar batch as soon as all of
+its tasks are scored, e.g. to
+results/results_dev_{timestamp}/team_name={team}/submission_id={id}/part-0.parquet,
+and appends them to the results CSV, rather than keeping the results of all
+submissions in memory until the end of the run.
+Timeline IDs, metrics and tasks are dictionary-encoded (pandas categoricals when
+loaded), as are teams and submission IDs, which are stored as partitions.
+`load_results` reads only the requested columns, and only the files of the requested
+teams and submissions, e.g. for leaderboard queries.
+"""
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+RESULTS_COLUMNS = ["timeline_id", "metric", "task", "value"]
+PARTITION_COLUMNS = ["team_name", "submission_id"]
+
+_PARTITION_SCHEMA = pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS])
+_PARTITIONING = ds.partitioning(_PARTITION_SCHEMA, flavor="hive")
+# Partition values are read as (dictionary-encoded) strings, e.g. submission ID "01" stays "01"
+_READ_PARTITIONING = ds.HivePartitioning.discover(
+    schema=pa.schema(
+        [
+            (column, pa.dictionary(pa.int32(), pa.string()))
+            for column in PARTITION_COLUMNS
+        ]
+    )
+)
+
+
+def results_table(timeline_to_results: dict):
+    """
+    Columnar table of the results of one submission, with a row per metric value.
+
+    Args:
+        timeline_to_results: Dictionary mapping each timeline ID to its list of results
+                             ({metric name: {"task", "value"}} dictionaries)
+    """
+    timeline_ids, metrics, tasks, values = [], [], [], []
+    for timeline_id, timeline_results in timeline_to_results.items():
+        for curr_result in timeline_results:
+            for metric_name, metric_vals in curr_result.items():
+                timeline_ids.append(timeline_id)
+                metrics.append(metric_name)
+                tasks.append(metric_vals["task"])
+                values.append(metric_vals["value"])
+    return pa.table(
+        {
+            "timeline_id": pa.array(timeline_ids, pa.string()).dictionary_encode(),
+            "metric": pa.array(metrics, pa.string()).dictionary_encode(),
+            "task": pa.array(tasks, pa.string()).dictionary_encode(),
+            "value": pa.array(values, pa.float64(), from_pandas=True),
+        }
+    )
+
+
+class ResultsDatasetWriter:
+    def __init__(self, path: str, csv_path: str = None):
+        """
+        Args:
+            path: Directory of the dataset (created if missing)
+            csv_path: Optional CSV file to also write all results to, a submission at a time
+        """
+        self.path = path
+        self.csv_path = csv_path
+        self._csv_started = False
+
+    def write(self, timeline_to_results: dict, team_name: str, submission_id: str):
+        """Write the results of one submission to its partition, replacing earlier ones."""
+        table = results_table(timeline_to_results)
+        for column in PARTITION_COLUMNS:
+            value = team_name if column == "team_name" else submission_id
+            table = table.append_column(
+                column,
+                pa.array([value] * len(table), pa.string()),
+            )
+        ds.write_dataset(
+            table,
+            self.path,
+            format="parquet",
+            partitioning=_PARTITIONING,
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+        )
+        if self.csv_path is not None:
+            table.to_pandas().to_csv(
+                self.csv_path,
+                mode="a" if self._csv_started else "w",
+                header=not self._csv_started,
+                index=False,
+            )
+            self._csv_started = True
+
+
+def load_results(
+    path: str,
+    columns=None,
+    teams=None,
+    submission_ids=None,
+    metrics=None,
+    tasks=None,
+):
+    """
+    Load results from a dataset written by ResultsDatasetWriter.
+
+    Args:
+        path: Directory of the dataset
+        columns: Optional columns to read (default: all, see RESULTS_COLUMNS and PARTITION_COLUMNS)
+        teams: Optional teams to read; other teams' files are not read
+        submission_ids: Optional submission IDs to read; other submissions' files are not read
+        metrics: Optional metrics to read
+        tasks: Optional tasks to read, e.g. ["A.1"]
+
+    Returns:
+        DataFrame with a row per metric value; string columns are categoricals
+    """
+    dataset = ds.dataset(path, format="parquet", partitioning=_READ_PARTITIONING)
+    conditions = [
+        ds.field(column).isin(selected)
+        for column, selected in [
+            ("team_name", teams),
+            ("submission_id", submission_ids),
+            ("metric", metrics),
+            ("task", tasks),
+        ]
+        if selected is not None
+    ]
+    condition = None
+    for curr_condition in conditions:
+        condition = curr_condition if condition is None else condition & curr_condition
+    table = dataset.to_table(columns=columns, filter=condition)
+    return table.to_pandas()
@@ -0,0 +1,344 @@
+"""
+Local SQLite database of the results of all evaluation runs.
+
+Each run of run.py also writes its results to results/results.sqlite, with tables of
+runs, submissions (per run), timelines and metric values (a row per value, e.g. per
+post for Task B). Leaderboards, per-metric rankings and run-over-run diffs are then
+SQL aggregations over the indexed values, rather than merging the CSVs of several
+runs by hand.
+
+Usage:
+    python results_db.py runs
+    python results_db.py leaderboard [--run RUN_ID]
+    python results_db.py ranking mse [--run RUN_ID]
+    python results_db.py diff RUN_ID_A RUN_ID_B [--metrics mse f1_macro]
+    python results_db.py import results/results_dev_{timestamp}.csv
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import logging
+from pathlib import Path
+import pandas as pd
+from leaderboard_stats import MAIN_METRICS, read_results_csv
+from config import RESULTS_DB_PATH
+
+logger = logging.getLogger("results_db")
+
+# Keep well below SQLite's limit on the number of host parameters in a statement
+_QUERY_CHUNK_SIZE = 500
+
+
+def lower_is_better(metric: str):
+    """Whether lower values of a metric are better (errors and contradictions)."""
+    return metric.startswith("mse") or "_max_contradiction_" in metric
+
+
+class ResultsDB:
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite file to store results in (created if missing)
+        """
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                split TEXT NOT NULL,
+                tasks TEXT NOT NULL,
+                created_at INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS submissions (
+                submission_key INTEGER PRIMARY KEY,
+                run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+                team_name TEXT NOT NULL,
+                submission_id TEXT NOT NULL,
+                UNIQUE (run_id, team_name, submission_id)
+            );
+            CREATE TABLE IF NOT EXISTS timelines (
+                timeline_key INTEGER PRIMARY KEY,
+                timeline_id TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS metric_values (
+                submission_key INTEGER NOT NULL
+                    REFERENCES submissions (submission_key) ON DELETE CASCADE,
+                timeline_key INTEGER NOT NULL REFERENCES timelines (timeline_key),
+                task TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL
+            );
+            CREATE INDEX IF NOT EXISTS metric_values_submission
+                ON metric_values (submission_key, metric);
+            CREATE INDEX IF NOT EXISTS metric_values_metric
+                ON metric_values (metric, submission_key);
+            """)
+        self.connection.commit()
+
+    def start_run(self, run_id: str, split: str, tasks):
+        """Register a run, replacing the results of an earlier run with the same ID (e.g. resumed)."""
+        self.connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        self.connection.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?)",
+            (run_id, split, json.dumps(list(tasks)), int(time.time())),
+        )
+        self.connection.commit()
+
+    def add_rows(self, run_id: str, team_name: str, submission_id: str, rows):
+        """
+        Store the results of one submission in a run.
+
+        Args:
+            rows: List of (timeline ID, task, metric, value)
+        """
+        cursor = self.connection.execute(
+            "INSERT INTO submissions (run_id, team_name, submission_id) VALUES (?, ?, ?)",
+            (run_id, team_name, str(submission_id)),
+        )
+        submission_key = cursor.lastrowid
+        timeline_ids = list({row[0] for row in rows})
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO timelines (timeline_id) VALUES (?)",
+            [(timeline_id,) for timeline_id in timeline_ids],
+        )
+        timeline_keys = dict()
+        for start in range(0, len(timeline_ids), _QUERY_CHUNK_SIZE):
+            chunk = timeline_ids[start : start + _QUERY_CHUNK_SIZE]
+            timeline_keys.update(
+                self.connection.execute(
+                    "SELECT timeline_id, timeline_key FROM timelines "
+                    f"WHERE timeline_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        self.connection.executemany(
+            "INSERT INTO metric_values VALUES (?, ?, ?, ?, ?)",
+            [
+                (submission_key, timeline_keys[timeline_id], task, metric, value)
+                for timeline_id, task, metric, value in rows
+            ],
+        )
+        self.connection.commit()
+
+    def add_results(
+        self, run_id: str, team_name: str, submission_id: str, timeline_to_results
+    ):
+        """
+        Store the results of one submission in a run.
+
+        Args:
+            timeline_to_results: Dictionary mapping each timeline ID to its list of results
+                                 ({metric name: {"task", "value"}} dictionaries)
+        """
+        rows = [
+            (timeline_id, metric_vals["task"], metric_name, float(metric_vals["value"]))
+            for timeline_id, timeline_results in timeline_to_results.items()
+            for curr_result in timeline_results
+            for metric_name, metric_vals in curr_result.items()
+        ]
+        self.add_rows(run_id, team_name, submission_id, rows)
+
+    def query(self, sql: str, params=()):
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def runs(self):
+        """All runs, with their number of submissions."""
+        return self.query("""
+            SELECT runs.run_id, split, tasks, COUNT(submission_key) AS num_submissions
+            FROM runs LEFT JOIN submissions USING (run_id)
+            GROUP BY runs.run_id
+            ORDER BY created_at, runs.run_id
+            """)
+
+    def latest_run(self, split=None):
+        """ID of the most recent run (of a split), or None."""
+        row = self.connection.execute(
+            "SELECT run_id FROM runs WHERE ? IS NULL OR split = ? "
+            "ORDER BY created_at DESC, run_id DESC LIMIT 1",
+            (split, split),
+        ).fetchone()
+        return row[0] if row else None
+
+    def leaderboard(self, run_id: str, metrics=MAIN_METRICS):
+        """Mean of each metric (a column each) for every submission of a run."""
+        columns = ", ".join(
+            "AVG(CASE WHEN v.metric = ? THEN v.value END) AS "
+            + '"'
+            + metric.replace('"', '""')
+            + '"'
+            for metric in metrics
+        )
+        return self.query(
+            f"""
+            SELECT s.team_name, s.submission_id, {columns}
+            FROM submissions s JOIN metric_values v USING (submission_key)
+            WHERE s.run_id = ? AND v.metric IN ({",".join("?" * len(metrics))})
+            GROUP BY s.submission_key
+            ORDER BY s.team_name, s.submission_id
+            """,
+            (*metrics, run_id, *metrics),
+        )
+
+    def ranking(self, run_id: str, metric: str):
+        """Submissions of a run ranked by their mean of a metric, best first."""
+        order = "ASC" if lower_is_better(metric) else "DESC"
+        return self.query(
+            f"""
+            WITH means AS (
+                SELECT s.team_name, s.submission_id, AVG(v.value) AS mean,
+                       COUNT(DISTINCT CASE WHEN v.value IS NOT NULL
+                                      THEN v.timeline_key END) AS num_timelines
+                FROM submissions s JOIN metric_values v USING (submission_key)
+                WHERE s.run_id = ? AND v.metric = ?
+                GROUP BY s.submission_key
+            )
+            SELECT RANK() OVER (ORDER BY mean {order}) AS rank, *
+            FROM means
+            ORDER BY rank, team_name, submission_id
+            """,
+            (run_id, metric),
+        )
+
+    def diff(self, run_a: str, run_b: str, metrics=MAIN_METRICS):
+        """
+        Change of the mean of each metric from run A to run B, for the submissions
+        (team and submission ID) in both runs, largest changes first.
+        """
+        placeholders = ",".join("?" * len(metrics))
+        return self.query(
+            f"""
+            WITH means AS (
+                SELECT s.run_id, s.team_name, s.submission_id, v.task, v.metric,
+                       AVG(v.value) AS mean
+                FROM submissions s JOIN metric_values v USING (submission_key)
+                WHERE s.run_id IN (?, ?) AND v.metric IN ({placeholders})
+                GROUP BY s.submission_key, v.task, v.metric
+            )
+            SELECT a.team_name, a.submission_id, a.task, a.metric,
+                   a.mean AS mean_a, b.mean AS mean_b, b.mean - a.mean AS diff
+            FROM means a JOIN means b
+                ON a.team_name = b.team_name AND a.submission_id = b.submission_id
+                AND a.task = b.task AND a.metric = b.metric
+            WHERE a.run_id = ? AND b.run_id = ?
+            ORDER BY ABS(b.mean - a.mean) DESC, a.team_name, a.submission_id, a.metric
+            """,
+            (run_a, run_b, *metrics, run_a, run_b),
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+def import_results_csv(results_db: ResultsDB, results_path: str):
+    """
+    Store a results CSV written by run.py (results_{split}_{run ID}.csv) as a run.
+
+    Returns:
+        Run ID
+    """
+    match = re.fullmatch(
+        r"results_(dev|test)_(.+)\.csv", os.path.basename(results_path)
+    )
+    if match is None:
+        raise ValueError(f"Not a results file written by run.py: {results_path}")
+    split, run_id = match.groups()
+    results_df = read_results_csv(results_path)
+    results_db.start_run(run_id, split, sorted(results_df.task.unique()))
+    for (team_name, submission_id), submission_df in results_df.groupby(
+        ["team_name", "submission_id"]
+    ):
+        results_db.add_rows(
+            run_id,
+            team_name,
+            submission_id,
+            list(
+                submission_df[["timeline_id", "task", "metric", "value"]].itertuples(
+                    index=False, name=None
+                )
+            ),
+        )
+    return run_id
+
+
+def main(args):
+    results_db = ResultsDB(args.db)
+    if args.command == "import":
+        for results_path in args.results_paths:
+            run_id = import_results_csv(results_db, results_path)
+            logger.info(f"Imported {results_path} as run {run_id}")
+    elif args.command == "runs":
+        print(results_db.runs().to_string(index=False))
+    elif args.command == "diff":
+        print(
+            results_db.diff(args.run_a, args.run_b, args.metrics).to_string(index=False)
+        )
+    else:
+        run_id = args.run or results_db.latest_run()
+        if run_id is None:
+            logger.error(f"No runs in {args.db}")
+            exit()
+        logger.info(f"Run {run_id}")
+        if args.command == "leaderboard":
+            results_df = results_db.leaderboard(run_id, args.metrics)
+        else:
+            results_df = results_db.ranking(run_id, args.metric)
+        print(results_df.to_string(index=False))
+    results_db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--db",
+        type=str,
+        default=RESULTS_DB_PATH,
+        help="SQLite results database.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("runs", help="List all runs.")
+
+    leaderboard_parser = subparsers.add_parser(
+        "leaderboard", help="Mean of the main metrics of each submission."
+    )
+    leaderboard_parser.add_argument(
+        "--run", type=str, default=None, help="Run ID (default: latest run)."
+    )
+    leaderboard_parser.add_argument(
+        "--metrics", nargs="+", default=MAIN_METRICS, help="Metrics to show."
+    )
+
+    ranking_parser = subparsers.add_parser(
+        "ranking", help="Submissions ranked by one metric."
+    )
+    ranking_parser.add_argument("metric", type=str, help="Metric to rank by.")
+    ranking_parser.add_argument(
+        "--run", type=str, default=None, help="Run ID (default: latest run)."
+    )
+
+    diff_parser = subparsers.add_parser(
+        "diff", help="Change of the metric means between two runs."
+    )
+    diff_parser.add_argument("run_a", type=str, help="ID of the earlier run.")
+    diff_parser.add_argument("run_b", type=str, help="ID of the later run.")
+    diff_parser.add_argument(
+        "--metrics", nargs="+", default=MAIN_METRICS, help="Metrics to compare."
+    )
+
+    import_parser = subparsers.add_parser(
+        "import", help="Add results CSVs of earlier runs to the database."
+    )
+    import_parser.add_argument(
+        "results_paths", nargs="+", help="Results CSVs written by run.py."
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -5,33 +5,47 @@ End-to-end evaluation script for the CLPsych 2025 Shared Task.
 import os
 import argparse
 import glob
-from nltk import sent_tokenize
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import json
 import ast
 from collections import defaultdict
 from tqdm.auto import tqdm
 import logging
 from pathlib import Path
-import pandas as pd
 from datetime import datetime
-from span_scorer import SpanScorer
-from wellbeing_scorer import WellbeingScorer
-from nli_scorer import NLIScorer
+import numpy as np
+from nli_cache import NLICache
+from sentence_splitter import SentenceSplitter
+from results_cache import ResultsCache
+from run_journal import RunJournal
+from gold_store import GoldStore, gold_data_hash, load_gold_data
+from memory_guard import peak_rss_bytes, reset_peak_rss
+from task_plugins import load_plugin, load_scorer_class, uses_models
 from config import (
     DATA_DIR,
     DEV_SUBMISSIONS_DIR,
     TEST_SUBMISSIONS_DIR,
     RESULTS_DIR,
+    NLI_CACHE_PATH,
+    RESULTS_CACHE_DIR,
+    RESULTS_DB_PATH,
+    RUNS_DIR,
+    SENTENCE_CACHE_PATH,
     DEV_ANNOTATED_FILENAME,
     TEST_ANNOTATED_FILENAME,
+    INFERENCE_BACKENDS,
 )
 
 logger = logging.getLogger("run")
 logging.basicConfig(level=logging.INFO)
 
 
+VALID_TASKS = ["A1", "A2", "B", "C"]
+
+
 def get_active_tasks(tasks):
-    valid_tasks = ["A1", "A2", "B", "C"]
+    valid_tasks = VALID_TASKS
 
     invalid_tasks = set(tasks) - set(valid_tasks)
     if invalid_tasks:
@@ -59,19 +73,201 @@ def parse_filename(submission_data_path):
     return team_name, submission_id
 
 
-def score_submission(
-    submission_data, gold_data, do_A1=True, do_A2=True, do_B=True, do_C=True
+def load_scorers(
+    do_A1=True,
+    do_A2=True,
+    do_B=True,
+    do_C=True,
+    registry=None,
+    nli_batch_size=None,
+    nli_max_tokens=4096,
+    span_max_tokens=8192,
+    span_memory_limit_gb=None,
+    nli_cache=None,
+    gold_span_store=None,
+    splitter=None,
+    nli_quantize=False,
+    span_backend="torch",
+    nli_backend="torch",
 ):
+    """
+    Build the scorers needed by the active tasks, and the sentence splitter for predicted summaries.
+    Only the scorer modules of the active tasks are imported (see task_plugins.py).
+    Models are loaded through the registry (by default the process-wide one), so repeated
+    calls reuse the same instances.
+    """
+    return {
+        "splitter": splitter if splitter is not None else SentenceSplitter(),
+        "span": (
+            load_scorer_class("A1")(
+                registry=registry,
+                gold_store=gold_span_store,
+                backend=span_backend,
+                max_tokens=span_max_tokens,
+                memory_limit_gb=span_memory_limit_gb,
+            )
+            if do_A1
+            else None
+        ),
+        "wellbeing": load_scorer_class("A2")() if do_A2 else None,
+        "nli": (
+            load_scorer_class("B")(
+                registry=registry,
+                batch_size=nli_batch_size,
+                max_tokens=nli_max_tokens,
+                cache=nli_cache,
+                quantize=nli_quantize,
+                backend=nli_backend,
+            )
+            if (do_B or do_C)
+            else None
+        ),
+    }
+
+
+def parse_post_prediction(post_datum, splitter):
+    """
+    Get prediction per post with type conversion & null handling.
+
+    Args:
+        splitter: SentenceSplitter for the summary, or None if only Tasks A1, A2 need the
+                  prediction (the summary is then not split)
+
+    Returns:
+        (adaptive evidence spans, maladaptive evidence spans, wellbeing score or None,
+         summary sentences)
+    """
+    adaptive_evidence = post_datum.get("adaptive_evidence", [])
+    if isinstance(adaptive_evidence, str):
+        try:
+            adaptive_evidence = ast.literal_eval(adaptive_evidence)
+            if not isinstance(adaptive_evidence, list):
+                adaptive_evidence = []
+        except:
+            adaptive_evidence = []
+    maladaptive_evidence = post_datum.get("maladaptive_evidence", [])
+    if isinstance(maladaptive_evidence, str):
+        try:
+            maladaptive_evidence = ast.literal_eval(maladaptive_evidence)
+            if not isinstance(maladaptive_evidence, list):
+                maladaptive_evidence = []
+        except:
+            maladaptive_evidence = []
+
+    wellbeing_score = post_datum.get("wellbeing_score")
+    if isinstance(wellbeing_score, str):
+        wellbeing_score = wellbeing_score.strip()
+        if wellbeing_score and wellbeing_score.isnumeric():
+            wellbeing_score = float(wellbeing_score)
+        else:
+            wellbeing_score = None
+    elif not (isinstance(wellbeing_score, int) or isinstance(wellbeing_score, float)):
+        wellbeing_score = None
+
+    post_summary = post_datum.get("summary", "")
+    return (
+        adaptive_evidence,
+        maladaptive_evidence,
+        wellbeing_score,
+        splitter.split(post_summary) if splitter is not None else [],
+    )
+
+
+def parse_timeline_prediction(timeline_datum, splitter):
+    """Sentences of the predicted timeline summary (empty if it is not a string)."""
+    timeline_summary = timeline_datum["summary"]
+    if isinstance(timeline_summary, str):
+        return splitter.split(timeline_summary)
+    return []
 
-    timeline_to_results = dict()
 
-    for timeline_id, gold_datum in tqdm(gold_data.items()):
+def get_gold_wellbeing_scores(gold_data, timeline_id):
+    """
+    Post IDs of a timeline and the gold wellbeing score of each post (None or NaN if not annotated).
+    A GoldStore reads them without decoding the whole timeline.
+    """
+    if isinstance(gold_data, GoldStore):
+        return gold_data.post_ids(timeline_id), gold_data.wellbeing_scores(timeline_id)
+    gold_datum = gold_data[timeline_id]
+    post_ids = gold_datum["timeline_level"]["post_ids"]
+    return post_ids, [
+        gold_datum["post_level"][post_id]["wellbeing_score"] for post_id in post_ids
+    ]
+
+
+def score_wellbeing(ws, submission_datas, gold_data, timeline_ids):
+    """
+    Task A.2 results of submissions on the given timelines, computed in one vectorized
+    pass over all posts (see WellbeingScorer.compute_batch).
+
+    Args:
+        ws: WellbeingScorer
+        submission_datas: Loaded submission files
+
+    Returns:
+        Per submission, dictionary mapping each timeline ID to its [MSE results, F1 results]
+    """
+    y_trues, timeline_starts = [], []
+    y_preds = [[] for _ in submission_datas]
+    for timeline_id in timeline_ids:
+        post_ids, gold_scores = get_gold_wellbeing_scores(gold_data, timeline_id)
+        timeline_starts.append(len(y_trues))
+        y_trues.extend(gold_scores)
+        for submission_preds, submission_data in zip(y_preds, submission_datas):
+            post_level = submission_data[timeline_id]["post_level"]
+            submission_preds.extend(
+                parse_post_prediction(post_level[post_id], None)[2]
+                for post_id in post_ids
+            )
+    # Missing scores (None) become NaN
+    batch_results = ws.compute_batch(
+        np.array(y_trues, dtype=float),
+        np.array(y_preds, dtype=float).reshape(len(submission_datas), len(y_trues)),
+        timeline_starts,
+    )
+    return [
+        dict(zip(timeline_ids, submission_results))
+        for submission_results in batch_results
+    ]
+
+
+def iter_score_submission(
+    submission_data,
+    gold_data,
+    do_A1=True,
+    do_A2=True,
+    do_B=True,
+    do_C=True,
+    scorers=None,
+    timeline_ids=None,
+):
+    """
+    Score a submission one timeline at a time, yielding (timeline_id, results).
+    Gold timelines are read one at a time, so `gold_data` can be a GoldStore.
+
+    Args:
+        timeline_ids: Optional subset of the gold timelines to score
+    """
+
+    if scorers is None:
+        scorers = load_scorers(do_A1=do_A1, do_A2=do_A2, do_B=do_B, do_C=do_C)
+    ss, ws, nli = scorers["span"], scorers["wellbeing"], scorers["nli"]
+    splitter = scorers["splitter"]
+    if timeline_ids is None:
+        timeline_ids = list(gold_data)
+    if do_A2:
+        # Task A.2 is scored for all timelines at once
+        (wellbeing_results,) = score_wellbeing(
+            ws, [submission_data], gold_data, timeline_ids
+        )
+
+    for timeline_id in tqdm(timeline_ids):
+        gold_datum = gold_data[timeline_id]
 
         curr_results = []
 
         predicted_spans_adaptive = []
         predicted_spans_maladaptive = []
-        predicted_wellbeing_scores = []
         predicted_summary_sents = []
 
         # Exploratory: spans from both categories that preserve post structure
@@ -87,53 +283,24 @@ def score_submission(
         ]
 
         for post_id in post_ids:
-            # Get prediction per post with type conversion & null handling
-            post_datum = submission_data[timeline_id]["post_level"][post_id]
-
-            adaptive_evidence = post_datum.get("adaptive_evidence", [])
-            if isinstance(adaptive_evidence, str):
-                try:
-                    adaptive_evidence = ast.literal_eval(adaptive_evidence)
-                    if not isinstance(adaptive_evidence, list):
-                        adaptive_evidence = []
-                except:
-                    adaptive_evidence = []
-            maladaptive_evidence = post_datum.get("maladaptive_evidence", [])
-            if isinstance(maladaptive_evidence, str):
-                try:
-                    maladaptive_evidence = ast.literal_eval(maladaptive_evidence)
-                    if not isinstance(maladaptive_evidence, list):
-                        maladaptive_evidence = []
-                except:
-                    maladaptive_evidence = []
-
+            (
+                adaptive_evidence,
+                maladaptive_evidence,
+                _,
+                post_summary_sents,
+            ) = parse_post_prediction(
+                submission_data[timeline_id]["post_level"][post_id],
+                # Post summaries are only scored in Task B
+                splitter if do_B else None,
+            )
             predicted_spans_adaptive.extend(adaptive_evidence)
             predicted_spans_maladaptive.extend(maladaptive_evidence)
             # Exploratory: spans from both categories that preserve post structure
             predicted_spans.append(adaptive_evidence + maladaptive_evidence)
-
-            wellbeing_score = post_datum.get("wellbeing_score")
-            if isinstance(wellbeing_score, str):
-                wellbeing_score = wellbeing_score.strip()
-                if wellbeing_score and wellbeing_score.isnumeric():
-                    wellbeing_score = float(wellbeing_score)
-                else:
-                    wellbeing_score = None
-            elif not (
-                isinstance(wellbeing_score, int) or isinstance(wellbeing_score, float)
-            ):
-                wellbeing_score = None
-            predicted_wellbeing_scores.append(wellbeing_score)
-            post_summary = post_datum.get("summary", "")
-            predicted_summary_sents.append(
-                [s.strip() for s in sent_tokenize(post_summary) if s.strip()]
-            )
+            predicted_summary_sents.append(post_summary_sents)
 
         # Task A.1
         if do_A1:
-
-            ss = SpanScorer()
-
             curr_result_adaptive = ss.compute_span_metrics(
                 gold_spans=gold_spans_adaptive,
                 predicted_spans=predicted_spans_adaptive,
@@ -162,27 +329,9 @@ def score_submission(
 
         # Task A.2
         if do_A2:
-            ws = WellbeingScorer()
-            gold_wellbeing_scores = [
-                gold_datum["post_level"][pid]["wellbeing_score"] for pid in post_ids
-            ]
-            # Main metric: MSE
-            curr_results.append(
-                ws.compute_mse(
-                    y_trues=gold_wellbeing_scores,
-                    y_preds=predicted_wellbeing_scores,
-                    do_binwise=True,  # Optional: computes MSE per bin for optional analysis
-                )
-            )
-            # Optional: wellbeing as classification
-            curr_results.append(
-                ws.compute_f1(
-                    y_trues=gold_wellbeing_scores, y_preds=predicted_wellbeing_scores
-                )
-            )
-
-        if do_B or do_C:
-            nli = NLIScorer()
+            # Main metric: MSE (with MSE per bin for optional analysis)
+            # Optional: wellbeing as classification (F1)
+            curr_results.extend(wellbeing_results[timeline_id])
 
         # Task B
         if do_B:
@@ -216,12 +365,9 @@ def score_submission(
 
         # Task C
         if do_C:
-            timeline_summary = submission_data[timeline_id]["timeline_level"]["summary"]
-            predicted_summary_sents_timeline = []
-            if isinstance(timeline_summary, str):
-                predicted_summary_sents_timeline.extend(
-                    [s.strip() for s in sent_tokenize(timeline_summary) if s.strip()]
-                )
+            predicted_summary_sents_timeline = parse_timeline_prediction(
+                submission_data[timeline_id]["timeline_level"], splitter
+            )
 
             gold_summary_sents_timeline = gold_datum["timeline_level"]["summary_sents"]
 
@@ -235,14 +381,550 @@ def score_submission(
                     )
                 )
 
-        timeline_to_results[timeline_id] = curr_results
+        yield timeline_id, curr_results
+
+
+def score_submission(
+    submission_data,
+    gold_data,
+    do_A1=True,
+    do_A2=True,
+    do_B=True,
+    do_C=True,
+    scorers=None,
+):
+    return dict(
+        iter_score_submission(
+            submission_data,
+            gold_data,
+            do_A1=do_A1,
+            do_A2=do_A2,
+            do_B=do_B,
+            do_C=do_C,
+            scorers=scorers,
+        )
+    )
+
+
+def plan_scoring_work(units, gold_data, splitter, journaled=None):
+    """
+    Collect the span similarity and NLI pairs that scoring all units needs,
+    deduplicated across submissions and tasks.
 
+    Args:
+        units: (submission path, task) units to be scored
+        splitter: SentenceSplitter used for predicted summaries
+        journaled: Results replayed from the run journal; these timelines are not planned
+
+    Returns:
+        Dictionary with
+            - "span_groups": gold spans (tuple) -> unique predicted spans to compare them with
+            - "span_pairs": number of (gold span, predicted span) comparisons requested by the units
+            - "nli_pairs": unique (premise, hypothesis) pairs, in first-seen order
+            - "nli_requests": number of NLI pairs requested by the units
+    """
+    journaled = journaled or dict()
+    plan = {
+        "span_groups": defaultdict(dict),
+        "span_pairs": 0,
+        "nli_pairs": dict(),
+        "nli_requests": 0,
+    }
+
+    def add_span_pairs(gold_spans, predicted_spans):
+        clean_spans = load_scorer_class("A1").clean_spans
+        gold_spans = clean_spans(gold_spans)
+        predicted_spans = clean_spans(predicted_spans)
+        if gold_spans and predicted_spans:
+            plan["span_groups"][tuple(gold_spans)].update(
+                dict.fromkeys(predicted_spans)
+            )
+            plan["span_pairs"] += len(gold_spans) * len(predicted_spans)
+
+    def add_nli_pairs(premises, hypotheses):
+        for premise in premises:
+            for hypothesis in hypotheses:
+                plan["nli_pairs"][(premise, hypothesis)] = None
+        plan["nli_requests"] += len(premises) * len(hypotheses)
+
+    submission_to_tasks = defaultdict(list)
+    for submission_data_path, task in units:
+        submission_to_tasks[submission_data_path].append(task)
+
+    for submission_data_path, tasks in submission_to_tasks.items():
+        with open(submission_data_path, "r", encoding="utf-8") as f:
+            submission_data = json.load(f)
+        for task in tasks:
+            skip_timeline_ids = journaled.get((submission_data_path, task), {})
+            for timeline_id, gold_datum in gold_data.items():
+                if timeline_id in skip_timeline_ids:
+                    continue
+                post_ids = gold_datum["timeline_level"]["post_ids"]
+                predictions = [
+                    parse_post_prediction(
+                        submission_data[timeline_id]["post_level"][post_id],
+                        splitter if task == "B" else None,
+                    )
+                    for post_id in post_ids
+                ]
+
+                if task == "A1":
+                    for category, i in [("adaptive", 0), ("maladaptive", 1)]:
+                        add_span_pairs(
+                            [
+                                s["text"]
+                                for s in gold_datum["timeline_level"][
+                                    f"{category}_spans"
+                                ]
+                            ],
+                            [
+                                span
+                                for prediction in predictions
+                                for span in prediction[i]
+                            ],
+                        )
+
+                elif task == "B":
+                    for post_id, prediction in zip(post_ids, predictions):
+                        adaptive_evidence, maladaptive_evidence, _, summary_sents = (
+                            prediction
+                        )
+                        gold_sents = gold_datum["post_level"][post_id]["summary_sents"]
+                        if gold_sents:
+                            add_nli_pairs(gold_sents, summary_sents)
+                            add_nli_pairs(
+                                adaptive_evidence + maladaptive_evidence, summary_sents
+                            )
+
+                elif task == "C":
+                    add_nli_pairs(
+                        gold_datum["timeline_level"]["summary_sents"],
+                        parse_timeline_prediction(
+                            submission_data[timeline_id]["timeline_level"], splitter
+                        ),
+                    )
+    return plan
+
+
+def prefetch_scoring_work(plan, scorers):
+    """
+    Run each unique pair of a plan (see plan_scoring_work) once through the batched scorers.
+    Scoring the units afterwards looks the results up instead of recomputing them.
+    """
+    ss, nli = scorers["span"], scorers["nli"]
+    if ss is not None and plan["span_pairs"]:
+        span_pairs, num_spans, num_unique_spans = ss.prefetch_similarities(
+            plan["span_groups"].items()
+        )
+        logger.info(
+            f"Span similarities: {plan['span_pairs']} requested, {span_pairs} computed "
+            f"(dedup ratio {plan['span_pairs'] / span_pairs:.2f}x); span encodings: "
+            f"{num_spans} across groups, {num_unique_spans} unique "
+            f"(dedup ratio {num_spans / num_unique_spans:.2f}x)"
+        )
+    if nli is not None and plan["nli_requests"]:
+        nli_pairs = nli.prefetch(list(plan["nli_pairs"]))
+        logger.info(
+            f"NLI pairs: {plan['nli_requests']} requested, {nli_pairs} unique "
+            f"(dedup ratio {plan['nli_requests'] / nli_pairs:.2f}x)"
+        )
+
+
+def release_prefetched_work(scorers):
+    """Drop the scores kept by prefetch_scoring_work once the units that needed them are scored."""
+    for name in ["span", "nli"]:
+        if scorers[name] is not None:
+            scorers[name].prefetched.clear()
+
+
+def group_units_by_submission(units, num_submissions):
+    """Split units into consecutive groups, each with all units of up to `num_submissions` submissions."""
+    submissions = list(dict.fromkeys(path for path, _ in units))
+    groups = []
+    for start in range(0, len(submissions), num_submissions):
+        group_submissions = set(submissions[start : start + num_submissions])
+        groups.append([unit for unit in units if unit[0] in group_submissions])
+    return groups
+
+
+def setup_scorers(args, task_flags, gold_data_path):
+    """Create the NLI cache, gold span embedding store and scorers for the active tasks."""
+    do_A1, do_A2, do_B, do_C = task_flags
+
+    nli_cache = None
+    if (do_B or do_C) and not args.no_nli_cache:
+        nli_cache = NLICache(NLI_CACHE_PATH, max_entries=args.nli_cache_size)
+
+    # Precomputed gold span embeddings, if built by process_gold_data.py --span-embeddings
+    gold_span_store = None
+    if do_A1:
+        # Imported here, as it imports torch
+        from span_embedding_store import SpanEmbeddingStore
+
+        store_prefix = SpanEmbeddingStore.prefix_for(gold_data_path)
+        if SpanEmbeddingStore.exists(store_prefix):
+            logger.info(f"Loading gold span embeddings from {store_prefix}")
+            gold_span_store = SpanEmbeddingStore(store_prefix)
+
+    return load_scorers(
+        do_A1=do_A1,
+        do_A2=do_A2,
+        do_B=do_B,
+        do_C=do_C,
+        nli_batch_size=args.nli_batch_size,
+        nli_max_tokens=args.nli_max_tokens,
+        span_max_tokens=args.span_max_tokens,
+        span_memory_limit_gb=args.memory_limit_gb,
+        nli_quantize=args.quantize_nli,
+        span_backend=args.span_backend,
+        nli_backend=args.nli_backend,
+        nli_cache=nli_cache,
+        gold_span_store=gold_span_store,
+        splitter=SentenceSplitter(
+            backend=args.sentence_splitter,
+            cache_path=SENTENCE_CACHE_PATH if args.sentence_cache else None,
+        ),
+    )
+
+
+def close_scorers(scorers):
+    """Report and close the NLI cache and sentence cache, then release the models."""
+    used_models = scorers["span"] is not None or scorers["nli"] is not None
+    splitter = scorers["splitter"]
+    logger.info(f"Sentence splitter cache: {splitter.stats()}")
+    splitter.save()
+    if scorers["span"] is not None:
+        logger.info(f"Span encoder batching: {scorers['span'].batcher.stats()}")
+    nli = scorers["nli"]
+    if nli is not None:
+        logger.info(f"NLI batching: {nli.batcher.stats()}")
+    if nli is not None and nli.cache is not None:
+        logger.info(f"NLI cache: {nli.cache.stats()}")
+        nli.cache.close()
+    scorers.clear()
+    if used_models:
+        from model_registry import default_registry
+
+        default_registry.release()
+
+
+def get_task_flags(tasks):
+    """(do_A1, do_A2, do_B, do_C) flags for the given task names."""
+    return tuple(valid_task in tasks for valid_task in VALID_TASKS)
+
+
+def get_active_task_names(task_flags):
+    """Task names for (do_A1, do_A2, do_B, do_C) flags."""
+    return [task for task, is_active in zip(VALID_TASKS, task_flags) if is_active]
+
+
+def get_scorer_configs(args, tasks):
+    """
+    Settings that affect each task's metrics; part of the key of stored results.
+    Only the scorer modules of the given tasks are imported, for their model names.
+    """
+    configs = dict()
+    if "A1" in tasks:
+        configs["A1"] = {
+            "model_name": load_plugin("A1").DEFAULT_MODEL_NAME,
+            "rescale_with_baseline": True,
+        }
+        # ONNX Runtime scores match PyTorch only within a tolerance, so keep their results apart
+        if args.span_backend != "torch":
+            configs["A1"]["backend"] = args.span_backend
+    if "A2" in tasks:
+        configs["A2"] = {}
+    if "B" in tasks or "C" in tasks:
+        nli_config = {
+            "model_name": load_plugin("B").DEFAULT_MODEL_NAME,
+            "sentence_splitter": args.sentence_splitter,
+        }
+        if args.quantize_nli:
+            nli_config["quantization"] = "dynamic_qint8"
+        if args.nli_backend != "torch":
+            nli_config["backend"] = args.nli_backend
+        configs.update({task: nli_config for task in ["B", "C"] if task in tasks})
+    return configs
+
+
+def evaluate_unit(
+    submission_data_path,
+    task,
+    gold_data,
+    scorers,
+    skip_timeline_ids=(),
+    on_timeline=None,
+):
+    """
+    Load a submission file and score it on a single task.
+
+    Args:
+        skip_timeline_ids: Timelines already scored, e.g. replayed from a run journal
+        on_timeline: Optional callback called with (submission path, task, timeline ID, results)
+                     and the keyword argument peak_rss_mb as each timeline is scored
+
+    Returns:
+        Dictionary mapping each newly scored timeline ID to its results
+    """
+    with open(submission_data_path, "r", encoding="utf-8") as f:
+        submission_data = json.load(f)
+
+    do_A1, do_A2, do_B, do_C = get_task_flags([task])
+    timeline_to_results = dict()
+    # Peak memory of each timeline, from the high-water mark reset after each one
+    timeline_peak_rss_mb = dict()
+    reset_peak_rss()
+    for timeline_id, curr_results in iter_score_submission(
+        submission_data=submission_data,
+        gold_data=gold_data,
+        do_A1=do_A1,
+        do_A2=do_A2,
+        do_B=do_B,
+        do_C=do_C,
+        scorers=scorers,
+        timeline_ids=[
+            timeline_id
+            for timeline_id in gold_data
+            if timeline_id not in skip_timeline_ids
+        ],
+    ):
+        peak_rss = peak_rss_bytes()
+        if peak_rss is not None:
+            timeline_peak_rss_mb[timeline_id] = peak_rss / 2**20
+        reset_peak_rss()
+        timeline_to_results[timeline_id] = curr_results
+        if on_timeline is not None:
+            on_timeline(
+                submission_data_path,
+                task,
+                timeline_id,
+                curr_results,
+                peak_rss_mb=timeline_peak_rss_mb.get(timeline_id),
+            )
+    if timeline_peak_rss_mb:
+        max_timeline_id = max(timeline_peak_rss_mb, key=timeline_peak_rss_mb.get)
+        logger.info(
+            f"Peak RSS {timeline_peak_rss_mb[max_timeline_id]:.0f} MB "
+            f"(timeline {max_timeline_id})"
+        )
     return timeline_to_results
 
 
+def merge_unit_results(unit_results, submission_data_path, tasks, gold_data):
+    """
+    Combine the per-task results of a submission into per-timeline lists,
+    in the order a single score_submission call over all tasks produces them.
+    """
+    return {
+        timeline_id: [
+            curr_result
+            for task in tasks
+            for curr_result in unit_results[(submission_data_path, task)][timeline_id]
+        ]
+        for timeline_id in gold_data
+    }
+
+
+def score_units_serially(
+    args, units, gold_data, gold_data_path, journal, on_result, journaled=None
+):
+    """
+    Score (submission path, task) units in this process.
+
+    Args:
+        journal: RunJournal to record each scored timeline in
+        journaled: Results replayed from the journal, as returned by RunJournal.replay;
+                   these timelines are not scored again
+        on_result: Callback called with (unit, timeline results) as each unit finishes;
+                   results are not kept otherwise
+    """
+    journaled = journaled or dict()
+    # Load models once for the whole evaluation
+    scorers = setup_scorers(
+        args, get_task_flags({task for _, task in units}), gold_data_path
+    )
+    # Without --no-dedup, a few submissions at a time are planned, prefetched and scored,
+    # so that the prefetched scores held in memory stay bounded and results are journaled
+    # as they are scored
+    unit_groups = (
+        [units]
+        if args.no_dedup
+        else group_units_by_submission(units, args.dedup_submissions)
+    )
+    progress = tqdm(total=len(units))
+    for unit_group in unit_groups:
+        if not args.no_dedup:
+            # Score each span and NLI pair shared by several submissions or tasks only once
+            prefetch_scoring_work(
+                plan_scoring_work(
+                    unit_group, gold_data, scorers["splitter"], journaled
+                ),
+                scorers,
+            )
+        for unit in unit_group:
+            submission_data_path, task = unit
+            logger.info(f"Processing {Path(submission_data_path).name} on task {task}")
+            timeline_to_results = evaluate_unit(
+                submission_data_path,
+                task,
+                gold_data=gold_data,
+                scorers=scorers,
+                skip_timeline_ids=set(journaled.get(unit, {})),
+                on_timeline=journal.record,
+            )
+            on_result(unit, {**journaled.get(unit, {}), **timeline_to_results})
+            progress.update()
+        release_prefetched_work(scorers)
+    progress.close()
+    close_scorers(scorers)
+    journal.close()
+
+
+# Per-process state in --workers mode, set up once by _init_worker
+_worker = dict()
+
+
+def _init_worker(args, gold_data, gold_data_path, task_flags, num_threads, run_dir):
+    # Fixed thread count so that workers do not oversubscribe the cores
+    if uses_models(get_active_task_names(task_flags)):
+        import torch
+
+        torch.set_num_threads(num_threads)
+    _worker["gold_data"] = gold_data
+    _worker["scorers"] = setup_scorers(args, task_flags, gold_data_path)
+    _worker["journal"] = RunJournal(run_dir)
+    _worker["sentence_cache"] = args.sentence_cache
+
+
+def _evaluate_unit(submission_data_path, task, skip_timeline_ids):
+    timeline_to_results = evaluate_unit(
+        submission_data_path,
+        task,
+        gold_data=_worker["gold_data"],
+        scorers=_worker["scorers"],
+        skip_timeline_ids=skip_timeline_ids,
+        on_timeline=_worker["journal"].record,
+    )
+    # Pool workers exit without running cleanup code, so their new sentence splits
+    # are sent back with the results and saved by the parent process
+    new_splits = (
+        _worker["scorers"]["splitter"].take_new_splits()
+        if _worker["sentence_cache"]
+        else dict()
+    )
+    return (submission_data_path, task), timeline_to_results, new_splits
+
+
+def score_units_in_parallel(
+    args, units, gold_data, gold_data_path, journal, on_result, journaled=None
+):
+    """
+    Score (submission path, task) units across worker processes.
+    Each worker loads the models for all tasks in `units` once.
+
+    Args:
+        journal: RunJournal of the run; each worker appends to its own journal file in the run directory
+        journaled: Results replayed from the journal, as returned by RunJournal.replay;
+                   these timelines are not scored again
+        on_result: Callback called with (unit, timeline results) as each unit finishes;
+                   results are not kept otherwise
+    """
+    journaled = journaled or dict()
+    task_flags = get_task_flags({task for _, task in units})
+    num_threads = args.threads_per_worker or max(
+        1, (os.cpu_count() or 1) // args.workers
+    )
+    logger.info(
+        f"Scoring {len(units)} units with {args.workers} workers x {num_threads} threads"
+    )
+    splitter = None
+    if args.sentence_cache:
+        splitter = SentenceSplitter(
+            backend=args.sentence_splitter, cache_path=SENTENCE_CACHE_PATH
+        )
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(
+            args,
+            gold_data,
+            gold_data_path,
+            task_flags,
+            num_threads,
+            journal.run_dir,
+        ),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _evaluate_unit,
+                submission_data_path,
+                task,
+                set(journaled.get((submission_data_path, task), {})),
+            )
+            for submission_data_path, task in units
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            unit, timeline_to_results, new_splits = future.result()
+            if splitter is not None:
+                splitter.add_splits(new_splits)
+            on_result(unit, {**journaled.get(unit, {}), **timeline_to_results})
+    if splitter is not None:
+        logger.info(f"Sentence splitter cache: {len(splitter.cache)} entries")
+        splitter.save()
+
+
+def check_resumed_run(run_config, gold_sha256, scorer_configs):
+    """
+    Check that an interrupted run is resumed with the gold data and scorer settings it
+    was started with, so that its journaled results are still valid.
+
+    Returns:
+        Whether the journaled results were verified and can be stored in the results
+        cache; runs started before these were recorded can be resumed, but not verified
+    """
+    if "gold_sha256" not in run_config:
+        logger.warning(
+            "The run does not record its gold data and scorer settings; its journaled "
+            "results are not checked against them and not stored in the results cache"
+        )
+        return False
+    if run_config["gold_sha256"] != gold_sha256:
+        raise ValueError(
+            "The gold data changed since the run was started; start a new run instead"
+        )
+    # Compared as stored in run.json
+    if run_config["scorer_configs"] != json.loads(json.dumps(scorer_configs)):
+        raise ValueError(
+            "The scorer settings changed since the run was started "
+            f"({run_config['scorer_configs']} -> {scorer_configs}); start a new run instead"
+        )
+    return True
+
+
 def main(args):
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    if args.resume:
+        # Continue an interrupted run with the settings it was started with
+        journal = RunJournal(os.path.join(RUNS_DIR, args.resume), resume=True)
+        run_config = journal.read_config()
+        args.test, args.team, args.tasks, args.sentence_splitter = (
+            run_config["test"],
+            run_config["team"],
+            run_config["tasks"],
+            run_config.get("sentence_splitter", "punkt"),
+        )
+        args.quantize_nli = run_config.get("quantize_nli", False)
+        args.span_backend = run_config.get("span_backend", "torch")
+        args.nli_backend = run_config.get("nli_backend", "torch")
+        timestamp = journal.run_id
+        logger.info(f"Resuming run {journal.run_id}")
+    else:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        journal = RunJournal(os.path.join(RUNS_DIR, timestamp))
+        logger.info(f"Starting run {journal.run_id}")
+
     submission_pattern = f"{args.team}*.json"
 
     if args.test:
@@ -266,43 +948,173 @@ def main(args):
         logging.error(f"No submission files found in {submission_data_paths}")
         exit()
 
-    with open(os.path.join(DATA_DIR, gold_filename), "r", encoding="utf-8") as f:
-        gold_data = json.load(f)
+    # From the binary gold store if it was built (process_gold_data.py --gold-store)
+    gold_data, gold_data_path = load_gold_data(os.path.join(DATA_DIR, gold_filename))
+
+    tasks = get_active_task_names(get_active_tasks(args.tasks))
+    # Units of work: one per submission and task
+    units = [
+        (submission_data_path, task)
+        for submission_data_path in submission_data_paths
+        for task in tasks
+    ]
 
-    do_A1, do_A2, do_B, do_C = get_active_tasks(args.tasks)
+    # Gold data and scorer settings the results are computed with
+    gold_sha256 = gold_data_hash(gold_data, gold_data_path)
+    scorer_configs = get_scorer_configs(args, tasks)
+    if args.resume:
+        journal_verified = check_resumed_run(run_config, gold_sha256, scorer_configs)
+    else:
+        journal_verified = True
+        journal.write_config(
+            {
+                "test": args.test,
+                "team": args.team,
+                "tasks": args.tasks,
+                "sentence_splitter": args.sentence_splitter,
+                "quantize_nli": args.quantize_nli,
+                "span_backend": args.span_backend,
+                "nli_backend": args.nli_backend,
+                "gold_sha256": gold_sha256,
+                "scorer_configs": scorer_configs,
+            }
+        )
 
-    results = defaultdict(list)
-    for submission_data_path in tqdm(submission_data_paths):
+    # Imported here, as only the final results need them
+    from results_dataset import ResultsDatasetWriter, load_results
+    from results_db import ResultsDB
+    from leaderboard_stats import GROUP_COLUMNS
+
+    # One columnar batch per submission, partitioned by team and submission, written
+    # as soon as all of the submission's units are scored
+    results_dataset_path = os.path.splitext(evaluation_results_path)[0]
+    results_writer = ResultsDatasetWriter(
+        results_dataset_path, csv_path=evaluation_results_path
+    )
+    # Also kept across runs, for leaderboards and run-over-run diffs (see results_db.py)
+    results_db = ResultsDB(RESULTS_DB_PATH)
+    results_db.start_run(timestamp, "test" if args.test else "dev", tasks)
+
+    # Results of units whose submission still has units to score
+    unit_results = dict()
+
+    def add_unit_results(unit, timeline_to_results):
+        unit_results[unit] = timeline_to_results
+        submission_data_path = unit[0]
+        if any((submission_data_path, task) not in unit_results for task in tasks):
+            return
         team_name, submission_id = parse_filename(submission_data_path)
-        logger.info(f"Processing {Path(submission_data_path).name}")
+        submission_results = merge_unit_results(
+            unit_results, submission_data_path, tasks, gold_data
+        )
+        results_writer.write(submission_results, team_name, submission_id)
+        results_db.add_results(timestamp, team_name, submission_id, submission_results)
+        for task in tasks:
+            del unit_results[(submission_data_path, task)]
 
-        with open(submission_data_path, "r", encoding="utf-8") as f:
-            submission_data = json.load(f)
+    # Reuse stored results of units whose submission, gold data and scorers are unchanged
+    cached_units = set()
+    results_cache = None
+    if not args.no_results_cache:
+        results_cache = ResultsCache(RESULTS_CACHE_DIR)
+        results_cache.add_file_hash(gold_data_path, gold_sha256)
+        unit_keys = {
+            unit: results_cache.make_key(
+                unit[0], gold_data_path, unit[1], scorer_configs[unit[1]]
+            )
+            for unit in units
+        }
+        for unit in units:
+            cached_results = results_cache.get(unit_keys[unit])
+            if cached_results is not None:
+                cached_units.add(unit)
+                add_unit_results(unit, cached_results)
+        logger.info(
+            f"Results cache: {len(cached_units)} of {len(units)} units up to date"
+        )
 
-        for timeline_id, timeline_results in score_submission(
-            submission_data=submission_data,
-            gold_data=gold_data,
-            do_A1=do_A1,
-            do_A2=do_A2,
-            do_B=do_B,
-            do_C=do_C,
-        ).items():
-            for curr_result in timeline_results:
-                for metric_name, metric_vals in curr_result.items():
-                    results["timeline_id"].append(timeline_id)
-                    results["metric"].append(metric_name)
-                    results["task"].append(metric_vals["task"])
-                    results["value"].append(metric_vals["value"])
-                    results["team_name"].append(team_name)
-                    results["submission_id"].append(submission_id)
+    # Timelines already scored before an interrupted run stopped
+    journaled = journal.replay() if args.resume else dict()
+
+    def store_unit_results(unit, timeline_to_results):
+        # Unverified journaled results are used for this run only
+        if results_cache is not None and (journal_verified or unit not in journaled):
+            results_cache.put(
+                unit_keys[unit],
+                timeline_to_results,
+                metadata={"submission": Path(unit[0]).name, "task": unit[1]},
+            )
+        add_unit_results(unit, timeline_to_results)
+
+    missing_units = []
+    for unit in units:
+        if unit in cached_units:
+            continue
+        if all(timeline_id in journaled.get(unit, {}) for timeline_id in gold_data):
+            store_unit_results(unit, journaled[unit])
+        else:
+            missing_units.append(unit)
+
+    if missing_units:
+        score_units = (
+            score_units_in_parallel if args.workers > 1 else score_units_serially
+        )
+        score_units(
+            args,
+            missing_units,
+            gold_data,
+            gold_data_path,
+            journal=journal,
+            journaled=journaled,
+            on_result=store_unit_results,
+        )
+    results_db.close()
+    logger.info(f"Results dataset saved to {results_dataset_path}")
+    logger.info(f"Results of run {timestamp} added to {RESULTS_DB_PATH}")
 
-    results_df = pd.DataFrame(results)
-    results_df.to_csv(evaluation_results_path)
-    print(
-        results_df.groupby(
-            ["team_name", "submission_id", "task", "metric"]
-        ).value.mean()
+    # Only the columns the statistics need
+    results_df = load_results(
+        results_dataset_path, columns=GROUP_COLUMNS + ["timeline_id", "value"]
     )
+    if args.bootstrap_resamples:
+        # Means with bootstrap confidence intervals over timelines
+        from leaderboard_stats import bootstrap_confidence_intervals
+
+        stats_df = bootstrap_confidence_intervals(
+            results_df,
+            num_resamples=args.bootstrap_resamples,
+            confidence=args.confidence,
+            seed=args.seed,
+        )
+        stats_path = evaluation_results_path.replace(".csv", "_ci.csv")
+        stats_df.to_csv(stats_path)
+        print(stats_df.to_string(max_rows=60))
+        logger.info(
+            f"{args.confidence:.0%} bootstrap confidence intervals saved to {stats_path}"
+        )
+    else:
+        print(
+            results_df.groupby(
+                ["team_name", "submission_id", "task", "metric"], observed=True
+            ).value.mean()
+        )
+
+    if args.permutations and len(submission_data_paths) > 1:
+        # Pairwise significance of the differences between submissions on the main metrics
+        from leaderboard_stats import paired_permutation_tests
+
+        significance_df = paired_permutation_tests(
+            results_df, num_permutations=args.permutations, seed=args.seed
+        )
+        significance_path = evaluation_results_path.replace(".csv", "_significance.csv")
+        significance_df.to_csv(significance_path, index=False)
+        alpha = 1 - args.confidence
+        for metric, metric_df in significance_df.groupby("metric", sort=False):
+            logger.info(
+                f"{metric}: {(metric_df.p_value < alpha).sum()} of {len(metric_df)} "
+                f"submission pairs differ at p < {alpha:.2g}"
+            )
+        logger.info(f"Paired permutation tests saved to {significance_path}")
 
 
 if __name__ == "__main__":
@@ -324,5 +1136,134 @@ if __name__ == "__main__":
         default=[],
         help="Tasks on which to evaluate submissions, out of A1, A2, B, C. If unspecified, evaluate all.",
     )
+    parser.add_argument(
+        "--nli-batch-size",
+        type=int,
+        default=None,
+        help="Optional maximum number of premise-hypothesis pairs per NLI forward pass (Tasks B, C).",
+    )
+    parser.add_argument(
+        "--nli-max-tokens",
+        type=int,
+        default=4096,
+        help="Maximum padded tokens per NLI forward pass; pairs are batched by length (Tasks B, C).",
+    )
+    parser.add_argument(
+        "--span-max-tokens",
+        type=int,
+        default=8192,
+        help="Maximum padded tokens per BERTScore encoder forward pass; spans are batched by length (Task A1).",
+    )
+    parser.add_argument(
+        "--quantize-nli",
+        action="store_true",
+        help="If True, run the NLI model (Tasks B, C) on CPU with dynamic int8 quantization. "
+        "Faster, but scores drift slightly from fp32; see `python benchmark.py nli-drift`.",
+    )
+    parser.add_argument(
+        "--span-backend",
+        choices=INFERENCE_BACKENDS,
+        default="torch",
+        help="Inference backend of the BERTScore encoder (Task A1): PyTorch, or ONNX Runtime on CPU.",
+    )
+    parser.add_argument(
+        "--nli-backend",
+        choices=INFERENCE_BACKENDS,
+        default="torch",
+        help="Inference backend of the NLI model (Tasks B, C): PyTorch, or ONNX Runtime on CPU.",
+    )
+    parser.add_argument(
+        "--memory-limit-gb",
+        type=float,
+        default=None,
+        help="Memory ceiling for span scoring (Task A1): encoder batches and similarity grid chunks "
+        "are sized to fit, and split further on allocation failures. Peak RSS per timeline is journaled.",
+    )
+    parser.add_argument(
+        "--no-nli-cache",
+        action="store_true",
+        help="If True, bypass the on-disk NLI cache and send every pair to the model.",
+    )
+    parser.add_argument(
+        "--nli-cache-size",
+        type=int,
+        default=1_000_000,
+        help="Maximum number of cached NLI pairs before least recently used entries are evicted.",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="If True, score each submission separately instead of first scoring every "
+        "span and NLI pair shared across submissions and tasks once (without --workers).",
+    )
+    parser.add_argument(
+        "--dedup-submissions",
+        type=int,
+        default=8,
+        help="Number of submissions whose shared span and NLI pairs are scored together "
+        "before their units are scored; bounds the prefetched work held in memory.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes; each scores (submission, task) shards with its own copy of the models.",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Torch threads per worker process. Defaults to the number of CPUs divided by --workers.",
+    )
+    parser.add_argument(
+        "--no-results-cache",
+        action="store_true",
+        help="If True, rescore all submissions instead of reusing stored results of unchanged ones.",
+    )
+    parser.add_argument(
+        "--sentence-splitter",
+        choices=["punkt", "rule"],
+        default="punkt",
+        help="Sentence segmentation of predicted summaries (Tasks B, C): nltk Punkt, or a faster rule-based splitter.",
+    )
+    parser.add_argument(
+        "--sentence-cache",
+        action="store_true",
+        help="If True, persist sentence splits on disk and reuse them across runs.",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        help="ID of an interrupted run (its timestamp, see results/runs/) to continue. "
+        "Timelines already scored in that run are not scored again.",
+    )
+    parser.add_argument(
+        "--bootstrap-resamples",
+        type=int,
+        default=10000,
+        help="Number of bootstrap resamples of the timelines for confidence intervals of the "
+        "mean of each metric (see leaderboard_stats.py); 0 to only report the means.",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the bootstrap confidence intervals, and 1 - the significance "
+        "level reported for the permutation tests.",
+    )
+    parser.add_argument(
+        "--permutations",
+        type=int,
+        default=10000,
+        help="Number of permutations of the paired tests between all submissions on the "
+        "main metrics (see leaderboard_stats.py); 0 to skip the tests.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the bootstrap resampling and permutations.",
+    )
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,135 @@
+"""
+Durable journal of per-timeline results for resumable evaluation runs.
+
+Each run writes to its own directory under RUNS_DIR: the run settings in
+`run.json`, and results appended to `journal-<pid>.jsonl` as soon as each
+(submission, task, timeline) unit is scored, one file per process so that
+workers never interleave writes. `run.py --resume <run-id>` replays the journal
+and only scores the units that are missing.
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+from collections import defaultdict
+from results_cache import hash_file, serialize_results
+
+logger = logging.getLogger("run_journal")
+
+
+class RunJournal:
+    def __init__(self, run_dir: str, resume: bool = False):
+        """
+        Args:
+            run_dir: Directory of the run, created if missing
+            resume: Whether to continue an existing run; its directory is then never
+                    created, so that a mistyped run ID leaves nothing behind
+        """
+        self.run_dir = run_dir
+        self.run_id = Path(run_dir).name
+        if resume:
+            self._check_exists()
+        else:
+            Path(run_dir).mkdir(parents=True, exist_ok=True)
+        self._file = None
+        self._submission_hashes = dict()
+
+    @property
+    def config_path(self):
+        return os.path.join(self.run_dir, "run.json")
+
+    def write_config(self, config: dict):
+        """Save the run settings needed to resume it."""
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+
+    def _check_exists(self):
+        if not os.path.exists(self.config_path):
+            raise FileNotFoundError(
+                f"No run found at {self.run_dir}. Check the run ID passed to --resume."
+            )
+
+    def read_config(self):
+        self._check_exists()
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _submission_hash(self, submission_data_path):
+        if submission_data_path not in self._submission_hashes:
+            self._submission_hashes[submission_data_path] = hash_file(
+                submission_data_path
+            )
+        return self._submission_hashes[submission_data_path]
+
+    def record(
+        self,
+        submission_data_path,
+        task,
+        timeline_id,
+        timeline_results,
+        peak_rss_mb=None,
+    ):
+        """
+        Append the results of one timeline and flush them to disk.
+
+        Args:
+            peak_rss_mb: Optional peak resident memory while scoring the timeline, for diagnostics
+        """
+        if self._file is None:
+            self._file = open(
+                os.path.join(self.run_dir, f"journal-{os.getpid()}.jsonl"),
+                "a",
+                encoding="utf-8",
+            )
+        entry = {
+            "submission": submission_data_path,
+            "submission_hash": self._submission_hash(submission_data_path),
+            "task": task,
+            "timeline_id": timeline_id,
+            "results": serialize_results(timeline_results),
+        }
+        if peak_rss_mb is not None:
+            entry["peak_rss_mb"] = peak_rss_mb
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def replay(self):
+        """
+        Read back all journaled results of the run.
+        Entries of submission files that changed since they were journaled are skipped.
+
+        Returns:
+            Dictionary mapping (submission path, task) to {timeline_id: results}
+        """
+        unit_results = defaultdict(dict)
+        num_entries, num_stale = 0, 0
+        for journal_path in sorted(Path(self.run_dir).glob("journal-*.jsonl")):
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line may be incomplete if the run was killed mid-write
+                        logger.warning(f"Skipping incomplete entry in {journal_path}")
+                        continue
+                    submission_data_path = entry["submission"]
+                    if not os.path.exists(submission_data_path) or entry[
+                        "submission_hash"
+                    ] != self._submission_hash(submission_data_path):
+                        num_stale += 1
+                        continue
+                    unit = (submission_data_path, entry["task"])
+                    unit_results[unit][entry["timeline_id"]] = entry["results"]
+                    num_entries += 1
+        logger.info(
+            f"Replayed {num_entries} journaled timelines of run {self.run_id}"
+            + (f" ({num_stale} stale entries skipped)" if num_stale else "")
+        )
+        return unit_results
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,132 @@
+"""
+Sentence segmentation with a pluggable backend and a memoizing cache.
+
+The same predicted summaries are split again and again (per submission and per task),
+so SentenceSplitter caches splits by a hash of the backend and text, shared by all
+callers in the process and optionally saved to disk. Text that is split only once,
+like the gold posts in process_gold_data.py, goes through the uncached `split_sentences`.
+
+Backends:
+    - "punkt": nltk.sent_tokenize, the reference behaviour (default)
+    - "rule": a fast regular-expression splitter on sentence-final punctuation,
+              which does not handle abbreviations like Punkt does
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+from pathlib import Path
+
+logger = logging.getLogger("sentence_splitter")
+
+# Split after ., ! or ? (and any closing quotes/brackets) followed by whitespace
+_RULE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+def _rule_tokenize(text):
+    sentences, start = [], 0
+    for match in _RULE_BOUNDARY.finditer(text):
+        end = match.start() + len(match.group().rstrip())
+        sentences.append(text[start:end])
+        start = match.end()
+    if text[start:]:
+        sentences.append(text[start:])
+    return sentences
+
+
+def _strip_sentences(sentences):
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def _punkt_tokenize(text):
+    # Imported on first use, as importing nltk takes seconds
+    from nltk import sent_tokenize
+
+    return sent_tokenize(text)
+
+
+BACKENDS = {
+    "punkt": _punkt_tokenize,
+    "rule": _rule_tokenize,
+}
+
+
+class SentenceSplitter:
+    def __init__(self, backend: str = "punkt", cache_path: str = None):
+        """
+        Args:
+            backend: Name of the segmentation backend, see BACKENDS
+            cache_path: Optional JSON file to load cached splits from and save them to
+        """
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown sentence splitter: {backend}. Valid splitters are: {list(BACKENDS)}"
+            )
+        self.backend = backend
+        self.cache_path = cache_path
+        self.cache = dict()
+        # Splits computed since the last `take_new_splits`
+        self._new_splits = dict()
+        self.hits = 0
+        self.misses = 0
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.backend}\0{text}".encode("utf-8")).hexdigest()
+
+    def tokenize(self, text: str):
+        """Split text into sentences, as returned by the backend (like nltk.sent_tokenize)."""
+        key = self._key(text)
+        if key in self.cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.cache[key] = BACKENDS[self.backend](text)
+            self._new_splits[key] = self.cache[key]
+        return list(self.cache[key])
+
+    def split(self, text: str):
+        """Split text into stripped, non-empty sentences."""
+        return _strip_sentences(self.tokenize(text))
+
+    def take_new_splits(self):
+        """Cache entries added since the last call, e.g. to send them to another process."""
+        new_splits, self._new_splits = self._new_splits, dict()
+        return new_splits
+
+    def add_splits(self, splits: dict):
+        """Add cache entries computed by another process (see take_new_splits)."""
+        self.cache.update(splits)
+
+    def save(self):
+        """Save cached splits to `cache_path`, keeping entries saved by other processes."""
+        if not self.cache_path:
+            return
+        Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+        cache = dict()
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        cache.update(self.cache)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.cache),
+        }
+
+
+def split_sentences(text: str, backend: str = "punkt"):
+    """Split text into stripped, non-empty sentences, without caching the split."""
+    return _strip_sentences(BACKENDS[backend](text))
@@ -1,4 +1,6 @@
+import os
 import json
+from pathlib import Path
 from config import *
 
 """"
@@ -27,3 +29,7 @@ if not os.path.exists(TIMELINE_POST_MAPPING_PATH):
             timeline_id_to_post_id[timeline_id] = post_ids
     with open(TIMELINE_POST_MAPPING_PATH, "w") as f:
         json.dump(timeline_id_to_post_id, f)
+
+if not os.path.exists(TEST_TIMELINE_IDS_PATH) and TEST_TIMELINE_IDS:
+    with open(TEST_TIMELINE_IDS_PATH, "w") as f:
+        json.dump(TEST_TIMELINE_IDS, f)
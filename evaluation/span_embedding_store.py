@@ -0,0 +1,106 @@
+"""
+Precomputed BERTScore token embeddings for gold evidence spans.
+
+Gold spans never change between runs, so process_gold_data.py can encode them once
+(`--span-embeddings`) and SpanScorer then only has to encode predicted spans.
+A store consists of three files next to the processed gold file, e.g. for dev.json:
+    - dev_span_embeddings.npy: float32 token embeddings of all spans, concatenated
+    - dev_span_embeddings_idf.npy: float32 BERTScore token weights, aligned with the embeddings
+    - dev_span_embeddings.json: model info and span -> [offset, length, num_tokens] index
+The arrays are memory-mapped, so embeddings are read lazily and without copies.
+"""
+
+import os
+import json
+import numpy as np
+import torch
+
+STORE_SUFFIX = "_span_embeddings"
+
+
+class SpanEmbeddingStore:
+    def __init__(self, prefix: str):
+        """
+        Args:
+            prefix: Path of the store without extension (see `prefix_for`)
+        """
+        self.prefix = prefix
+        with open(f"{prefix}.json", "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.model_name = index["model_name"]
+        self.num_layers = index["num_layers"]
+        self.index = index["spans"]
+        # Copy-on-write mapping: arrays stay on disk but can back writable tensors
+        self.embeddings = np.load(f"{prefix}.npy", mmap_mode="c")
+        self.idf = np.load(f"{prefix}_idf.npy", mmap_mode="c")
+
+    @staticmethod
+    def prefix_for(gold_data_path: str):
+        """Store location for a processed gold file, e.g. data/dev.json -> data/dev_span_embeddings"""
+        return os.path.splitext(gold_data_path)[0] + STORE_SUFFIX
+
+    @staticmethod
+    def exists(prefix: str):
+        return all(
+            os.path.exists(prefix + ext) for ext in [".json", ".npy", "_idf.npy"]
+        )
+
+    @staticmethod
+    def write(
+        prefix: str,
+        span_stats: dict,
+        num_tokens: dict,
+        model_name: str,
+        num_layers: int,
+    ):
+        """
+        Save span embeddings.
+
+        Args:
+            prefix: Path of the store without extension
+            span_stats: Dictionary mapping span to (token embeddings, token idf weights),
+                        as returned by SpanScorer.encode_spans
+            num_tokens: Dictionary mapping span to its number of non-special tokens
+            model_name: BERTScore model used to compute the embeddings
+            num_layers: BERTScore layer used to compute the embeddings
+        """
+        spans = list(span_stats)
+        index = dict()
+        offset = 0
+        for span in spans:
+            length = span_stats[span][0].size(0)
+            index[span] = [offset, length, num_tokens[span]]
+            offset += length
+
+        if spans:
+            embeddings = torch.cat([span_stats[s][0] for s in spans]).float().numpy()
+            idf = torch.cat([span_stats[s][1] for s in spans]).float().numpy()
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+            idf = np.zeros(0, dtype=np.float32)
+
+        np.save(f"{prefix}.npy", embeddings)
+        np.save(f"{prefix}_idf.npy", idf)
+        with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {"model_name": model_name, "num_layers": num_layers, "spans": index},
+                f,
+            )
+
+    def __contains__(self, span):
+        return span in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, span: str):
+        """Return (token embeddings, token idf weights) of a span as tensors backed by the mapped files."""
+        offset, length, _ = self.index[span]
+        return (
+            torch.from_numpy(self.embeddings[offset : offset + length]),
+            torch.from_numpy(self.idf[offset : offset + length]),
+        )
+
+    def num_tokens(self, span: str):
+        """Number of non-special tokens of a span."""
+        return self.index[span][2]
@@ -1,29 +1,410 @@
+import os
+import logging
 import torch
-from transformers import AutoTokenizer
-from bert_score import BERTScorer
+from torch.nn.utils.rnn import pad_sequence
+import bert_score
+from bert_score.utils import collate_idf, bert_encode, model2layers, sent_encode
+from transformers import AutoConfig
 import numpy as np
+import pandas as pd
+from collections import defaultdict
 from typing import List
+from tqdm.auto import tqdm
+from model_registry import default_registry, get_default_device
+from onnx_backend import INFERENCE_BACKENDS
+from batching import TokenBudgetBatcher
+from memory_guard import (
+    SIMILARITY_BYTES_PER_ELEMENT,
+    current_rss_bytes,
+    estimate_encoder_bytes,
+    is_out_of_memory,
+)
+
+logger = logging.getLogger("span_scorer")
+
+DEFAULT_MODEL_NAME = "microsoft/deberta-xlarge-mnli"
+# BERTScorer's default batch size
+MAX_BATCH_SIZE = 64
+# New spans encoded together by prefetch_similarities: enough to fill encoder batches,
+# few enough to bound the embeddings held at once
+PREFETCH_WINDOW_SPANS = 8 * MAX_BATCH_SIZE
+
+
+def load_baseline_vals(model_name: str, num_layers: int, lang: str = "en"):
+    """
+    (P, R, F) rescale baseline of a model layer, as BERTScorer.baseline_vals reads it
+    from the baseline files shipped with bert_score.
+    """
+    path = os.path.join(
+        os.path.dirname(bert_score.__file__),
+        "rescale_baseline",
+        lang,
+        f"{model_name}.tsv",
+    )
+    return torch.from_numpy(pd.read_csv(path).iloc[num_layers].to_numpy())[1:].float()
 
 
 class SpanScorer:
     def __init__(
         self,
-        model_name: str = "microsoft/deberta-xlarge-mnli",
+        model_name: str = DEFAULT_MODEL_NAME,
         rescale_with_baseline: bool = True,
+        registry=None,
+        max_sim_elements: int = 2**26,
+        gold_store=None,
+        backend: str = "torch",
+        max_tokens: int = 8192,
+        memory_limit_gb: float = None,
     ):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(
+                f"Unknown backend: {backend}. Valid backends are: {INFERENCE_BACKENDS}"
+            )
         self.task = "A.1"
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.backend = backend
+        # The ONNX backend runs on ONNX Runtime's CPU execution provider
+        self.device = "cpu" if backend == "onnx" else get_default_device()
         self.model_name = model_name
         self.rescale_with_baseline = rescale_with_baseline
-        self.scorer = BERTScorer(
-            model_type=self.model_name,
-            lang="en",
-            device=self.device,
-            rescale_with_baseline=self.rescale_with_baseline,
+        # Upper bound on token-pair similarities held at once when building the span grid
+        self.max_sim_elements = max_sim_elements
+        self.registry = registry if registry is not None else default_registry
+        # Same layer as the BERTScorer's default for the model
+        self.num_layers = model2layers[model_name]
+        for attr, spec in self.model_specs().items():
+            setattr(self, attr, self.registry.get(**spec))
+        if backend == "torch":
+            self.encoder = self.scorer._model
+            self.bert_tokenizer = self.scorer._tokenizer
+        self.baseline_vals = (
+            load_baseline_vals(model_name, self.num_layers)
+            if rescale_with_baseline
+            else None
+        )
+        # Spans are encoded in length-sorted batches of at most `max_tokens` padded tokens
+        self.batcher = TokenBudgetBatcher(
+            max_tokens=max_tokens, max_batch_size=MAX_BATCH_SIZE
+        )
+        if memory_limit_gb is not None:
+            self.apply_memory_limit(memory_limit_gb)
+        # Optional SpanEmbeddingStore with precomputed gold span embeddings
+        self.gold_store = gold_store
+        # (gold span, predicted span) -> F computed ahead by prefetch_similarities
+        self.prefetched = dict()
+        if gold_store is not None and (
+            gold_store.model_name != self.model_name
+            or gold_store.num_layers != self.num_layers
+        ):
+            raise ValueError(
+                f"Span embedding store at {gold_store.prefix} was built with "
+                f"{gold_store.model_name} (layer {gold_store.num_layers}), "
+                f"expected {self.model_name} (layer {self.num_layers})"
+            )
+
+    def model_specs(self):
+        """
+        Registry requests for the models used by this scorer (see ModelRegistry.warm_up).
+        The ONNX backend does not load the torch model: only BERTScorer's tokenizer and
+        the ONNX encoder.
+        """
+        specs = {
+            "tokenizer": {
+                "kind": "tokenizer",
+                "model_name": self.model_name,
+                "device": self.device,
+                "clean_up_tokenization_spaces": False,
+            },
+        }
+        if self.backend == "torch":
+            specs["scorer"] = {
+                "kind": "bertscorer",
+                "model_name": self.model_name,
+                "device": self.device,
+                "lang": "en",
+                "rescale_with_baseline": self.rescale_with_baseline,
+            }
+        else:
+            # The slow tokenizer, as in bert_score.utils.get_tokenizer
+            specs["bert_tokenizer"] = {
+                "kind": "tokenizer",
+                "model_name": self.model_name,
+                "device": self.device,
+                "use_fast": False,
+            }
+            specs["encoder"] = {
+                "kind": "onnx_encoder",
+                "model_name": self.model_name,
+                "device": self.device,
+                "num_layers": self.num_layers,
+            }
+        return specs
+
+    def apply_memory_limit(self, memory_limit_gb: float):
+        """
+        Bound encoder batches and similarity grid chunks so that their estimated
+        memory fits under the limit, next to what the process (models included) already uses.
+        Half of the remaining memory goes to encoder activations, half to the grid.
+        """
+        limit = int(memory_limit_gb * 2**30)
+        rss = current_rss_bytes()
+        if rss is None:
+            logger.warning(
+                "Memory use cannot be measured on this platform; "
+                "the memory limit only bounds encoder batches and grid chunks"
+            )
+            rss = 0
+        available = limit - rss
+        if available <= 0:
+            logger.warning(
+                f"Process already uses {rss / 2**30:.1f} GB, above the "
+                f"memory limit of {memory_limit_gb} GB; scoring one span at a time"
+            )
+            available = 0
+        config = (
+            self.encoder.config
+            if self.backend == "torch"
+            else AutoConfig.from_pretrained(self.model_name)
         )
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.model_name, clean_up_tokenization_spaces=False
+        self.batcher.max_bytes = available // 2
+        self.batcher.estimate_bytes = lambda num_items, max_length: (
+            estimate_encoder_bytes(num_items, max_length, config)
         )
+        self.max_sim_elements = max(
+            1,
+            min(
+                self.max_sim_elements,
+                available // 2 // SIMILARITY_BYTES_PER_ELEMENT,
+            ),
+        )
+        logger.info(
+            f"Memory limit {memory_limit_gb} GB: {available / 2**30:.1f} GB available "
+            f"for activations, up to {self.max_sim_elements} similarities per chunk"
+        )
+
+    def _idf_dict(self):
+        # Same token weights as BERTScorer.score with idf=False: special tokens are ignored
+        idf_dict = defaultdict(lambda: 1.0)
+        idf_dict[self.bert_tokenizer.sep_token_id] = 0
+        idf_dict[self.bert_tokenizer.cls_token_id] = 0
+        return idf_dict
+
+    def encode_spans(self, spans: List[str]):
+        """
+        Encode each unique span once with the BERTScore model.
+        Spans in the gold span embedding store, if any, are read from it instead.
+
+        Returns:
+            Dictionary mapping span to (token embeddings, token idf weights)
+        """
+        span_stats = dict()
+        if self.gold_store is not None:
+            span_stats = {
+                span: self.gold_store.get(span)
+                for span in set(spans)
+                if span in self.gold_store
+            }
+        idf_dict = self._idf_dict()
+        unique_spans = [s for s in dict.fromkeys(spans) if s not in span_stats]
+        # Token lengths as tokenized by collate_idf
+        lengths = [len(sent_encode(self.bert_tokenizer, s)) for s in unique_spans]
+        for batch_idx in self.batcher.batches(lengths):
+            batch = [unique_spans[i] for i in batch_idx]
+            span_stats.update(zip(batch, self._encode_batch(batch, idf_dict)))
+        return span_stats
+
+    def _encode_batch(self, batch: List[str], idf_dict):
+        """
+        (token embeddings, token idf weights) of each span in a batch.
+        If the batch runs out of memory, it is retried in halves.
+        """
+        try:
+            padded, padded_idf, lens, mask = collate_idf(
+                batch, self.bert_tokenizer, idf_dict, device=self.device
+            )
+            embeddings = bert_encode(
+                self.encoder, padded, attention_mask=mask, all_layers=False
+            ).cpu()
+        except (RuntimeError, MemoryError) as e:
+            if not is_out_of_memory(e) or len(batch) == 1:
+                raise
+            logger.warning(f"Out of memory encoding {len(batch)} spans, splitting")
+            half = len(batch) // 2
+            return self._encode_batch(batch[:half], idf_dict) + self._encode_batch(
+                batch[half:], idf_dict
+            )
+        padded_idf = padded_idf.cpu()
+        lengths = mask.sum(dim=1).tolist()
+        return [
+            (embeddings[i, :length], padded_idf[i, :length])
+            for i, length in enumerate(lengths)
+        ]
+
+    @staticmethod
+    def _pad_span_stats(stats):
+        embeddings, idf = zip(*stats)
+        lens = torch.tensor([e.size(0) for e in embeddings])
+        embeddings = pad_sequence(embeddings, batch_first=True, padding_value=2.0)
+        idf = pad_sequence(idf, batch_first=True)
+        mask = torch.arange(embeddings.size(1)).unsqueeze(0) < lens.unsqueeze(1)
+        embeddings = embeddings / torch.norm(embeddings, dim=-1, keepdim=True)
+        return embeddings, mask, idf / idf.sum(dim=1, keepdim=True)
+
+    def prefetch_similarities(self, span_groups):
+        """
+        Compute F for every (gold span, predicted span) pair of each group and keep it,
+        so that later compute_similarity_matrix calls over these pairs are lookups.
+        Each unique span of all groups is encoded only once, e.g. a predicted span
+        submitted for several timelines or by several submissions. Spans are encoded a
+        window of groups at a time, and each embedding is dropped after the last group
+        that needs it.
+
+        Args:
+            span_groups: Iterable of (gold spans, predicted spans)
+
+        Returns:
+            (number of pairs computed, number of spans in the groups, number of unique spans)
+        """
+        span_groups = [
+            (list(dict.fromkeys(gold_spans)), list(dict.fromkeys(predicted_spans)))
+            for gold_spans, predicted_spans in span_groups
+        ]
+        # Index of the last group that needs each span
+        last_group = dict()
+        for i, (gold_spans, predicted_spans) in enumerate(span_groups):
+            for span in gold_spans + predicted_spans:
+                last_group[span] = i
+
+        span_stats = dict()
+        num_pairs, num_spans, start = 0, 0, 0
+        progress = tqdm(total=len(span_groups), desc="Span similarities")
+        while start < len(span_groups):
+            end, new_spans = start, dict()
+            while end < len(span_groups) and len(new_spans) < PREFETCH_WINDOW_SPANS:
+                gold_spans, predicted_spans = span_groups[end]
+                new_spans.update(
+                    dict.fromkeys(
+                        s for s in gold_spans + predicted_spans if s not in span_stats
+                    )
+                )
+                end += 1
+            span_stats.update(self.encode_spans(list(new_spans)))
+            for i in range(start, end):
+                gold_spans, predicted_spans = span_groups[i]
+                F = self.compute_similarity_matrix(
+                    gold_spans, predicted_spans, span_stats=span_stats
+                ).tolist()
+                for gold_span, row in zip(gold_spans, F):
+                    for predicted_span, score in zip(predicted_spans, row):
+                        self.prefetched[(gold_span, predicted_span)] = score
+                num_pairs += len(gold_spans) * len(predicted_spans)
+                num_spans += len(gold_spans) + len(predicted_spans)
+                for span in gold_spans + predicted_spans:
+                    if last_group[span] == i:
+                        span_stats.pop(span, None)
+                progress.update()
+            start = end
+        progress.close()
+        return num_pairs, num_spans, len(last_group)
+
+    def compute_similarity_matrix(
+        self, gold_spans: List[str], predicted_spans: List[str], span_stats=None
+    ):
+        """
+        Compute BERTScore F1 for every (gold span, predicted span) pair.
+
+        Each unique span is encoded once; greedy matching is then done for all pairs
+        at once on the cached token embeddings (see bert_score.utils.greedy_cos_idf).
+
+        Args:
+            span_stats: Optional encoded spans, as returned by encode_spans; the spans
+                        are encoded if not given
+
+        Returns:
+            Tensor of shape (len(gold_spans), len(predicted_spans)); row i equals the F
+            returned by BERTScorer.score(predicted_spans, [gold_spans[i]] * len(predicted_spans))
+        """
+        if not gold_spans or not predicted_spans:
+            return torch.zeros((len(gold_spans), len(predicted_spans)))
+
+        if self.prefetched and all(
+            (g, p) in self.prefetched for g in gold_spans for p in predicted_spans
+        ):
+            return torch.tensor(
+                [[self.prefetched[(g, p)] for p in predicted_spans] for g in gold_spans]
+            )
+
+        if span_stats is None:
+            span_stats = self.encode_spans(gold_spans + predicted_spans)
+        ref_emb, ref_mask, ref_idf = self._pad_span_stats(
+            [span_stats[s] for s in gold_spans]
+        )
+        hyp_emb, hyp_mask, hyp_idf = self._pad_span_stats(
+            [span_stats[s] for s in predicted_spans]
+        )
+
+        # Process (gold, pred) blocks to bound the (gold, pred, pred token, gold token) tensor
+        num_gold, num_pred = len(gold_spans), len(predicted_spans)
+        pair_elements = hyp_mask.size(1) * ref_mask.size(1)
+        pred_chunk = max(1, min(num_pred, self.max_sim_elements // pair_elements))
+        gold_chunk = max(
+            1, min(num_gold, self.max_sim_elements // (pred_chunk * pair_elements))
+        )
+        F = torch.zeros((num_gold, num_pred))
+        g = 0
+        while g < num_gold:
+            p = 0
+            while p < num_pred:
+                try:
+                    F[g : g + gold_chunk, p : p + pred_chunk] = self._similarity_block(
+                        hyp_emb[p : p + pred_chunk],
+                        hyp_mask[p : p + pred_chunk],
+                        hyp_idf[p : p + pred_chunk],
+                        ref_emb[g : g + gold_chunk],
+                        ref_mask[g : g + gold_chunk],
+                        ref_idf[g : g + gold_chunk],
+                    )
+                except (RuntimeError, MemoryError) as e:
+                    if not is_out_of_memory(e) or gold_chunk == pred_chunk == 1:
+                        raise
+                    # Retry the block at half the size
+                    if gold_chunk > 1:
+                        gold_chunk //= 2
+                    else:
+                        pred_chunk //= 2
+                    logger.warning(
+                        f"Out of memory in similarity grid, retrying with blocks of "
+                        f"{gold_chunk} gold x {pred_chunk} predicted spans"
+                    )
+                    continue
+                p += pred_chunk
+            g += gold_chunk
+
+        if self.rescale_with_baseline:
+            baseline_F = self.baseline_vals[2]
+            F = (F - baseline_F) / (1 - baseline_F)
+        return F
+
+    @staticmethod
+    def _similarity_block(hyp_emb, hyp_mask, hyp_idf, ref_emb, ref_mask, ref_idf):
+        # sim[g, p, i, j]: cosine of token i of predicted span p and token j of gold span g
+        sim = torch.einsum("pid,gjd->gpij", hyp_emb, ref_emb)
+        pair_mask = hyp_mask[None, :, :, None] & ref_mask[:, None, None, :]
+        sim = sim * pair_mask.float()
+        P = (sim.max(dim=3)[0] * hyp_idf[None, :, :]).sum(dim=2)
+        R = (sim.max(dim=2)[0] * ref_idf[:, None, :]).sum(dim=2)
+        F = 2 * P * R / (P + R)
+        return F.masked_fill(torch.isnan(F), 0.0)
+
+    def count_tokens(self, spans: List[str]):
+        """Number of non-special tokens in each span."""
+        if self.gold_store is not None and all(s in self.gold_store for s in spans):
+            return [self.gold_store.num_tokens(s) for s in spans]
+        return [len(_) - 2 for _ in self.tokenizer(spans)["input_ids"]]
+
+    @staticmethod
+    def clean_spans(spans: List[str]):
+        """Stripped, non-empty spans, as scored by compute_span_metrics."""
+        return [s.strip() for s in spans if s.strip()]
 
     def score_empty_predictions(self):
         """Return default values when no predictions are submitted."""
@@ -38,20 +419,16 @@ class SpanScorer:
     def compute_span_metrics(self, gold_spans: List[str], predicted_spans: List[str]):
         """Score predicted evidence spans by comparing with reference spans."""
 
-        gold_spans = [s.strip() for s in gold_spans if s.strip()]
-        predicted_spans = [s.strip() for s in predicted_spans if s.strip()]
+        gold_spans = self.clean_spans(gold_spans)
+        predicted_spans = self.clean_spans(predicted_spans)
 
         if not predicted_spans:
             return self.score_empty_predictions()
 
         # similar to CLPsych2024, we get timeline-level highlights;
         # assuming span order stays the same we should be able to analyze
-        num_gold_spans_tokens = sum(
-            len(_) - 2 for _ in self.tokenizer(gold_spans)["input_ids"]
-        )
-        num_pred_spans_tokens = sum(
-            len(_) - 2 for _ in self.tokenizer(predicted_spans)["input_ids"]
-        )
+        num_gold_spans_tokens = sum(self.count_tokens(gold_spans))
+        num_pred_spans_tokens = sum(self.count_tokens(predicted_spans))
         if num_gold_spans_tokens < num_pred_spans_tokens:
             weight = num_gold_spans_tokens / num_pred_spans_tokens
         else:
@@ -60,11 +437,8 @@ class SpanScorer:
         curr_recalls, curr_recalls_weighted = [], []
 
         # for each expert evidence span, calculate maximum BERTScore
-        for gold_span in gold_spans:
-            _, _, F = self.scorer.score(
-                predicted_spans, [gold_span] * len(predicted_spans)
-            )
-            score = F.max().item()
+        F = self.compute_similarity_matrix(gold_spans, predicted_spans)
+        for score in F.max(dim=1)[0].tolist():
             curr_recalls.append(score)
             curr_recalls_weighted.append(score * weight)
 
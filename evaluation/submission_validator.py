@@ -6,11 +6,15 @@ including structure, field names, types, and timeline-post mappings.
 
 Requires there to be a mapping files created in data/ (see setup.sh).
 """
+import os
+import time
 import argparse
 import json
 import logging
 import sys
-from config import TIMELINE_POST_MAPPING_PATH, DEV_TIMELINE_IDS, TEST_TIMELINE_IDS
+# TEST_TIMELINE_IDS scans TEST_DIR, so it is only imported when needed (see Validator)
+from config import TIMELINE_POST_MAPPING_PATH, TEST_TIMELINE_IDS_PATH, DEV_TIMELINE_IDS
+from json_stream import NotAJSONObject, iter_json_object_items
 
 logging.basicConfig(
     level=logging.INFO,
@@ -37,14 +41,26 @@ class Validator:
                     if tlid in DEV_TIMELINE_IDS
                 }
             else:
-                if not TEST_TIMELINE_IDS:
+                if args.mapping_only and os.path.exists(TEST_TIMELINE_IDS_PATH):
+                    # Prebuilt by setup.py, so that TEST_DIR is not scanned
+                    with open(TEST_TIMELINE_IDS_PATH, "r") as ids_file:
+                        test_timeline_ids = set(json.load(ids_file))
+                else:
+                    if args.mapping_only:
+                        logger.info(
+                            f"{TEST_TIMELINE_IDS_PATH} not found (rerun setup.py to create it), scanning TEST_DIR instead"
+                        )
+                    from config import TEST_TIMELINE_IDS
+
+                    test_timeline_ids = TEST_TIMELINE_IDS
+                if not test_timeline_ids:
                     raise FileNotFoundError(
                         "Unable to load test timelines. Check config.py to see if paths are set correctly."
                     )
                 self.timeline_id_to_post_ids = {
                     tlid: pids
                     for (tlid, pids) in json.load(f).items()
-                    if tlid in TEST_TIMELINE_IDS
+                    if tlid in test_timeline_ids
                 }
         self.timelines_with_issues = set()
         self.posts_with_issues = set()  # Will store (timeline_id, post_id) tuples
@@ -126,10 +142,76 @@ class Validator:
         if not self.check_type(data, dict, "Submission file"):
             return
 
-        # Check for missing timelines in the submission
+        self.check_timeline_mapping(set(data.keys()))
+
+        # Validate each timeline
+        for timeline_id, timeline_data in data.items():
+            self.validate_timeline(timeline_id, timeline_data)
+
+        self.log_validation_result()
+
+    def validate_file_streaming(self, file_path, chunk_size=2**16):
+        """
+        Validate the JSON file at the specified path, parsing one timeline at a time.
+
+        Memory use is bounded by the largest timeline rather than the whole file.
+        Reports the same errors and warnings as `validate_file`; timeline mapping
+        checks are reported after the timelines, once all timeline IDs are known.
+        """
+        logger.info(f"Validating JSON file (streaming): {file_path}")
+        start_time = time.perf_counter()
+
+        actual_timelines = set()
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                for timeline_id, timeline_data in iter_json_object_items(
+                    file, chunk_size=chunk_size
+                ):
+                    actual_timelines.add(timeline_id)
+                    self.validate_timeline(timeline_id, timeline_data)
+        except NotAJSONObject:
+            # Root is not a timeline dictionary: nothing to stream, report as usual
+            self.validate_file(file_path)
+            return
+        except json.JSONDecodeError:
+            # Re-parse the whole file to report the same error position as json.load
+            try:
+                with open(file_path, "r", encoding="utf-8") as file:
+                    json.load(file)
+            except json.JSONDecodeError as e:
+                logger.error(f"Invalid JSON: {e}")
+            self.valid = False
+            return
+        except FileNotFoundError:
+            logger.error(f"File not found: {file_path}")
+            self.valid = False
+            return
+        except Exception as e:
+            logger.error(f"Error reading file: {e}")
+            self.valid = False
+            return
+
+        # Check if the root is a non-empty dictionary
+        if not actual_timelines:
+            logger.error("JSON is empty (no timelines)")
+            self.valid = False
+            return
+
+        self.check_timeline_mapping(actual_timelines)
+
+        elapsed = time.perf_counter() - start_time
+        file_mb = os.path.getsize(file_path) / 2**20
+        logger.info(
+            f"Validated {len(actual_timelines)} timelines ({file_mb:.2f} MB) in {elapsed:.2f}s: "
+            f"{len(actual_timelines) / elapsed:.1f} timelines/s, {file_mb / elapsed:.2f} MB/s"
+        )
+
+        self.log_validation_result()
+
+    def check_timeline_mapping(self, actual_timelines):
+        """Check for missing and unexpected timelines in the submission."""
         try:
             expected_timelines = set(self.timeline_id_to_post_ids.keys())
-            actual_timelines = set(data.keys())
 
             missing_timelines = expected_timelines - actual_timelines
             if missing_timelines:
@@ -147,16 +229,16 @@ class Validator:
             logger.error(f"Error checking timeline mapping: {e}")
             self.valid = False
 
-        # Validate each timeline
-        for timeline_id, timeline_data in data.items():
-            try:
-                logger.info(f"Validating timeline: {timeline_id}")
-                self.validate_timeline_dict(timeline_data, timeline_id)
-            except Exception as e:
-                logger.error(f"Error validating timeline {timeline_id}: {e}")
-                self.log_timeline_issue(timeline_id)
+    def validate_timeline(self, timeline_id, timeline_data):
+        try:
+            logger.info(f"Validating timeline: {timeline_id}")
+            self.validate_timeline_dict(timeline_data, timeline_id)
+        except Exception as e:
+            logger.error(f"Error validating timeline {timeline_id}: {e}")
+            self.log_timeline_issue(timeline_id)
 
-        # Log validation result with issue counts
+    def log_validation_result(self):
+        """Log validation result with issue counts."""
         if self.valid:
             logger.info("JSON file is valid.")
         else:
@@ -390,10 +472,23 @@ def main():
         action="store_true",
         help="If True, checks submission on dev split",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="If True, parse the file incrementally with bounded memory (for very large files)",
+    )
+    parser.add_argument(
+        "--mapping-only",
+        action="store_true",
+        help="If True, take test timelines from the list prebuilt by setup.py in data/ instead of scanning TEST_DIR (scanned if there is no list)",
+    )
     args = parser.parse_args()
 
     validator = Validator(args)
-    validator.validate_file(args.file_path)
+    if args.stream:
+        validator.validate_file_streaming(args.file_path)
+    else:
+        validator.validate_file(args.file_path)
 
     sys.exit(0 if validator.valid else 1)
 
@@ -0,0 +1,51 @@
+"""
+Scorer plugins of the evaluation tasks.
+
+Scorer modules pull in heavy dependencies: torch, transformers and bert_score for
+Tasks A1, B and C, scikit-learn for Task A2. run.py therefore looks up each task's
+scorer here and imports its module only once the task is active, so that e.g.
+`python run.py --tasks A2` never imports torch. `python benchmark.py task-startup`
+reports the import time and memory of each task combination.
+"""
+
+import importlib
+
+# Task -> scorer module and class, and whether the scorer runs models (loaded through
+# the ModelRegistry, with torch)
+TASK_PLUGINS = {
+    "A1": {
+        "module": "span_scorer",
+        "class": "SpanScorer",
+        "uses_models": True,
+    },
+    "A2": {
+        "module": "wellbeing_scorer",
+        "class": "WellbeingScorer",
+        "uses_models": False,
+    },
+    "B": {
+        "module": "nli_scorer",
+        "class": "NLIScorer",
+        "uses_models": True,
+    },
+    "C": {
+        "module": "nli_scorer",
+        "class": "NLIScorer",
+        "uses_models": True,
+    },
+}
+
+
+def load_plugin(task: str):
+    """Import (once) and return the scorer module of a task."""
+    return importlib.import_module(TASK_PLUGINS[task]["module"])
+
+
+def load_scorer_class(task: str):
+    """Scorer class of a task, importing its module."""
+    return getattr(load_plugin(task), TASK_PLUGINS[task]["class"])
+
+
+def uses_models(tasks):
+    """Whether any of the tasks runs models, i.e. needs torch and the ModelRegistry."""
+    return any(TASK_PLUGINS[task]["uses_models"] for task in tasks)
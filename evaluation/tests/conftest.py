@@ -0,0 +1,36 @@
+"""
+Shared test setup. The evaluation scripts import each other as top-level modules,
+so the evaluation directory is put on the path.
+
+Tests that load the NLI or BERTScore models are marked `models` and only run with
+`--models`, e.g. `python -m pytest tests --models`.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--models",
+        action="store_true",
+        help="Also run tests that load the NLI and BERTScore models",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "models: loads the NLI or BERTScore models (run with --models)"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--models"):
+        return
+    skip_models = pytest.mark.skip(reason="loads models, run with --models")
+    for item in items:
+        if "models" in item.keywords:
+            item.add_marker(skip_models)
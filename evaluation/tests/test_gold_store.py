@@ -0,0 +1,137 @@
+"""The binary gold store (gold_store.py) round-trips processed gold data."""
+
+import os
+import json
+import pickle
+import numpy as np
+import pytest
+
+from gold_store import (
+    GoldStore,
+    gold_data_hash,
+    is_up_to_date,
+    load_gold_data,
+)
+from results_cache import hash_file
+
+GOLD_DATA = {
+    "tl1": {
+        "timeline_level": {
+            "summary": "The writer moves from despair to hope. Support helps.",
+            "summary_sents": [
+                "The writer moves from despair to hope.",
+                "Support helps.",
+            ],
+            "adaptive_spans": [
+                {"text": "my friend helped me", "element": "B", "subcategory": "A"},
+                {"text": "Support helps", "element": "B", "subcategory": "A"},
+            ],
+            "maladaptive_spans": [
+                {"text": "I can't cope 😞", "element": "E", "subcategory": "C"}
+            ],
+            "sents": [["I can't cope 😞", "Nobody calls."], ["my friend helped me"]],
+            "post_ids": ["p1", "p2"],
+        },
+        "post_level": {
+            "p1": {
+                "summary": "Nobody calls.",
+                "summary_sents": ["Nobody calls."],
+                "wellbeing_score": 2,
+            },
+            "p2": {"summary": "", "summary_sents": [], "wellbeing_score": None},
+        },
+    },
+    "tl2": {
+        "timeline_level": {
+            "summary": "",
+            "summary_sents": [],
+            "adaptive_spans": [],
+            "maladaptive_spans": [],
+            "sents": [[]],
+            "post_ids": ["p3"],
+        },
+        "post_level": {
+            "p3": {
+                "summary": "Support helps.",
+                "summary_sents": ["Support helps."],
+                "wellbeing_score": 7.5,
+            }
+        },
+    },
+}
+
+
+@pytest.fixture
+def gold_data_path(tmp_path):
+    path = tmp_path / "dev.json"
+    path.write_text(json.dumps(GOLD_DATA))
+    return str(path)
+
+
+@pytest.fixture
+def store(gold_data_path):
+    store_path = GoldStore.path_for(gold_data_path)
+    GoldStore.write(store_path, GOLD_DATA, source_path=gold_data_path)
+    return GoldStore(store_path)
+
+
+def test_store_path_is_next_to_the_gold_file():
+    assert GoldStore.path_for(os.path.join("data", "dev.json")) == os.path.join(
+        "data", "dev.gold"
+    )
+
+
+def test_round_trip(store):
+    assert list(store) == list(GOLD_DATA)
+    assert len(store) == len(GOLD_DATA)
+    assert "tl2" in store and "tl3" not in store
+    assert dict(store) == GOLD_DATA
+
+
+def test_post_ids_and_wellbeing_scores(store):
+    assert store.post_ids("tl1") == ["p1", "p2"]
+    np.testing.assert_array_equal(store.wellbeing_scores("tl1"), [2, np.nan])
+    np.testing.assert_array_equal(store.wellbeing_scores("tl2"), [7.5])
+
+
+def test_pickled_store_reopens_the_file(store):
+    assert dict(pickle.loads(pickle.dumps(store))) == GOLD_DATA
+
+
+def test_rejects_other_files(gold_data_path):
+    with pytest.raises(ValueError):
+        GoldStore(gold_data_path)
+
+
+def test_is_up_to_date(store, gold_data_path):
+    assert is_up_to_date(store, gold_data_path)
+    # Touched but unchanged: recognized by its hash
+    stat = os.stat(gold_data_path)
+    os.utime(gold_data_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert is_up_to_date(store, gold_data_path)
+
+    with open(gold_data_path, "w") as f:
+        json.dump({"tl1": GOLD_DATA["tl1"]}, f)
+    assert not is_up_to_date(store, gold_data_path)
+
+
+def test_load_gold_data_uses_an_up_to_date_store(store, gold_data_path):
+    gold_data, path = load_gold_data(gold_data_path)
+    assert isinstance(gold_data, GoldStore) and path == gold_data_path
+    assert gold_data_hash(gold_data, path) == hash_file(gold_data_path)
+
+
+def test_load_gold_data_ignores_a_stale_store(store, gold_data_path):
+    stale_gold_data = {"tl2": GOLD_DATA["tl2"]}
+    with open(gold_data_path, "w") as f:
+        json.dump(stale_gold_data, f)
+
+    gold_data, path = load_gold_data(gold_data_path)
+    assert gold_data == stale_gold_data and path == gold_data_path
+    assert gold_data_hash(gold_data, path) == hash_file(gold_data_path)
+
+
+def test_load_gold_data_without_the_json_file(store, gold_data_path):
+    os.remove(gold_data_path)
+    gold_data, path = load_gold_data(gold_data_path)
+    assert dict(gold_data) == GOLD_DATA and path == store.path
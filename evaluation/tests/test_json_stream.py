@@ -0,0 +1,181 @@
+"""The streaming JSON parser (json_stream.py) and validator --stream against json.load."""
+
+import io
+import json
+import random
+import logging
+import argparse
+import pytest
+
+import submission_validator
+from json_stream import NotAJSONObject, iter_json_object_items
+from submission_validator import Validator
+
+
+def random_value(rng, depth=0):
+    kinds = ["int", "float", "str", "bool", "null"]
+    if depth < 3:
+        kinds += ["list", "dict"]
+    kind = rng.choice(kinds)
+    if kind == "int":
+        return rng.randint(-(10**12), 10**12)
+    if kind == "float":
+        return rng.uniform(-1e6, 1e6) * 10 ** rng.randint(-30, 30)
+    if kind == "str":
+        return random_string(rng)
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    if kind == "list":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {
+        random_string(rng): random_value(rng, depth + 1)
+        for _ in range(rng.randint(0, 4))
+    }
+
+
+def random_string(rng):
+    alphabet = 'ab ,:{}[]"\\/\n\té€😀0.5e'
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+
+
+def stream_items(text, chunk_size):
+    return list(iter_json_object_items(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_matches_json_load_on_random_documents():
+    rng = random.Random(0)
+    for _ in range(3000):
+        document = {
+            random_string(rng): random_value(rng) for _ in range(rng.randint(0, 6))
+        }
+        text = json.dumps(
+            document,
+            indent=rng.choice([None, 0, 2]),
+            ensure_ascii=rng.random() < 0.5,
+        )
+        if rng.random() < 0.5:
+            text = " \n" + text + "\n\t "
+        chunk_size = rng.choice([1, 2, 3, 5, 8, 64, 2**16])
+        assert stream_items(text, chunk_size) == list(json.loads(text).items())
+
+
+def test_yields_items_before_reading_the_rest():
+    items = iter_json_object_items(io.StringIO('{"a": 1.5, "b": '), chunk_size=4)
+    assert next(items) == ("a", 1.5)
+    with pytest.raises(json.JSONDecodeError):
+        next(items)
+
+
+@pytest.mark.parametrize("text", ["[1, 2]", '"tl1"', "3", ""])
+def test_rejects_non_object_roots(text):
+    with pytest.raises(NotAJSONObject):
+        stream_items(text, chunk_size=2)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "{",
+        '{"a": 1',
+        '{"a" 1}',
+        "{a: 1}",
+        '{"a": 1,}',
+        '{"a": 1} {}',
+        '{"a": 1}]',
+        '{"a": 1.}',
+        '{"a": tru}',
+    ],
+)
+def test_rejects_what_json_load_rejects(text):
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    with pytest.raises(json.JSONDecodeError):
+        stream_items(text, chunk_size=2)
+
+
+TIMELINE_ID_TO_POST_IDS = {"tl1": ["p1", "p2"], "tl2": ["p3"]}
+
+
+def submission(**overrides):
+    submission_data = {
+        timeline_id: {
+            "timeline_level": {"summary": "The writer is coping."},
+            "post_level": {
+                post_id: {
+                    "adaptive_evidence": ["helped"],
+                    "maladaptive_evidence": [],
+                    "summary": "The writer asks for help.",
+                    "wellbeing_score": 6,
+                }
+                for post_id in post_ids
+            },
+        }
+        for timeline_id, post_ids in TIMELINE_ID_TO_POST_IDS.items()
+    }
+    submission_data.update(overrides)
+    return submission_data
+
+
+@pytest.fixture
+def make_validator(tmp_path, monkeypatch):
+    mapping_path = tmp_path / "timeline_id_to_post_id.json"
+    mapping_path.write_text(json.dumps(TIMELINE_ID_TO_POST_IDS))
+    monkeypatch.setattr(
+        submission_validator, "TIMELINE_POST_MAPPING_PATH", str(mapping_path)
+    )
+    monkeypatch.setattr(
+        submission_validator, "DEV_TIMELINE_IDS", set(TIMELINE_ID_TO_POST_IDS)
+    )
+    return lambda: Validator(argparse.Namespace(dev=True, mapping_only=False))
+
+
+def validation_report(validator, validate, file_path, caplog):
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        validate(str(file_path))
+    return (
+        validator.valid,
+        validator.timelines_with_issues,
+        validator.posts_with_issues,
+        # Streaming reports missing timelines after the timelines
+        sorted(record.getMessage() for record in caplog.records),
+    )
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        json.dumps(submission()),
+        json.dumps(submission(tl3={"timeline_level": {}, "post_level": {}})),
+        json.dumps({"tl1": submission()["tl1"]}),
+        json.dumps(
+            submission(
+                tl2={
+                    "timeline_level": {"summary": 5},
+                    "post_level": {"p3": {"wellbeing_score": 11}, "p4": {}},
+                }
+            )
+        ),
+        json.dumps(submission(tl1=[])),
+        json.dumps(submission())[:-20],
+        json.dumps(list(submission().items())),
+        "{}",
+        "",
+    ],
+)
+def test_streaming_validation_reports_the_same_issues(
+    text, tmp_path, make_validator, caplog
+):
+    file_path = tmp_path / "submission.json"
+    file_path.write_text(text)
+    validator, streaming_validator = make_validator(), make_validator()
+
+    expected = validation_report(validator, validator.validate_file, file_path, caplog)
+    assert expected == validation_report(
+        streaming_validator,
+        lambda path: streaming_validator.validate_file_streaming(path, chunk_size=16),
+        file_path,
+        caplog,
+    )
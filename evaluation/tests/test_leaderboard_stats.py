@@ -0,0 +1,164 @@
+"""Bootstrap intervals and permutation tests (leaderboard_stats.py) against one resample at a time."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import leaderboard_stats
+from leaderboard_stats import (
+    GROUP_COLUMNS,
+    MAIN_METRICS,
+    bootstrap_confidence_intervals,
+    paired_permutation_tests,
+    resample_multiplicities,
+)
+
+TIMELINE_IDS = [f"tl{i}" for i in range(12)]
+
+
+@pytest.fixture(scope="module")
+def results_df():
+    """Per-timeline results of three submissions, with several rows per timeline for Task B."""
+    rng = np.random.default_rng(0)
+    rows = []
+    for team_name, submission_id, skill in [
+        ("a", "1", 0.8),
+        ("a", "2", 0.7),
+        ("b", "1", 0.5),
+    ]:
+        for timeline_id in TIMELINE_IDS:
+            # Not every submission is scored on every timeline
+            if team_name == "b" and timeline_id == "tl0":
+                continue
+            rows.append(
+                (
+                    team_name,
+                    submission_id,
+                    "A.2",
+                    "mse",
+                    timeline_id,
+                    rng.uniform(0, 9 * (1 - skill)),
+                )
+            )
+            for _ in range(rng.integers(1, 5)):
+                rows.append(
+                    (
+                        team_name,
+                        submission_id,
+                        "B",
+                        "post_mean_consistency_gold",
+                        timeline_id,
+                        rng.uniform(skill - 0.5, skill + 0.2),
+                    )
+                )
+    return pd.DataFrame(rows, columns=GROUP_COLUMNS + ["timeline_id", "value"])
+
+
+def test_resamples_draw_every_timeline_count_times():
+    multiplicities = resample_multiplicities(7, 50, np.random.default_rng(0))
+    assert multiplicities.shape == (50, 7)
+    assert (multiplicities.sum(axis=1) == 7).all()
+
+
+def test_same_seed_gives_the_same_intervals(results_df):
+    intervals = bootstrap_confidence_intervals(results_df, num_resamples=500, seed=3)
+    pd.testing.assert_frame_equal(
+        intervals, bootstrap_confidence_intervals(results_df, num_resamples=500, seed=3)
+    )
+    other_intervals = bootstrap_confidence_intervals(
+        results_df, num_resamples=500, seed=4
+    )
+    assert not np.allclose(intervals.ci_low, other_intervals.ci_low)
+    pd.testing.assert_series_equal(intervals["mean"], other_intervals["mean"])
+
+
+def test_matches_resampling_the_rows(results_df):
+    num_resamples, confidence, seed = 200, 0.9, 5
+    intervals = bootstrap_confidence_intervals(
+        results_df, num_resamples=num_resamples, confidence=confidence, seed=seed
+    )
+
+    timeline_ids = sorted(results_df.timeline_id.unique())
+    multiplicities = resample_multiplicities(
+        len(timeline_ids), num_resamples, np.random.default_rng(seed)
+    )
+    for group, group_df in results_df.groupby(GROUP_COLUMNS):
+        resampled_means = []
+        for timeline_counts in multiplicities:
+            # Each drawn timeline contributes all of its rows, once per draw
+            drawn = group_df.timeline_id.map(dict(zip(timeline_ids, timeline_counts)))
+            resampled_means.append(np.repeat(group_df.value.to_numpy(), drawn).mean())
+        alpha = 1 - confidence
+        expected = np.nanquantile(resampled_means, [alpha / 2, 1 - alpha / 2])
+        row = intervals.loc[group]
+        np.testing.assert_allclose([row.ci_low, row.ci_high], expected, rtol=1e-12)
+        assert row["mean"] == pytest.approx(group_df.value.mean())
+        assert row.num_timelines == group_df.timeline_id.nunique()
+
+
+def test_chunking_does_not_change_the_intervals(results_df, monkeypatch):
+    intervals = bootstrap_confidence_intervals(results_df, num_resamples=100)
+    monkeypatch.setattr(leaderboard_stats, "MAX_CHUNK_ELEMENTS", 100)
+    pd.testing.assert_frame_equal(
+        intervals, bootstrap_confidence_intervals(results_df, num_resamples=100)
+    )
+
+
+def test_same_seed_gives_the_same_p_values(results_df):
+    tests = paired_permutation_tests(results_df, num_permutations=500, seed=3)
+    pd.testing.assert_frame_equal(
+        tests, paired_permutation_tests(results_df, num_permutations=500, seed=3)
+    )
+    other_tests = paired_permutation_tests(results_df, num_permutations=500, seed=4)
+    assert not np.array_equal(tests.p_value, other_tests.p_value)
+    pd.testing.assert_series_equal(tests.mean_diff, other_tests.mean_diff)
+
+
+def test_matches_flipping_the_signs_of_each_pair(results_df):
+    num_permutations, seed = 300, 5
+    tests = paired_permutation_tests(
+        results_df, num_permutations=num_permutations, seed=seed
+    )
+    assert set(tests.metric) == {"mse", "post_mean_consistency_gold"}
+    assert len(tests) == 2 * 3
+
+    timeline_ids = sorted(results_df.timeline_id.unique())
+    signs = np.random.default_rng(seed).choice(
+        [-1.0, 1.0], size=(num_permutations, len(timeline_ids))
+    )
+    timeline_means = results_df.groupby(
+        ["metric", "team_name", "submission_id", "timeline_id"]
+    ).value.mean()
+    for test in tests.itertuples():
+        means_a = timeline_means[(test.metric, *test.submission_a.split("_"))]
+        means_b = timeline_means[(test.metric, *test.submission_b.split("_"))]
+        shared = [t for t in timeline_ids if t in means_a and t in means_b]
+        differences = (means_a[shared] - means_b[shared]).to_numpy()
+        observed = differences.mean()
+        num_extreme = sum(
+            abs((differences * flips[[timeline_ids.index(t) for t in shared]]).mean())
+            >= abs(observed) - 1e-12
+            for flips in signs
+        )
+        assert test.num_timelines == len(shared)
+        assert test.mean_a == pytest.approx(means_a[shared].mean())
+        assert test.mean_b == pytest.approx(means_b[shared].mean())
+        assert test.mean_diff == pytest.approx(observed)
+        assert test.p_value == (num_extreme + 1) / (num_permutations + 1)
+
+
+def test_identical_submissions_do_not_differ(results_df):
+    copy_df = results_df[results_df.team_name == "a"].assign(team_name="c")
+    tests = paired_permutation_tests(
+        pd.concat([results_df, copy_df]), metrics=MAIN_METRICS[1:2]
+    )
+    same = tests[(tests.submission_a == "a_1") & (tests.submission_b == "c_1")]
+    assert same.mean_diff.item() == 0 and same.p_value.item() == 1
+
+
+def test_chunking_does_not_change_the_p_values(results_df, monkeypatch):
+    tests = paired_permutation_tests(results_df, num_permutations=100)
+    monkeypatch.setattr(leaderboard_stats, "MAX_CHUNK_ELEMENTS", 100)
+    pd.testing.assert_frame_equal(
+        tests, paired_permutation_tests(results_df, num_permutations=100)
+    )
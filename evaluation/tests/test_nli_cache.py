@@ -0,0 +1,99 @@
+"""NLICache lookups, entry counting and least-recently-used eviction."""
+
+import itertools
+import pytest
+
+import nli_cache
+from nli_cache import NLICache
+
+FINGERPRINT = {"model_name": "test-model", "truncation": True, "max_length": 512}
+
+
+def key(premise, hypothesis, fingerprint=FINGERPRINT):
+    return NLICache.make_key(fingerprint, premise, hypothesis)
+
+
+def entry(premise, hypothesis, probs=(0.7, 0.2, 0.1)):
+    return key(premise, hypothesis), premise, probs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing timestamps, so that the LRU order does not depend on the clock's resolution
+    ticks = itertools.count(1)
+    monkeypatch.setattr(nli_cache.time, "time_ns", lambda: next(ticks))
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = NLICache(str(tmp_path / "nli_cache.sqlite"), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_hits_and_misses(cache):
+    cache.put_many([entry("p", "h1", (0.5, 0.25, 0.25))])
+    found = cache.get_many([key("p", "h1"), key("p", "h2")])
+    assert found == {key("p", "h1"): (0.5, 0.25, 0.25)}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_key_depends_on_fingerprint():
+    assert key("p", "h") != key("p", "h", {**FINGERPRINT, "quantization": "int8"})
+    assert key("p", "h") != key("h", "p")
+
+
+def test_entries_persist_across_opens(tmp_path, clock):
+    path = str(tmp_path / "nli_cache.sqlite")
+    cache = NLICache(path)
+    cache.put_many([entry("p", "h1"), entry("p", "h2")])
+    cache.close()
+
+    cache = NLICache(path)
+    assert cache.num_entries == len(cache) == 2
+    assert set(cache.get_many([key("p", "h1"), key("p", "h2")])) == {
+        key("p", "h1"),
+        key("p", "h2"),
+    }
+    cache.close()
+
+
+def test_replaced_and_repeated_entries_are_counted_once(cache):
+    cache.put_many([entry("p", "h1"), entry("p", "h1", (0.1, 0.1, 0.8))])
+    cache.put_many([entry("p", "h1", (0.2, 0.2, 0.6))])
+    assert cache.num_entries == len(cache) == 1
+    assert cache.get_many([key("p", "h1")]) == {key("p", "h1"): (0.2, 0.2, 0.6)}
+
+
+def test_evicts_least_recently_used(cache):
+    for hypothesis in ["h1", "h2", "h3"]:
+        cache.put_many([entry("p", hypothesis)])
+    # h1 is used again, so h2 is now the least recently used
+    cache.get_many([key("p", "h1")])
+    cache.put_many([entry("p", "h4")])
+
+    assert cache.num_entries == len(cache) == 3
+    assert set(cache.get_many([key("p", h) for h in ["h1", "h2", "h3", "h4"]])) == {
+        key("p", "h1"),
+        key("p", "h3"),
+        key("p", "h4"),
+    }
+
+
+def test_many_keys_are_looked_up_in_chunks(tmp_path, clock):
+    cache = NLICache(str(tmp_path / "nli_cache.sqlite"))
+    num_keys = 2 * nli_cache._QUERY_CHUNK_SIZE + 1
+    cache.put_many([entry("p", f"h{i}") for i in range(num_keys)])
+    assert cache.num_entries == num_keys
+    assert len(cache.get_many([key("p", f"h{i}") for i in range(num_keys)])) == num_keys
+    cache.close()
+
+
+def test_invalidate_premises(cache):
+    cache.put_many([entry("old", "h1"), entry("old", "h2"), entry("kept", "h1")])
+    assert cache.invalidate_premises(["old", "missing"]) == 2
+    assert cache.num_entries == len(cache) == 1
+    assert set(cache.get_many([key("old", "h1"), key("kept", "h1")])) == {
+        key("kept", "h1")
+    }
@@ -0,0 +1,92 @@
+"""Batched NLI (NLIScorer.predict_pairs) against scoring one pair at a time."""
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("bert_score")
+
+from nli_scorer import NLIScorer
+
+pytestmark = pytest.mark.models
+
+PREMISES = [
+    "I feel sad today.",
+    "My friend helped me move house, which was a relief after a long and hard week.",
+    "I could not sleep.",
+]
+HYPOTHESES = [
+    "Things are better now!",
+    "The writer is tired.",
+    "The writer had support from a friend during a difficult week at work and at home.",
+    "I feel sad today.",
+]
+
+
+@pytest.fixture(scope="module")
+def nli():
+    return NLIScorer()
+
+
+def expected_probs(nli, premise, hypothesis):
+    scores = nli._compute_nli_scores(premise, hypothesis)
+    return [scores[name] for name in nli.label_names]
+
+
+def test_predict_pairs_matches_per_pair_scores(nli):
+    pairs = [(p, h) for p in PREMISES for h in HYPOTHESES]
+    probs = nli.predict_pairs(pairs)
+    assert probs.shape == (len(pairs), len(nli.label_names))
+    for (premise, hypothesis), row in zip(pairs, probs):
+        assert row.tolist() == pytest.approx(
+            expected_probs(nli, premise, hypothesis), abs=1e-5
+        )
+
+
+def test_predict_pairs_does_not_depend_on_micro_batches(nli):
+    pairs = [(p, h) for p in PREMISES for h in HYPOTHESES]
+    # A token budget this small puts every pair in its own micro-batch
+    one_at_a_time = NLIScorer(registry=nli.registry, max_tokens=1)
+    assert one_at_a_time.predict_pairs(pairs) == pytest.approx(
+        nli.predict_pairs(pairs), abs=1e-5
+    )
+
+
+def test_compute_nli_matrices_layout(nli):
+    entail, contradict = nli.compute_nli_matrices(PREMISES, HYPOTHESES)
+    assert entail.shape == contradict.shape == (len(PREMISES), len(HYPOTHESES))
+    entail_idx = nli.label_names.index("entailment")
+    contradict_idx = nli.label_names.index("contradiction")
+    for i, premise in enumerate(PREMISES):
+        for j, hypothesis in enumerate(HYPOTHESES):
+            probs = expected_probs(nli, premise, hypothesis)
+            assert entail[i, j] == pytest.approx(probs[entail_idx], abs=1e-5)
+            assert contradict[i, j] == pytest.approx(probs[contradict_idx], abs=1e-5)
+
+
+def test_prefetched_pairs_are_looked_up(nli):
+    pairs = [(PREMISES[0], h) for h in HYPOTHESES]
+    expected = nli.predict_pairs(pairs)
+    nli.prefetch(pairs)
+    try:
+        assert nli.predict_pairs(pairs) == pytest.approx(expected, abs=1e-6)
+    finally:
+        nli.prefetched.clear()
+
+
+def test_cached_predictions_match_model(nli, tmp_path):
+    from nli_cache import NLICache
+
+    pairs = [(p, h) for p in PREMISES for h in HYPOTHESES]
+    cache = NLICache(str(tmp_path / "nli_cache.sqlite"))
+    cached_nli = NLIScorer(registry=nli.registry, cache=cache)
+    try:
+        first = cached_nli.predict_pairs(pairs)
+        assert cache.num_entries == len(pairs)
+        second = cached_nli.predict_pairs(pairs)
+        assert cache.hits == len(pairs)
+    finally:
+        cache.close()
+    expected = nli.predict_pairs(pairs)
+    assert first == pytest.approx(expected, abs=1e-6)
+    assert second == pytest.approx(expected, abs=1e-6)
@@ -0,0 +1,173 @@
+"""The results database (results_db.py) against the same aggregations in pandas."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import results_db
+from results_db import ResultsDB, import_results_csv
+
+SUBMISSION_RESULTS = {
+    ("teamA", "01"): {
+        "tl1": [
+            {"mse": {"task": "A.2", "value": 2.0}},
+            {"post_mean_consistency_gold": {"task": "B", "value": 0.5}},
+            {"post_mean_consistency_gold": {"task": "B", "value": np.nan}},
+        ],
+        "tl2": [
+            {"mse": {"task": "A.2", "value": 4.0}},
+            {"post_mean_consistency_gold": {"task": "B", "value": 0.9}},
+        ],
+    },
+    ("teamB", "1"): {
+        "tl1": [
+            {"mse": {"task": "A.2", "value": 1.0}},
+            {"post_mean_consistency_gold": {"task": "B", "value": 0.2}},
+        ],
+        "tl3": [
+            {"mse": {"task": "A.2", "value": 5.0}},
+            {"post_mean_consistency_gold": {"task": "B", "value": 0.4}},
+        ],
+    },
+}
+METRICS = ["mse", "post_mean_consistency_gold"]
+
+
+def results_df(submission_results=SUBMISSION_RESULTS):
+    """Results as written to the results CSV, with a row per metric value."""
+    return pd.DataFrame(
+        [
+            (timeline_id, metric_name, metric_vals["task"], metric_vals["value"])
+            + (team_name, submission_id)
+            for (
+                team_name,
+                submission_id,
+            ), timeline_to_results in submission_results.items()
+            for timeline_id, timeline_results in timeline_to_results.items()
+            for curr_result in timeline_results
+            for metric_name, metric_vals in curr_result.items()
+        ],
+        columns=[
+            "timeline_id",
+            "metric",
+            "task",
+            "value",
+            "team_name",
+            "submission_id",
+        ],
+    )
+
+
+def expected_means(df):
+    return (
+        df.groupby(["team_name", "submission_id", "metric"])
+        .value.mean()
+        .unstack("metric")[METRICS]
+        .reset_index()
+        .rename_axis(columns=None)
+    )
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ResultsDB(str(tmp_path / "results" / "results.sqlite"))
+    yield db
+    db.close()
+
+
+def add_run(db, run_id, submission_results=SUBMISSION_RESULTS, split="dev"):
+    db.start_run(run_id, split, ["A2", "B"])
+    for (team_name, submission_id), timeline_to_results in submission_results.items():
+        db.add_results(run_id, team_name, submission_id, timeline_to_results)
+
+
+def test_leaderboard_matches_pandas(db):
+    add_run(db, "run1")
+    pd.testing.assert_frame_equal(
+        db.leaderboard("run1", metrics=METRICS), expected_means(results_df())
+    )
+
+
+def test_ranking(db):
+    add_run(db, "run1")
+    ranking = db.ranking("run1", "mse")
+    assert ranking.team_name.tolist() == ["teamA", "teamB"]
+    assert ranking["rank"].tolist() == [1, 1]
+    assert ranking["mean"].tolist() == [3.0, 3.0]
+
+    ranking = db.ranking("run1", "post_mean_consistency_gold")
+    assert ranking.team_name.tolist() == ["teamA", "teamB"]
+    assert ranking["rank"].tolist() == [1, 2]
+    assert ranking.num_timelines.tolist() == [2, 2]
+
+
+def test_runs_and_rerun_replacing_results(db):
+    add_run(db, "run1")
+    add_run(db, "run2", split="test")
+    # Resumed run: its earlier results are replaced
+    add_run(db, "run1", {("teamA", "01"): SUBMISSION_RESULTS[("teamA", "01")]})
+
+    runs = db.runs().set_index("run_id")
+    assert runs.num_submissions.to_dict() == {"run1": 1, "run2": 2}
+    assert runs.loc["run1", "split"] == "dev"
+    assert db.latest_run(split="test") == "run2"
+    assert db.latest_run(split="train") is None
+    assert db.query(
+        "SELECT COUNT(*) AS n FROM metric_values JOIN submissions USING (submission_key) "
+        "WHERE run_id = ?",
+        ("run1",),
+    ).n.item() == len(results_df().query("team_name == 'teamA'"))
+
+
+def test_diff(db):
+    add_run(db, "run1")
+    improved = {
+        submission: {
+            timeline_id: [
+                {
+                    name: {**vals, "value": vals["value"] / 2}
+                    for name, vals in result.items()
+                }
+                for result in timeline_results
+            ]
+            for timeline_id, timeline_results in timeline_to_results.items()
+        }
+        for submission, timeline_to_results in SUBMISSION_RESULTS.items()
+    }
+    add_run(db, "run2", improved)
+
+    diff = db.diff("run1", "run2", metrics=METRICS)
+    expected = expected_means(results_df()).melt(
+        ["team_name", "submission_id"], var_name="metric", value_name="mean_a"
+    )
+    merged = diff.merge(expected, on=["team_name", "submission_id", "metric"])
+    assert len(merged) == len(diff) == 4
+    np.testing.assert_allclose(merged.mean_a_x, merged.mean_a_y)
+    np.testing.assert_allclose(merged["diff"], -merged.mean_a_y / 2)
+    assert (diff["diff"].abs().diff().dropna() <= 0).all()
+
+
+def test_many_timelines(db, monkeypatch):
+    monkeypatch.setattr(results_db, "_QUERY_CHUNK_SIZE", 3)
+    timeline_to_results = {
+        f"tl{i}": [{"mse": {"task": "A.2", "value": float(i)}}] for i in range(10)
+    }
+    add_run(db, "run1", {("teamA", "1"): timeline_to_results})
+    assert db.leaderboard("run1", metrics=["mse"]).mse.item() == 4.5
+
+
+def test_import_results_csv(db, tmp_path):
+    results_path = tmp_path / "results_dev_2025-03-07_16-21-56.csv"
+    results_df().to_csv(results_path, index=False)
+
+    assert import_results_csv(db, str(results_path)) == "2025-03-07_16-21-56"
+    assert db.latest_run(split="dev") == "2025-03-07_16-21-56"
+    pd.testing.assert_frame_equal(
+        db.leaderboard("2025-03-07_16-21-56", metrics=METRICS),
+        expected_means(results_df()),
+    )
+
+
+def test_import_rejects_other_files(db, tmp_path):
+    with pytest.raises(ValueError):
+        import_results_csv(db, str(tmp_path / "results_dev_2025-03-07_ci.txt"))
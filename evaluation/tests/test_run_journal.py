@@ -0,0 +1,196 @@
+"""RunJournal replay and resuming runs from it (run.py --resume)."""
+
+import json
+import pytest
+
+import run_journal
+from run_journal import RunJournal
+from results_cache import serialize_results
+from run import check_resumed_run, evaluate_unit, load_scorers
+
+GOLD_DATA = {
+    timeline_id: {
+        "timeline_level": {
+            "post_ids": [f"{timeline_id}_{i}" for i in range(3)],
+            "adaptive_spans": [],
+            "maladaptive_spans": [],
+        },
+        "post_level": {
+            f"{timeline_id}_{i}": {"wellbeing_score": score}
+            for i, score in enumerate(scores)
+        },
+    }
+    for timeline_id, scores in [
+        ("tl1", [2, 5, None]),
+        ("tl2", [7, 9, 3]),
+        ("tl3", [None, 1, 10]),
+    ]
+}
+
+
+def result(value):
+    return [{"mse": {"task": "A.2", "value": value}}]
+
+
+@pytest.fixture
+def submission_path(tmp_path):
+    submission_data = {
+        timeline_id: {
+            "post_level": {
+                post_id: {
+                    "adaptive_evidence": [],
+                    "maladaptive_evidence": [],
+                    "summary": "",
+                    "wellbeing_score": i + 4,
+                }
+                for i, post_id in enumerate(gold_datum["timeline_level"]["post_ids"])
+            },
+            "timeline_level": {"summary": ""},
+        }
+        for timeline_id, gold_datum in GOLD_DATA.items()
+    }
+    path = tmp_path / "teamA_1.json"
+    path.write_text(json.dumps(submission_data))
+    return str(path)
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    return str(tmp_path / "runs" / "2025-03-07_16-21-56")
+
+
+def start_run(run_dir):
+    journal = RunJournal(run_dir)
+    journal.write_config({"test": False})
+    return journal
+
+
+def test_replay_returns_recorded_results(run_dir, submission_path):
+    journal = start_run(run_dir)
+    journal.record(submission_path, "A2", "tl1", result(1.5))
+    journal.record(submission_path, "A2", "tl2", result(0.5))
+    journal.close()
+
+    assert RunJournal(run_dir, resume=True).replay() == {
+        (submission_path, "A2"): {"tl1": result(1.5), "tl2": result(0.5)}
+    }
+
+
+def test_replay_merges_the_journals_of_all_processes(
+    run_dir, submission_path, monkeypatch
+):
+    for pid, timeline_id in [(100, "tl1"), (200, "tl2")]:
+        monkeypatch.setattr(run_journal.os, "getpid", lambda: pid)
+        journal = start_run(run_dir)
+        journal.record(submission_path, "A2", timeline_id, result(1.0))
+        journal.close()
+    monkeypatch.undo()
+
+    replayed = RunJournal(run_dir, resume=True).replay()
+    assert set(replayed[(submission_path, "A2")]) == {"tl1", "tl2"}
+
+
+def test_replay_skips_an_incomplete_last_entry(run_dir, submission_path):
+    journal = start_run(run_dir)
+    journal.record(submission_path, "A2", "tl1", result(1.5))
+    # The run was killed while writing the next entry
+    journal._file.write('{"submission": "')
+    journal.close()
+
+    assert RunJournal(run_dir, resume=True).replay() == {
+        (submission_path, "A2"): {"tl1": result(1.5)}
+    }
+
+
+def test_replay_skips_submissions_changed_since(run_dir, submission_path):
+    journal = start_run(run_dir)
+    journal.record(submission_path, "A2", "tl1", result(1.5))
+    journal.close()
+    with open(submission_path, "a") as f:
+        f.write(" ")
+
+    assert RunJournal(run_dir, resume=True).replay() == {}
+
+
+def test_resuming_a_missing_run_creates_nothing(tmp_path):
+    run_dir = tmp_path / "runs" / "mistyped-run-id"
+    with pytest.raises(FileNotFoundError):
+        RunJournal(str(run_dir), resume=True)
+    assert not run_dir.exists()
+
+
+def test_run_config_round_trip(run_dir):
+    config = {"test": False, "team": "teamA", "tasks": ["A2"]}
+    RunJournal(run_dir).write_config(config)
+    assert RunJournal(run_dir, resume=True).read_config() == config
+
+
+def test_resumed_unit_matches_an_uninterrupted_run(run_dir, submission_path):
+    scorers = load_scorers(do_A1=False, do_A2=True, do_B=False, do_C=False)
+    expected = evaluate_unit(
+        submission_path, "A2", gold_data=GOLD_DATA, scorers=scorers
+    )
+
+    # The interrupted run scored only tl1
+    journal = start_run(run_dir)
+    evaluate_unit(
+        submission_path,
+        "A2",
+        gold_data=GOLD_DATA,
+        scorers=scorers,
+        skip_timeline_ids={"tl2", "tl3"},
+        on_timeline=journal.record,
+    )
+    journal.close()
+
+    journal = RunJournal(run_dir, resume=True)
+    journaled = journal.replay()[(submission_path, "A2")]
+    assert set(journaled) == {"tl1"}
+    resumed = evaluate_unit(
+        submission_path,
+        "A2",
+        gold_data=GOLD_DATA,
+        scorers=scorers,
+        skip_timeline_ids=set(journaled),
+        on_timeline=journal.record,
+    )
+    journal.close()
+    assert set(resumed) == {"tl2", "tl3"}
+    assert {**journaled, **serialize_results_of(resumed)} == serialize_results_of(
+        expected
+    )
+
+
+def serialize_results_of(timeline_to_results):
+    return {
+        timeline_id: serialize_results(timeline_results)
+        for timeline_id, timeline_results in timeline_to_results.items()
+    }
+
+
+RUN_CONFIG = {
+    "gold_sha256": "abc",
+    "scorer_configs": {"A2": {"scorer": "WellbeingScorer"}, "B": {"max_tokens": 4096}},
+}
+
+
+def test_check_resumed_run_accepts_the_same_settings():
+    assert check_resumed_run(RUN_CONFIG, "abc", RUN_CONFIG["scorer_configs"])
+
+
+def test_check_resumed_run_rejects_changed_gold_data():
+    with pytest.raises(ValueError, match="gold data"):
+        check_resumed_run(RUN_CONFIG, "def", RUN_CONFIG["scorer_configs"])
+
+
+def test_check_resumed_run_rejects_changed_scorer_settings():
+    with pytest.raises(ValueError, match="scorer settings"):
+        check_resumed_run(
+            RUN_CONFIG,
+            "abc",
+            {**RUN_CONFIG["scorer_configs"], "B": {"max_tokens": 8192}},
+        )
+
+
+def test_check_resumed_run_cannot_verify_older_runs():
+    assert not check_resumed_run({"test": False}, "abc", RUN_CONFIG["scorer_configs"])
@@ -0,0 +1,107 @@
+"""The span BERTScore grid (SpanScorer) against BERTScorer.score, one gold span at a time."""
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("bert_score")
+
+from bert_score import BERTScorer
+from span_scorer import SpanScorer
+
+pytestmark = pytest.mark.models
+
+GOLD_SPANS = [
+    "I feel sad today",
+    "my friend helped me move house after a long week",
+    "could not sleep",
+]
+PREDICTED_SPANS = [
+    "sad today",
+    "I could not sleep at all, again, for the third night in a row",
+    "my friend helped me",
+    "Things are better now!",
+]
+
+
+@pytest.fixture(scope="module")
+def ss():
+    return SpanScorer()
+
+
+@pytest.fixture(scope="module")
+def bert_scorer(ss):
+    # As SpanScorer scored spans before the grid
+    return BERTScorer(
+        model_type=ss.model_name,
+        lang="en",
+        device=ss.device,
+        rescale_with_baseline=ss.rescale_with_baseline,
+    )
+
+
+def per_pair_F(bert_scorer, gold_span, predicted_spans):
+    _, _, F = bert_scorer.score(predicted_spans, [gold_span] * len(predicted_spans))
+    return F.tolist()
+
+
+def test_similarity_matrix_matches_bertscorer(ss, bert_scorer):
+    F = ss.compute_similarity_matrix(GOLD_SPANS, PREDICTED_SPANS)
+    assert tuple(F.shape) == (len(GOLD_SPANS), len(PREDICTED_SPANS))
+    for gold_span, row in zip(GOLD_SPANS, F.tolist()):
+        assert row == pytest.approx(
+            per_pair_F(bert_scorer, gold_span, PREDICTED_SPANS), abs=1e-5
+        )
+
+
+def test_similarity_matrix_does_not_depend_on_chunks(ss):
+    expected = ss.compute_similarity_matrix(GOLD_SPANS, PREDICTED_SPANS)
+    max_sim_elements = ss.max_sim_elements
+    # Blocks of one gold and one predicted span
+    ss.max_sim_elements = 1
+    try:
+        F = ss.compute_similarity_matrix(GOLD_SPANS, PREDICTED_SPANS)
+    finally:
+        ss.max_sim_elements = max_sim_elements
+    for row, expected_row in zip(F.tolist(), expected.tolist()):
+        assert row == pytest.approx(expected_row, abs=1e-6)
+
+
+def test_span_metrics_match_per_pair_scoring(ss, bert_scorer):
+    recalls = [
+        max(per_pair_F(bert_scorer, gold_span, PREDICTED_SPANS))
+        for gold_span in GOLD_SPANS
+    ]
+    num_gold_tokens = sum(ss.count_tokens(GOLD_SPANS))
+    num_predicted_tokens = sum(ss.count_tokens(PREDICTED_SPANS))
+    weight = min(1.0, num_gold_tokens / num_predicted_tokens)
+
+    metrics = ss.compute_span_metrics(GOLD_SPANS, PREDICTED_SPANS)
+    assert metrics["bertscore_recall"]["value"] == pytest.approx(
+        sum(recalls) / len(recalls), abs=1e-5
+    )
+    assert metrics["bertscore_weighted_recall"]["value"] == pytest.approx(
+        weight * sum(recalls) / len(recalls), abs=1e-5
+    )
+
+
+def test_prefetched_similarities_match_grid(ss):
+    span_groups = [
+        (GOLD_SPANS[:2], PREDICTED_SPANS),
+        (GOLD_SPANS[1:], PREDICTED_SPANS[:2]),
+    ]
+    expected = {
+        (gold_span, predicted_span): score
+        for gold_spans, predicted_spans in span_groups
+        for gold_span, row in zip(
+            gold_spans, ss.compute_similarity_matrix(gold_spans, predicted_spans)
+        )
+        for predicted_span, score in zip(predicted_spans, row.tolist())
+    }
+    num_pairs, num_spans, num_unique_spans = ss.prefetch_similarities(span_groups)
+    try:
+        assert num_pairs == 2 * 4 + 2 * 2
+        assert num_spans == (2 + 4) + (2 + 2)
+        assert num_unique_spans == len(set(GOLD_SPANS) | set(PREDICTED_SPANS))
+        assert ss.prefetched == pytest.approx(expected, abs=1e-6)
+    finally:
+        ss.prefetched.clear()
@@ -0,0 +1,68 @@
+"""Vectorized Task A.2 scoring (WellbeingScorer.compute_batch) against the per-timeline metrics."""
+
+import random
+import numpy as np
+import pytest
+
+from wellbeing_scorer import WellbeingScorer
+
+# sklearn warns about each label without true and predicted scores
+pytestmark = pytest.mark.filterwarnings("ignore")
+
+
+def random_scores(rng, num_posts, none_rate):
+    return [
+        None if rng.random() < none_rate else rng.randint(1, 10)
+        for _ in range(num_posts)
+    ]
+
+
+def as_floats(scores):
+    return [np.nan if score is None else score for score in scores]
+
+
+def test_matches_compute_mse_and_compute_f1():
+    ws = WellbeingScorer()
+    rng = random.Random(0)
+    for _ in range(300):
+        timelines = []
+        for _ in range(rng.randint(1, 6)):
+            num_posts = rng.randint(1, 8)
+            y_trues = random_scores(rng, num_posts, none_rate=0.3)
+            # Every timeline has at least one annotated post
+            y_trues[rng.randrange(num_posts)] = rng.randint(1, 10)
+            timelines.append(y_trues)
+        submissions = [
+            [
+                random_scores(rng, len(y_trues), none_rate=rng.choice([0, 0.3, 1]))
+                for y_trues in timelines
+            ]
+            for _ in range(rng.randint(1, 3))
+        ]
+
+        batch_results = ws.compute_batch(
+            y_trues=as_floats(sum(timelines, [])),
+            y_preds=[as_floats(sum(y_preds, [])) for y_preds in submissions],
+            timeline_starts=np.cumsum(
+                [0] + [len(y_trues) for y_trues in timelines[:-1]]
+            ),
+        )
+        assert batch_results == [
+            [
+                [
+                    ws.compute_mse(
+                        y_trues=y_trues, y_preds=list(y_preds), do_binwise=True
+                    ),
+                    ws.compute_f1(y_trues=y_trues, y_preds=list(y_preds)),
+                ]
+                for y_trues, y_preds in zip(timelines, timeline_preds)
+            ]
+            for timeline_preds in submissions
+        ]
+
+
+def test_rejects_timelines_without_annotated_posts():
+    with pytest.raises(ValueError, match=r"\[1\]"):
+        WellbeingScorer().compute_batch(
+            y_trues=[3, np.nan, np.nan], y_preds=[4, 5, 6], timeline_starts=[0, 1]
+        )
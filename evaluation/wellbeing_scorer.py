@@ -3,6 +3,36 @@ import numpy as np
 from numpy.typing import ArrayLike
 
 
+def _segment_means(values: np.ndarray, segments: np.ndarray, num_segments: int):
+    """
+    Mean of the values of each segment along the last axis (NaN for empty segments).
+
+    Segments of equal length are stacked and summed row by row, so that each segment
+    is summed in the same (pairwise) order as np.mean sums it, and the means are
+    identical to np.mean of each segment; np.add.reduceat sums in a different order.
+
+    Args:
+        values: Array of values, segments along its last axis
+        segments: Segment index of each value
+        num_segments: Number of segments
+
+    Returns:
+        Array of means, with the last axis of length num_segments
+    """
+    order = np.argsort(segments, kind="stable")
+    counts = np.bincount(segments, minlength=num_segments)
+    starts = np.cumsum(counts) - counts
+    values = values[..., order]
+    means = np.full(values.shape[:-1] + (num_segments,), np.nan)
+    for length in np.unique(counts[counts > 0]):
+        (segment_ids,) = np.nonzero(counts == length)
+        positions = starts[segment_ids, None] + np.arange(length)
+        # Contiguous rows, as numpy only sums rows pairwise along contiguous memory
+        rows = np.ascontiguousarray(values[..., positions])
+        means[..., segment_ids] = rows.sum(axis=-1) / length
+    return means
+
+
 class WellbeingScorer:
     def __init__(self):
         self.task = "A.2"
@@ -175,3 +205,126 @@ class WellbeingScorer:
         }
 
         return {**result_macro, **result_class}
+
+    def compute_batch(
+        self, y_trues: ArrayLike, y_preds: ArrayLike, timeline_starts: ArrayLike
+    ):
+        """
+        Compute the results of `compute_mse` (with do_binwise=True) and `compute_f1`,
+        penalizing missing predictions, for many timelines and submissions at once.
+        Uses segmented NumPy reductions instead of per-timeline sklearn calls; the
+        values are identical to those of the per-timeline calls.
+
+        Args:
+            y_trues: Gold wellbeing scores of the posts of all timelines, one timeline
+                     after another; NaN where a post is not annotated for wellbeing
+            y_preds: Predicted wellbeing scores, one row per submission aligned with
+                     y_trues; NaN where a prediction is missing
+            timeline_starts: Index of the first post of each timeline in y_trues
+
+        Returns:
+            Per submission, per timeline: [MSE results, F1 results] as returned by
+            compute_mse and compute_f1
+        """
+        y_trues = np.asarray(y_trues, dtype=float)
+        y_preds = np.asarray(y_preds, dtype=float).reshape(-1, len(y_trues))
+        timeline_starts = np.asarray(timeline_starts, dtype=np.int64)
+        num_timelines = len(timeline_starts)
+        timelines = np.repeat(
+            np.arange(num_timelines),
+            np.diff(np.append(timeline_starts, len(y_trues))),
+        )
+
+        # Skip posts not annotated for wellbeing
+        annotated = ~np.isnan(y_trues)
+        timelines = timelines[annotated]
+        y_trues = np.trunc(y_trues[annotated])
+        y_preds = y_preds[:, annotated]
+        num_posts = np.bincount(timelines, minlength=num_timelines)
+        if not num_posts.all():
+            # As the per-timeline metrics, which are undefined without gold scores
+            raise ValueError(
+                "Found timelines without posts annotated for wellbeing: "
+                f"{np.flatnonzero(num_posts == 0).tolist()}"
+            )
+        starts = np.cumsum(num_posts) - num_posts
+        none_mask = np.isnan(y_preds)
+
+        # MSE: penalize missing predictions with the maximum observed error of the
+        # timeline, or the maximum possible error if all predictions are missing
+        observed_errors = np.where(none_mask, -1, np.abs(y_trues - np.trunc(y_preds)))
+        max_errors = np.maximum.reduceat(observed_errors, starts, axis=1)
+        max_errors[max_errors < 0] = self.max_possible_error
+        penalized_preds = np.where(
+            none_mask, y_trues + max_errors[:, timelines], y_preds
+        )
+        squared_errors = (y_trues - penalized_preds) ** 2
+        mse = _segment_means(squared_errors, timelines, num_timelines)
+
+        # MSE per bin of the gold score
+        bin_ids = np.full(len(y_trues), -1)
+        for i, (bin_min, bin_max) in enumerate(self.bins.values()):
+            bin_ids[(y_trues >= bin_min) & (y_trues <= bin_max)] = i
+        in_bin = bin_ids >= 0
+        bin_segments = timelines[in_bin] * len(self.bins) + bin_ids[in_bin]
+        bin_mse = _segment_means(
+            squared_errors[:, in_bin], bin_segments, num_timelines * len(self.bins)
+        ).reshape(len(y_preds), num_timelines, len(self.bins))
+        has_bin = (
+            np.bincount(bin_segments, minlength=num_timelines * len(self.bins)) > 0
+        ).reshape(num_timelines, len(self.bins))
+
+        # F1: missing predictions fall into their own class
+        true_classes = self.bin_wellbeing_score(y_trues)
+        pred_classes = np.where(
+            none_mask,
+            self.incorrect_class,
+            np.trunc(self.bin_wellbeing_score(y_preds)),
+        )
+        is_true = true_classes == self.labels[:, None]
+        is_pred = pred_classes[:, None, :] == self.labels[:, None]
+        true_sum = np.add.reduceat(is_true.astype(np.int64), starts, axis=-1)
+        pred_sum = np.add.reduceat(is_pred.astype(np.int64), starts, axis=-1)
+        tp_sum = np.add.reduceat((is_pred & is_true).astype(np.int64), starts, axis=-1)
+        # As sklearn: 2 tp / (2 tp + fp + fn), and 0 if a label is neither true nor predicted
+        denominator = (true_sum + pred_sum).astype(float)
+        class_f1 = np.where(
+            denominator > 0, 2.0 * tp_sum / np.maximum(denominator, 1), 0.0
+        )
+        # (submissions, timelines, labels)
+        class_f1 = class_f1.transpose(0, 2, 1)
+        f1_macro = class_f1.mean(axis=-1)
+
+        mse, bin_mse, f1_macro, class_f1 = (
+            mse.tolist(),
+            bin_mse.tolist(),
+            f1_macro.tolist(),
+            class_f1.tolist(),
+        )
+        return [
+            [
+                [
+                    {
+                        "mse": {"task": "A.2", "value": mse[s][t]},
+                        **{
+                            f"mse_{bin_label}": {
+                                "task": "A.2",
+                                "value": bin_mse[s][t][i],
+                            }
+                            for i, bin_label in enumerate(self.bins)
+                            if has_bin[t, i]
+                        },
+                    },
+                    {
+                        "f1_macro": {"value": f1_macro[s][t], "task": "A.2"},
+                        **{
+                            f"f1_class_{i}": {"value": class_f1[s][t][i], "task": "A.2"}
+                            for i in range(len(self.labels))
+                            if i != self.incorrect_class
+                        },
+                    },
+                ]
+                for t in range(num_timelines)
+            ]
+            for s in range(len(y_preds))
+        ]